@@ -0,0 +1,4 @@
+import os
+import sys
+import re
+sys.path.insert(0, re.match(r'(.*/)', os.path.abspath(__file__)).group(1) + '../')
\ No newline at end of file
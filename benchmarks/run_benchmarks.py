@@ -0,0 +1,245 @@
+"""
+Benchmarks of crawler run against SyntheticWeb served from local HTTP servers.
+
+Every scenario is crawled with every search action, each crawl in its own process,
+so its peak memory usage is measured separately. Results are printed and saved
+to results directory as JSON, so they can be compared with results of other commits:
+
+    python3 run_benchmarks.py
+    python3 run_benchmarks.py --scenarios baseline --actions words --repeat 3
+    python3 run_benchmarks.py --compare results/<older run>.json
+"""
+import argparse
+import context
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from synthetic_site import SiteGraph, SyntheticWeb
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# site graph and server configurations, keys of "graph" are passed to SiteGraph and keys of "web" to SyntheticWeb
+SCENARIOS = {
+    "baseline": {"graph": {"fanOut": 6, "depth": 3, "pageSize": 4096, "hosts": 4}, "web": {}},
+    "large-pages": {"graph": {"fanOut": 6, "depth": 3, "pageSize": 65536, "hosts": 4}, "web": {}},
+    "latency": {"graph": {"fanOut": 6, "depth": 3, "pageSize": 4096, "hosts": 4}, "web": {"latency": 0.02}},
+    "slow-and-failing": {"graph": {"fanOut": 6, "depth": 3, "pageSize": 4096, "hosts": 4},
+                         "web": {"latency": 0.005, "slowHosts": 1, "slowLatency": 0.1, "errorRate": 0.05}}
+}
+
+# search actions as pairs of crawling function name and its arguments
+ACTIONS = {
+    "words": ("searchForWord", ("world", False, ['p'])),
+    "sentences": ("searchForSentencesContainingWord", ("crawler", False, ['p'])),
+    "pattern": ("searchForPattern", (r"bench\w+ graph", False, ['p']))
+}
+
+# modes of downloading and processing as arguments of crawl
+MODES = {
+    "threads": {},
+    "async": {"fetcher": True},
+    "processes": {"processes": 2}
+}
+
+def peakRSS():
+    """
+    Returns peak resident set size of current process in bytes.
+    """
+
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return maxRSS if sys.platform == 'darwin' else maxRSS * 1024
+
+def runSingle(startAddress, depth, action, mode):
+    """
+    Crawls from startAddress in current process and returns dictionary with measurements.
+
+    :type startAddress: string
+    :param startAddress: Address of root site of SyntheticWeb.
+
+    :type depth: int
+    :param depth: The biggest distance from start site.
+
+    :type action: string
+    :param action: One of keys of ACTIONS.
+
+    :type mode: string
+    :param mode: One of keys of MODES.
+    """
+
+    import crawling
+    from fetching import AsyncFetcher
+    from metrics import CrawlStats
+
+    name, args = ACTIONS[action]
+    kwargs = dict(MODES[mode])
+    if kwargs.pop("fetcher", False):
+        kwargs["fetcher"] = AsyncFetcher()
+    stats = CrawlStats(keepSamples=10000)
+    rssBefore = peakRSS()
+    start = time.perf_counter()
+    res = crawling.crawl(startAddress, depth, None, getattr(crawling, name)(*args), stats=stats, **kwargs)
+    elapsed = time.perf_counter() - start
+    snapshot = stats.snapshot()
+    return {
+        "elapsed": elapsed,
+        "pages": snapshot["counters"]["pages"],
+        "pagesPerSecond": snapshot["counters"]["pages"] / elapsed if elapsed > 0 else 0.0,
+        "sitesWithResults": sum(1 for _ in res.results),
+        "peakRSS": peakRSS(),
+        "rssBeforeCrawl": rssBefore,
+        "stats": snapshot
+    }
+
+def runScenario(name, actions, modes, repeat):
+    """
+    Serves scenario's SyntheticWeb and crawls it in child processes with every action in every mode.
+    Returns list of measurements, for each repetition the one with the biggest pages per second is kept.
+
+    :type name: string
+    :param name: One of keys of SCENARIOS.
+
+    :type actions: list
+    :param actions: Keys of ACTIONS.
+
+    :type modes: list
+    :param modes: Keys of MODES.
+
+    :type repeat: int
+    :param repeat: Number of times each crawl is run.
+    """
+
+    scenario = SCENARIOS[name]
+    graph = SiteGraph(**scenario["graph"])
+    web = SyntheticWeb(graph, **scenario["web"])
+    startAddress = web.start()
+    measurements = []
+    try:
+        for action in actions:
+            for mode in modes:
+                runs = []
+                for _ in range(repeat):
+                    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--single', startAddress,
+                                          str(graph.depth), action, mode], stdout=subprocess.PIPE, check=True)
+                    runs.append(json.loads(out.stdout.decode('utf-8').splitlines()[-1]))
+                best = max(runs, key=lambda run: run["pagesPerSecond"])
+                best.update({"scenario": name, "action": action, "mode": mode, "sites": graph.size, "runs": [run["pagesPerSecond"] for run in runs]})
+                measurements.append(best)
+                printMeasurement(best)
+    finally:
+        web.stop()
+    return measurements
+
+def printMeasurement(m):
+    """
+    Prints single measurement as line of table.
+
+    :type m: dict
+    :param m: Measurement returned by runScenario.
+    """
+
+    stages = m["stats"]["stages"]
+    latencies = ' '.join('%s %.1f/%.1f' % (stage, 1000 * stages[stage].get('p50', 0.0), 1000 * stages[stage].get('p99', 0.0))
+                         for stage in ('ttfb', 'body', 'parse', 'action') if stages[stage]["count"])
+    print('%-17s %-10s %-9s %5d pages %8.1f pages/s %7.1f MiB  p50/p99 ms: %s'
+          % (m["scenario"], m["action"], m["mode"], m["pages"], m["pagesPerSecond"], m["peakRSS"] / 2 ** 20, latencies))
+
+def gitCommit():
+    """
+    Returns hash of checked out commit, with "-dirty" appended when there are uncommitted changes, or "unknown".
+    """
+
+    root = os.path.dirname(RESULTS_DIR)
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                check=True).stdout.decode().strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+def saveResults(measurements, args):
+    """
+    Saves measurements with description of environment to results directory and returns path of the file.
+
+    :type measurements: list
+    :param measurements: Measurements returned by runScenario.
+
+    :type args: argparse.Namespace
+    :param args: Parsed command line arguments.
+    """
+
+    commit = gitCommit()
+    run = {
+        "commit": commit,
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "scenarios": {name: SCENARIOS[name] for name in args.scenarios},
+        "measurements": measurements
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, '%s-%s.json' % (time.strftime('%Y%m%d-%H%M%S'), commit))
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=4)
+    return path
+
+def compare(measurements, path):
+    """
+    Prints pages per second and peak memory usage of measurements relative to ones saved in file.
+
+    :type measurements: list
+    :param measurements: Measurements returned by runScenario.
+
+    :type path: string
+    :param path: Path of results file saved by earlier run.
+    """
+
+    with open(path, 'r') as f:
+        old = json.load(f)
+    oldByKey = {(m["scenario"], m["action"], m["mode"]): m for m in old["measurements"]}
+    print('\nCompared with %s (commit %s):' % (os.path.basename(path), old["commit"]))
+    for m in measurements:
+        o = oldByKey.get((m["scenario"], m["action"], m["mode"]))
+        if o is None:
+            continue
+        print('%-17s %-10s %-9s pages/s %8.1f -> %8.1f (%+6.1f%%)  peak RSS %7.1f -> %7.1f MiB'
+              % (m["scenario"], m["action"], m["mode"], o["pagesPerSecond"], m["pagesPerSecond"],
+                 100 * (m["pagesPerSecond"] / o["pagesPerSecond"] - 1) if o["pagesPerSecond"] else 0.0,
+                 o["peakRSS"] / 2 ** 20, m["peakRSS"] / 2 ** 20))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks crawler against generated sites served locally.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--actions', nargs='+', choices=list(ACTIONS), default=list(ACTIONS))
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=['threads', 'async'])
+    parser.add_argument('--repeat', type=int, default=1, help='number of times each crawl is run, the fastest run is reported')
+    parser.add_argument('--compare', metavar='FILE', help='results file of earlier run to compare with')
+    parser.add_argument('--no-save', dest='save', action='store_false', help='do not save results')
+    parser.add_argument('--single', nargs=4, metavar=('START', 'DEPTH', 'ACTION', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        startAddress, depth, action, mode = args.single
+        # crawl prints failed sites, measurements are the last line
+        print(json.dumps(runSingle(startAddress, int(depth), action, mode)))
+        return
+
+    measurements = []
+    for name in args.scenarios:
+        measurements += runScenario(name, args.actions, args.modes, args.repeat)
+    if args.save:
+        print('\nResults saved to ' + saveResults(measurements, args))
+    if args.compare is not None:
+        compare(measurements, args.compare)
+
+if __name__ == '__main__':
+    main()
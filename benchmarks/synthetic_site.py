@@ -0,0 +1,218 @@
+import hashlib
+import http.server
+import random
+import socketserver
+import threading
+import time
+
+# words from which texts of generated pages are made
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna '
+         'aliqua crawler world benchmark graph page site link search sentence pattern number').split()
+
+class SiteGraph:
+    """
+    Deterministic graph of generated sites spread over several hosts.
+
+    Sites form a tree of given depth in which each site links to fanOut children,
+    with crossLinks additional links from each site to random sites, so sites are found many times.
+    Site i is served by host i % hosts.
+    """
+    def __init__(self, fanOut=5, depth=4, pageSize=4096, crossLinks=2, hosts=1, seed=0):
+        """
+        Creates SiteGraph object.
+
+        :type fanOut: int
+        :param fanOut: Number of children of each site.
+
+        :type depth: int
+        :param depth: The biggest distance of site from root site.
+
+        :type pageSize: int
+        :param pageSize: Approximate length of text of each site in characters.
+
+        :type crossLinks: int
+        :param crossLinks: Number of links from each site to random sites.
+
+        :type hosts: int
+        :param hosts: Number of hosts serving sites.
+
+        :type seed: int
+        :param seed: Seed of random generator, same seed gives same graph.
+        """
+
+        self.fanOut = fanOut
+        self.depth = depth
+        self.pageSize = pageSize
+        self.crossLinks = crossLinks
+        self.hosts = hosts
+        self.seed = seed
+        self.size = sum(fanOut ** d for d in range(depth + 1))
+
+    def children(self, i):
+        """
+        Returns list of numbers of sites linked from site i.
+
+        :type i: int
+        :param i: Number of site.
+        """
+
+        rng = random.Random('%d-%d' % (self.seed, i))
+        linked = [c for c in range(i * self.fanOut + 1, i * self.fanOut + self.fanOut + 1) if c < self.size]
+        linked += [rng.randrange(self.size) for _ in range(self.crossLinks)]
+        return linked
+
+    def text(self, i):
+        """
+        Returns text of site i, split into sentences.
+
+        :type i: int
+        :param i: Number of site.
+        """
+
+        rng = random.Random('%d-text-%d' % (self.seed, i))
+        sentences = []
+        length = 0
+        while length < self.pageSize:
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 16))).capitalize() + '.'
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        return sentences
+
+    def html(self, i, addressOf):
+        """
+        Returns HTML document of site i.
+
+        :type i: int
+        :param i: Number of site.
+
+        :type addressOf: function
+        :param addressOf: Returns address of site with given number.
+        """
+
+        sentences = self.text(i)
+        half = len(sentences) // 2
+        links = ''.join('<li><a href="%s" class="nav">site %d</a></li>' % (addressOf(c), c) for c in self.children(i))
+        return ('<!DOCTYPE html><html><head><title>Site %d</title></head><body><h1>Site %d</h1>'
+                '<p>%s</p><ul>%s</ul><div><p>%s</p></div></body></html>') % (i, i, ' '.join(sentences[:half]), links, ' '.join(sentences[half:]))
+
+class SyntheticWeb:
+    """
+    Serves SiteGraph from local HTTP servers, one per host, each in its own thread.
+
+    Every response is delayed by latency (plus slowLatency for the first slowHosts hosts)
+    and sites chosen with probability errorRate respond with 500 error.
+    """
+    def __init__(self, graph, latency=0.0, slowHosts=0, slowLatency=0.2, errorRate=0.0):
+        """
+        Creates SyntheticWeb object. Servers are started with start().
+
+        :type graph: SiteGraph
+        :param graph: Sites to serve.
+
+        :type latency: float
+        :param latency: Time in seconds by which every response is delayed.
+
+        :type slowHosts: int
+        :param slowHosts: Number of hosts which responses are delayed additionally.
+
+        :type slowLatency: float
+        :param slowLatency: Additional delay in seconds of responses of slow hosts.
+
+        :type errorRate: float
+        :param errorRate: Fraction of sites responding with 500 error.
+        """
+
+        self.graph = graph
+        self.latency = latency
+        self.slowHosts = slowHosts
+        self.slowLatency = slowLatency
+        self.errorRate = errorRate
+        self.servers = []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def address(self, i):
+        """
+        Returns address of site i.
+
+        :type i: int
+        :param i: Number of site.
+        """
+
+        host, port = self.servers[i % len(self.servers)].server_address[:2]
+        return 'http://%s:%d/p%d.html' % (host, port, i)
+
+    def fails(self, i):
+        """
+        Returns True if site i responds with error.
+
+        :type i: int
+        :param i: Number of site.
+        """
+
+        digest = hashlib.sha1(('%d-error-%d' % (self.graph.seed, i)).encode()).digest()
+        return int.from_bytes(digest[:4], 'big') / 2 ** 32 < self.errorRate
+
+    def handler(self, hostNumber):
+        """
+        Returns request handler class of host.
+
+        :type hostNumber: int
+        :param hostNumber: Number of host.
+        """
+
+        web = self
+        delay = self.latency + (self.slowLatency if hostNumber < self.slowHosts else 0.0)
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with web.lock:
+                    web.requests += 1
+                if delay > 0:
+                    time.sleep(delay)
+                status, body = 404, b'Not found'
+                if self.path.startswith('/p') and self.path.endswith('.html') and self.path[2:-5].isdigit():
+                    i = int(self.path[2:-5])
+                    if i < web.graph.size and i % len(web.servers) == hostNumber:
+                        if web.fails(i):
+                            status, body = 500, b'Internal server error'
+                        else:
+                            status, body = 200, web.graph.html(i, web.address).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        """
+        Starts servers on free ports of 127.0.0.1 and returns address of root site.
+        """
+
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        for hostNumber in range(self.graph.hosts):
+            server = Server(('127.0.0.1', 0), self.handler(hostNumber))
+            self.servers.append(server)
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self.address(0)
+
+    def stop(self):
+        """
+        Stops servers.
+        """
+
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
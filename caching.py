@@ -0,0 +1,212 @@
+import sqlite3
+import threading
+import time
+import zlib
+
+from frontier import canonicaliseURL, canonicalKey
+
+class CacheEntry:
+    """
+    This class stores page kept in PageCache.
+    """
+    def __init__(self, url, body, etag, lastModified, fetchedAt):
+        """
+        Creates CacheEntry object.
+
+        :type url: string
+        :param url: Address of page.
+
+        :type body: bytes
+        :param body: Text of page encoded in UTF-8.
+
+        :type etag: string
+        :param etag: Value of ETag header or None.
+
+        :type lastModified: string
+        :param lastModified: Value of Last-Modified header or None.
+
+        :type fetchedAt: float
+        :param fetchedAt: Time at which page was last downloaded or revalidated.
+        """
+
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.lastModified = lastModified
+        self.fetchedAt = fetchedAt
+
+class PageCache:
+    """
+    Persistent cache of downloaded pages keyed by canonical URL.
+
+    Pages are stored compressed in sqlite database. Pages downloaded less than freshFor
+    seconds ago are used without contacting the server, older ones are revalidated with
+    If-None-Match/If-Modified-Since headers. When total size of stored pages exceeds maxBytes,
+    least recently used pages are removed. Access times are buffered and written in batches.
+    """
+    def __init__(self, path, maxBytes=512 * 1024 * 1024, freshFor=3600, accessBuffer=256):
+        """
+        Creates PageCache object.
+
+        :type path: string
+        :param path: Path of sqlite database file.
+
+        :type maxBytes: int
+        :param maxBytes: The biggest total size of stored (compressed) pages.
+
+        :type freshFor: float
+        :param freshFor: Time in seconds for which downloaded page is used without revalidation.
+
+        :type accessBuffer: int
+        :param accessBuffer: Number of access times kept in memory before they are written.
+        """
+
+        self.maxBytes = maxBytes
+        self.freshFor = freshFor
+        self.accessBuffer = max(1, accessBuffer)
+        # maps keys of pages looked up to times of the latest lookups not written yet
+        self.accessed = {}
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, url TEXT, etag TEXT, lastModified TEXT, '
+                        'fetchedAt REAL, accessedAt REAL, size INTEGER, body BLOB)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pagesByAccess ON pages (accessedAt)')
+        self.db.commit()
+        self.size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def key(self, url):
+        """
+        Returns key under which page is stored.
+
+        :type url: string
+        :param url: Address of page.
+        """
+
+        canonicalURL = canonicaliseURL(url)
+        return canonicalKey(canonicalURL) if canonicalURL is not None else url
+
+    def lookup(self, url):
+        """
+        Returns CacheEntry stored for url or None.
+
+        :type url: string
+        :param url: Address of page.
+        """
+
+        key = self.key(url)
+        with self.lock:
+            row = self.db.execute('SELECT url, etag, lastModified, fetchedAt, body FROM pages WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.accessed[key] = time.time()
+            if len(self.accessed) >= self.accessBuffer:
+                self.writeAccesses()
+                self.db.commit()
+        return CacheEntry(row[0], zlib.decompress(row[4]), row[1], row[2], row[3])
+
+    def isFresh(self, entry):
+        """
+        Returns True if entry may be used without revalidation.
+
+        :type entry: CacheEntry
+        :param entry: Stored page.
+        """
+
+        return time.time() - entry.fetchedAt < self.freshFor
+
+    def conditionalHeaders(self, entry):
+        """
+        Returns dictionary of headers making request conditional on page having changed since entry was stored.
+
+        :type entry: CacheEntry
+        :param entry: Stored page or None.
+        """
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.lastModified:
+                headers['If-Modified-Since'] = entry.lastModified
+        return headers
+
+    def store(self, url, body, headers):
+        """
+        Stores downloaded page unless server forbids it and evicts least recently used pages if necessary.
+
+        :type url: string
+        :param url: Address of page.
+
+        :type body: bytes
+        :param body: Text of page encoded in UTF-8.
+
+        :type headers: dict
+        :param headers: Response headers, with lowercase names.
+        """
+
+        if 'no-store' in headers.get('cache-control', '').lower():
+            return
+        compressed = zlib.compress(body)
+        key = self.key(url)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self.db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (key, url, headers.get('etag'), headers.get('last-modified'), now, now, len(compressed), compressed))
+            self.size += len(compressed)
+            self.accessed.pop(key, None)
+            # pages looked up recently are not evicted
+            self.writeAccesses()
+            while self.size > self.maxBytes:
+                oldest = self.db.execute('SELECT key, size FROM pages ORDER BY accessedAt LIMIT 64').fetchall()
+                if not oldest:
+                    break
+                for oldKey, oldSize in oldest:
+                    self.db.execute('DELETE FROM pages WHERE key = ?', (oldKey,))
+                    self.size -= oldSize
+                    if self.size <= self.maxBytes:
+                        break
+            self.db.commit()
+
+    def revalidated(self, url):
+        """
+        Marks stored page as fresh after server responded that it has not changed.
+
+        :type url: string
+        :param url: Address of page.
+        """
+
+        with self.lock:
+            self.db.execute('UPDATE pages SET fetchedAt = ? WHERE key = ?', (time.time(), self.key(url)))
+            self.db.commit()
+
+    def writeAccesses(self):
+        """
+        Writes buffered access times to the database without committing them. Lock has to be held by caller.
+        """
+
+        if self.accessed:
+            self.db.executemany('UPDATE pages SET accessedAt = ? WHERE key = ?', [(t, key) for key, t in self.accessed.items()])
+            self.accessed.clear()
+
+    def flush(self):
+        """
+        Writes and commits buffered access times.
+        """
+
+        with self.lock:
+            self.writeAccesses()
+            self.db.commit()
+
+    def close(self):
+        """
+        Writes buffered access times and closes the file.
+        """
+
+        self.flush()
+        with self.lock:
+            self.db.close()
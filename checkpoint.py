@@ -0,0 +1,111 @@
+import gzip
+import json
+import os
+import time
+
+class Checkpoint:
+    """
+    This class stores state of unfinished crawl, from which it can be resumed.
+    """
+    def __init__(self, startAddress, maxDepth, aAttrsFilter, action, startTime, pending, seen, results, counts, sinkPath=None, savedTime=None, corpusPath=None, indexPath=None):
+        """
+        Creates Checkpoint object.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl began.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type aAttrsFilter: dict
+        :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+        :type action: dict
+        :param action: Description of action returned by its spec() method or None if action cannot be described.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started.
+
+        :type pending: list
+        :param pending: Tuples (url, dist) of sites queued, but not processed yet.
+
+        :type seen: list
+        :param seen: Tuples (key, dist) of all sites queued so far.
+
+        :type results: list
+        :param results: Tuples (siteAddress, matches) found so far, empty if results were written to sink.
+
+        :type counts: dict
+        :param counts: Number of matches found on each of processed sites.
+
+        :type sinkPath: string
+        :param sinkPath: Path of JSON Lines file results are written to, if any.
+
+        :type savedTime: float
+        :param savedTime: Time at which checkpoint was made.
+
+        :type corpusPath: string
+        :param corpusPath: Path of corpus.CorpusStore file downloaded sites are stored in, if any.
+
+        :type indexPath: string
+        :param indexPath: Path of inverted_index.InvertedIndex file texts of sites are indexed in, if any.
+        """
+
+        self.startAddress = startAddress
+        self.maxDepth = maxDepth
+        self.aAttrsFilter = aAttrsFilter
+        self.action = action
+        self.startTime = startTime
+        self.pending = pending
+        self.seen = seen
+        self.results = results
+        self.counts = counts
+        self.sinkPath = sinkPath
+        self.savedTime = savedTime if savedTime is not None else time.time()
+        self.corpusPath = corpusPath
+        self.indexPath = indexPath
+
+    def save(self, path):
+        """
+        Saves checkpoint to gzip compressed JSON file.
+
+        File is replaced atomically, so previous checkpoint stays intact if saving is interrupted.
+
+        :type path: string
+        :param path: Path of the file.
+        """
+
+        tmpPath = path + '.tmp'
+        with gzip.open(tmpPath, 'wt') as f:
+            json.dump({
+                "startAddress": self.startAddress,
+                "maxDepth": self.maxDepth,
+                "aAttrsFilter": self.aAttrsFilter,
+                "action": self.action,
+                "startTime": self.startTime,
+                "savedTime": self.savedTime,
+                "pending": self.pending,
+                "seen": self.seen,
+                "results": self.results,
+                "counts": self.counts,
+                "sinkPath": self.sinkPath,
+                "corpusPath": self.corpusPath,
+                "indexPath": self.indexPath
+            }, f)
+        os.replace(tmpPath, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Creates Checkpoint object from file written by save().
+
+        :type path: string
+        :param path: Path of the file.
+        """
+
+        with gzip.open(path, 'rt') as f:
+            fJSON = json.load(f)
+        return cls(fJSON["startAddress"], fJSON["maxDepth"], fJSON["aAttrsFilter"], fJSON["action"], fJSON["startTime"],
+                   [tuple(item) for item in fJSON["pending"]], [tuple(item) for item in fJSON["seen"]],
+                   [tuple(item) for item in fJSON["results"]], fJSON["counts"], fJSON["sinkPath"], fJSON["savedTime"],
+                   fJSON.get("corpusPath"), fJSON.get("indexPath"))
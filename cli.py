@@ -0,0 +1,284 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+
+from caching import PageCache
+from corpus import CorpusStore
+from crawling import searchCorpus, searchIndex
+from distributed import AUTHKEY_VARIABLE, authkeyFrom, parseAddress, runWorker
+from input_parsing import comaSepToList
+from inverted_index import InvertedIndex
+from jobs import SEARCHES, CrawlJob, loadJobs, runJobs
+from result_files import JSONLinesSink
+
+def parseArguments(argv=None):
+    """
+    Returns namespace of command line arguments.
+
+    :type argv: list
+    :param argv: Arguments to parse, sys.argv[1:] by default.
+    """
+
+    parser = argparse.ArgumentParser(description='Crawls sites without GUI and prints or saves sites on which searched texts were found.')
+    parser.add_argument('start', nargs='?', help='address of site from which crawl begins')
+    parser.add_argument('--jobs', metavar='FILE', help='JSON file with many crawls to run instead of single one (see jobs.loadJobs)')
+    search = parser.add_mutually_exclusive_group()
+    search.add_argument('--words', nargs='+', metavar='WORD', help='search for words')
+    search.add_argument('--sentences', metavar='WORD', help='search for sentences containing word')
+    search.add_argument('--pattern', metavar='REGEX', help='search for texts matching regular expression')
+    parser.add_argument('--depth', type=int, default=1, help='the biggest distance from start site, -1 means no limit (default: 1)')
+    parser.add_argument('--tags', default='p', help='comma separated tags inside of which searching is performed (default: p)')
+    parser.add_argument('--case-sensitive', action='store_true', help='treat capital and lowercase letters as different')
+    parser.add_argument('--links', action='append', metavar='ATTR:VALUES',
+                        help='follow only <a> tags with attribute having one of comma separated values, e.g. class:nav,menu')
+    parser.add_argument('--output', metavar='FILE', help='JSON Lines file to which results are written as they are found')
+    parser.add_argument('--max-pages', type=int, help='the biggest number of sites downloaded')
+    parser.add_argument('--max-bytes', type=int, help='number of characters of HTML after downloading which crawl stops')
+    parser.add_argument('--time-limit', type=float, metavar='SECONDS', help='time after which crawl stops')
+    parser.add_argument('--best-first', action='store_true', help='download first sites most likely to contain searched texts')
+    parser.add_argument('--cache', metavar='FILE', help='page cache shared by all crawls')
+    parser.add_argument('--concurrent-jobs', type=int, default=4, metavar='N', help='the biggest number of crawls run at once (default: 4)')
+    parser.add_argument('--async', dest='useAsync', action='store_true', help='download sites with asyncio instead of threads')
+    parser.add_argument('--processes', type=int, metavar='N', help='process sites in pool of N worker processes')
+    parser.add_argument('--metrics', metavar='FILE', help='file to which statistics of crawl are periodically written in Prometheus text format')
+    parser.add_argument('--metrics-interval', type=float, default=10, metavar='SECONDS', help='time between writing statistics (default: 10)')
+    parser.add_argument('--stats', action='store_true', help='print statistics of each crawl as JSON to standard error')
+    parser.add_argument('--checkpoint', metavar='FILE', help='file to which state of crawl is saved, so crawl stopped before visiting '
+                        'all sites is continued when run again with the same file')
+    parser.add_argument('--corpus', metavar='FILE', help='file in which downloaded sites are stored, so they can be searched '
+                        'again with --search-corpus without downloading them')
+    parser.add_argument('--search-corpus', metavar='FILE', help='search sites stored in corpus file by earlier crawl instead of crawling')
+    parser.add_argument('--index', metavar='FILE', help='file in which texts of visited sites are indexed, so other searches '
+                        'can be answered from it with --search-index')
+    parser.add_argument('--index-tags', metavar='TAGS', help='comma separated tags which texts are indexed (default: --tags)')
+    parser.add_argument('--search-index', metavar='FILE', help='answer search from index file written by earlier crawl instead of crawling')
+    parser.add_argument('--manifest', metavar='FILE', help='file storing visited sites, so the next crawl searches only sites changed since')
+    parser.add_argument('--delta', metavar='FILE', help='JSON file to which differences from results of the previous crawl are written (requires --manifest)')
+    parser.add_argument('--serve', metavar='HOST:PORT', help='crawl with workers connecting to this address instead of crawling locally')
+    parser.add_argument('--worker', metavar='HOST:PORT', help='download and process sites for crawl served at this address')
+    parser.add_argument('--authkey', help='secret shared by crawl and its workers (default: %s environment variable)' % AUTHKEY_VARIABLE)
+    args = parser.parse_args(argv)
+    if args.worker is not None:
+        if args.start is not None or args.jobs is not None or args.serve is not None:
+            parser.error('--worker cannot be given together with start address, --jobs or --serve')
+        return args
+    if args.search_corpus is not None or args.search_index is not None:
+        if args.search_corpus is not None and args.search_index is not None:
+            parser.error('only one of --search-corpus and --search-index can be given')
+        if args.start is not None or args.jobs is not None or args.serve is not None:
+            parser.error('--search-corpus and --search-index cannot be given together with start address, --jobs or --serve')
+        if args.words is None and args.sentences is None and args.pattern is None:
+            parser.error('one of --words, --sentences or --pattern has to be given')
+        return args
+    if (args.start is None) == (args.jobs is None):
+        parser.error('either start address or --jobs has to be given')
+    if args.serve is not None and args.jobs is not None:
+        parser.error('--serve can be given only for single crawl')
+    if args.jobs is not None and (args.manifest is not None or args.delta is not None):
+        parser.error('--manifest and --delta can be given only for single crawl, jobs have their own "manifest" and "delta" fields')
+    if args.delta is not None and args.manifest is None:
+        parser.error('--delta requires --manifest')
+    if args.manifest is not None and (args.useAsync or args.cache is not None or args.processes is not None):
+        parser.error('--manifest cannot be given with --async, --cache or --processes')
+    if args.start is not None and args.words is None and args.sentences is None and args.pattern is None:
+        parser.error('one of --words, --sentences or --pattern has to be given')
+    if args.jobs is not None and (args.corpus is not None or args.index is not None):
+        parser.error('--corpus and --index can be given only for single crawl, jobs have their own "corpus" and "index" fields')
+    if args.jobs is not None and args.checkpoint is not None:
+        parser.error('--checkpoint can be given only for single crawl, jobs have their own "checkpoint" field')
+    if args.jobs is not None and args.metrics is not None:
+        parser.error('--metrics can be given only for single crawl, jobs have their own "metrics" field')
+    return args
+
+def searchFromArguments(args):
+    """
+    Returns tuple (search, query) naming search given in command line arguments, as in job files.
+
+    :type args: argparse.Namespace
+    :param args: Parsed command line arguments.
+    """
+
+    if args.words is not None:
+        return "words", args.words[0] if len(args.words) == 1 else args.words
+    if args.sentences is not None:
+        return "sentences", args.sentences
+    return "pattern", args.pattern
+
+def jobFromArguments(args):
+    """
+    Returns CrawlJob described by command line arguments.
+
+    :type args: argparse.Namespace
+    :param args: Parsed command line arguments.
+    """
+
+    search, query = searchFromArguments(args)
+    return CrawlJob.fromJSON({
+        "start": args.start,
+        "depth": args.depth,
+        "search": search,
+        "query": query,
+        "tags": args.tags,
+        "caseSensitive": args.case_sensitive,
+        "aAttrsFilter": '\n'.join(args.links) if args.links is not None else None,
+        "output": args.output,
+        "maxPages": args.max_pages,
+        "maxBytes": args.max_bytes,
+        "timeLimit": args.time_limit,
+        "metrics": args.metrics,
+        "bestFirst": args.best_first,
+        "manifest": args.manifest,
+        "delta": args.delta,
+        "checkpoint": args.checkpoint,
+        "corpus": args.corpus,
+        "index": args.index,
+        "indexTags": args.index_tags
+    })
+
+def main(argv=None):
+    """
+    Runs crawls described by command line arguments. Returns exit status, which is 1 if any of crawls failed.
+
+    Results of crawls without output file are printed to standard output as JSON lines,
+    everything else is printed to standard error. First interrupt stops crawls keeping results found so far.
+
+    :type argv: list
+    :param argv: Arguments to parse, sys.argv[1:] by default.
+    """
+
+    args = parseArguments(argv)
+    if args.worker is not None:
+        return workerMain(args)
+    if args.search_corpus is not None or args.search_index is not None:
+        return searchMain(args)
+    jobs = loadJobs(args.jobs) if args.jobs is not None else [jobFromArguments(args)]
+    budgets = [job.budget() for job in jobs]
+    out = sys.stdout
+
+    def interrupt(signum, frame):
+        # next interrupt kills the program
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        for budget in budgets:
+            budget.cancel()
+
+    signal.signal(signal.SIGINT, interrupt)
+    cache = PageCache(args.cache) if args.cache is not None else None
+    kwargs = {"cache": cache, "useAsync": args.useAsync, "metricsInterval": args.metrics_interval}
+    if args.processes is not None:
+        kwargs["processes"] = args.processes
+    if args.serve is not None:
+        kwargs["serve"] = parseAddress(args.serve)
+        kwargs["authkey"] = authkeyFrom(args.authkey)
+    # crawl reports failed sites with print, which must not get mixed with results
+    with contextlib.redirect_stdout(sys.stderr):
+        finished = runJobs(jobs, args.concurrent_jobs, budgets, **kwargs)
+    if cache is not None:
+        # access times of pages taken from cache are saved
+        cache.close()
+
+    status = 0
+    for job, result, error in finished:
+        if error is not None:
+            print('%s: failed: %s' % (job.startAddress, error), file=sys.stderr)
+            status = 1
+            continue
+        reportResult(job.startAddress, result, job.output is None, args.stats, out)
+    out.flush()
+    return status
+
+def reportResult(startAddress, result, printResults, printStats, out):
+    """
+    Writes results of crawl to out as JSON lines, if they were not written to output file, and prints its summary to standard error.
+
+    :type startAddress: string
+    :param startAddress: Address of site from which crawl began.
+
+    :type result: crawling.CrawlResult
+    :param result: Result of the crawl.
+
+    :type printResults: bool
+    :param printResults: Flag specifying whether results should be written to out.
+
+    :type printStats: bool
+    :param printStats: Flag specifying whether statistics of crawl should be printed, if it has any.
+
+    :type out: file
+    :param out: File to which results are written.
+    """
+
+    found = 0
+    for siteAddress, matches in result.results:
+        found += 1
+        if printResults:
+            out.write(json.dumps({"start": startAddress, "site": siteAddress, "results": list(matches)}) + '\n')
+    print('%s: %d sites with results in %.2f s%s' % (startAddress, found, result.crawlTime, ' (truncated)' if result.truncated else ''),
+          file=sys.stderr)
+    if printStats and result.stats is not None:
+        print(json.dumps(result.stats.snapshot(), indent=4), file=sys.stderr)
+
+def searchMain(args):
+    """
+    Runs search described by command line arguments on sites stored in corpus or index by earlier crawl, without downloading them.
+    Returns exit status.
+
+    :type args: argparse.Namespace
+    :param args: Parsed command line arguments.
+    """
+
+    search, query = searchFromArguments(args)
+    action = SEARCHES[search](query, args.case_sensitive, comaSepToList(args.tags))
+    path = args.search_corpus if args.search_corpus is not None else args.search_index
+    sink = JSONLinesSink(args.output) if args.output is not None else None
+    try:
+        if args.search_corpus is not None:
+            corpus = CorpusStore(path)
+            try:
+                with contextlib.redirect_stdout(sys.stderr):
+                    result = searchCorpus(corpus, action, args.processes, sink=sink)
+            finally:
+                corpus.close()
+        else:
+            if not os.path.exists(path):
+                raise OSError('No such file')
+            index = InvertedIndex(path)
+            try:
+                result = searchIndex(index, action, sink)
+            finally:
+                index.close()
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print('%s: failed: %s' % (path, e), file=sys.stderr)
+        return 1
+    reportResult(result.startAddress, result, sink is None, args.stats, sys.stdout)
+    sys.stdout.flush()
+    return 0
+
+def workerMain(args):
+    """
+    Runs worker of distributed crawl described by command line arguments until the crawl ends. Returns exit status.
+
+    :type args: argparse.Namespace
+    :param args: Parsed command line arguments.
+    """
+
+    cache = PageCache(args.cache) if args.cache is not None else None
+    try:
+        address, authkey = parseAddress(args.worker), authkeyFrom(args.authkey)
+        with contextlib.redirect_stdout(sys.stderr):
+            stats = runWorker(address, authkey, cache=cache)
+    except (ValueError, OSError, multiprocessing.AuthenticationError) as e:
+        print('%s: failed: %s' % (args.worker, e), file=sys.stderr)
+        return 1
+    finally:
+        if cache is not None:
+            cache.close()
+    if args.stats:
+        print(json.dumps(stats.snapshot(), indent=4), file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
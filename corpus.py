@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import zlib
+
+class CorpusStore:
+    """
+    Stores HTML of sites downloaded during crawl, so other actions can be performed on them later without network access.
+
+    Sites are kept compressed in sqlite database together with their distance from start site
+    and are read back in the order in which they were added.
+    """
+    def __init__(self, path, commitEvery=256):
+        """
+        Creates CorpusStore object.
+
+        :type path: string
+        :param path: Path of sqlite database file.
+
+        :type commitEvery: int
+        :param commitEvery: Number of added sites after which they are committed to the file.
+        """
+
+        self.path = path
+        self.commitEvery = commitEvery
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS info (id INTEGER PRIMARY KEY CHECK (id = 0), startAddress TEXT, maxDepth INTEGER, '
+                        'startTime REAL, endTime REAL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY, site TEXT UNIQUE, dist INTEGER, html BLOB)')
+        self.db.commit()
+
+    def begin(self, startAddress, maxDepth, startTime, append=False):
+        """
+        Writes crawl description, removing sites stored by previous crawl unless append is set.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl began.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started.
+
+        :type append: bool
+        :param append: Flag specifying whether sites should be added to those stored by interrupted crawl.
+        """
+
+        with self.lock:
+            if append and self.db.execute('SELECT 1 FROM info').fetchone() is not None:
+                return
+            self.db.execute('DELETE FROM sites')
+            self.db.execute('INSERT OR REPLACE INTO info VALUES (0, ?, ?, ?, NULL)', (startAddress, maxDepth, startTime))
+            self.db.commit()
+
+    def add(self, siteAddress, dist, siteHTML):
+        """
+        Stores downloaded site.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type dist: int
+        :param dist: Distance of site from start site.
+
+        :type siteHTML: string
+        :param siteHTML: HTML document of site.
+        """
+
+        html = zlib.compress(siteHTML.encode('utf-8'))
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO sites (site, dist, html) VALUES (?, ?, ?)', (siteAddress, dist, html))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commitEvery:
+                self.db.commit()
+                self.uncommitted = 0
+
+    def end(self, endTime):
+        """
+        Writes crawl end time and commits stored sites.
+
+        :type endTime: float
+        :param endTime: Time at which crawl ended.
+        """
+
+        with self.lock:
+            self.db.execute('UPDATE info SET endTime = ?', (endTime,))
+            self.db.commit()
+            self.uncommitted = 0
+
+    def flush(self):
+        """
+        Commits stored sites to the file.
+        """
+
+        with self.lock:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def info(self):
+        """
+        Returns dictionary describing crawl which stored the sites or None if nothing was stored yet.
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT startAddress, maxDepth, startTime, endTime FROM info').fetchone()
+        if row is None:
+            return None
+        return {"startAddress": row[0], "maxDepth": row[1], "startTime": row[2], "endTime": row[3]}
+
+    def __iter__(self):
+        """
+        Yields tuples (siteAddress, dist, siteHTML) in the order in which sites were added.
+        """
+
+        # separate connection, so sites can be read while others are being added
+        db = sqlite3.connect(self.path)
+        try:
+            for siteAddress, dist, html in db.execute('SELECT site, dist, html FROM sites ORDER BY id'):
+                yield siteAddress, dist, zlib.decompress(html).decode('utf-8')
+        finally:
+            db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM sites').fetchone()[0]
+
+    def close(self):
+        """
+        Commits stored sites and closes the file.
+        """
+
+        with self.lock:
+            self.db.commit()
+            self.db.close()
@@ -1,15 +1,32 @@
 import queue
-import urllib.request
+import collections
+import concurrent.futures
+import contextlib
 import threading
 import re
-import bs4
 import time
+import os
+
+from fetching import downloadSitesAsync, fetchPage, errorStatus, MAX_BODY_SIZE
+from link_extraction import extractLinks
+from parsing import ParsedSite
+from priority import LinkHint
+from frontier import Frontier
+from result_files import BinaryResults, JSONLinesResults, readJSONLinesInfo, JSONLinesSink
+from checkpoint import Checkpoint
+from corpus import CorpusStore
+from inverted_index import InvertedIndex, extractTexts
+from matching import RegexMatcher, KeywordMatcher, SentenceMatcher, collectMatches
+from metrics import CrawlStats
+
+# time in seconds between checks whether crawl has been cancelled or ran out of its budget
+BUDGET_POLL_INTERVAL = 0.1
 
 class CrawlResult:
     """ 
     This class stores crawl data.
     """
-    def __init__(self, startAddress, maxDepth, startTime, endTime, results):
+    def __init__(self, startAddress, maxDepth, startTime, endTime, results, truncated=False, stats=None):
         """
         Creates CrawlResult object.
 
@@ -25,8 +42,15 @@ class CrawlResult:
         :type endTime: float
         :param endTimeL Time at which crawl ended.
 
-        :type results: dict
-        :param results: Dictionary containing crawl results for each of visited sites.
+        :type results: list
+        :param results: List of tuples (siteAddress, matches) containing crawl results for each of visited sites.
+                        Any iterable over such tuples, e.g. result_files.JSONLinesResults, can be used as well.
+
+        :type truncated: bool
+        :param truncated: Flag specifying whether crawl was cancelled or ran out of its budget before visiting all sites.
+
+        :type stats: metrics.CrawlStats
+        :param stats: Statistics of crawl, None for results which were not produced by crawl.
         """
 
         self.startAddress = startAddress
@@ -35,7 +59,16 @@ class CrawlResult:
         self.endTime = endTime
         self.crawlTime = endTime - startTime
         self.results = results
+        self.truncated = truncated
+        self.stats = stats
     
+    def matchCounts(self):
+        """
+        Returns dictionary containing number of matches found on each of visited sites.
+        """
+
+        return {siteAddress: len(foundOnSite) for siteAddress, foundOnSite in self.results}
+
     def jsonify(self):
         """
         Returns CrawlResult object in JSON format.
@@ -47,7 +80,8 @@ class CrawlResult:
             "startTime": self.startTime,
             "endTime": self.endTime,
             "crawlTime": self.crawlTime,
-            "results": self.results
+            "truncated": self.truncated,
+            "results": list(self.results)
         }
 
     @classmethod
@@ -59,36 +93,555 @@ class CrawlResult:
         :param fJSON: JSON object to load the data from.
         """
 
-        return cls(fJSON["startAddress"], fJSON["maxDepth"], fJSON["startTime"], fJSON["endTime"], fJSON["results"])
+        return cls(fJSON["startAddress"], fJSON["maxDepth"], fJSON["startTime"], fJSON["endTime"], fJSON["results"], fJSON.get("truncated", False))
+
+    @classmethod
+    def fromJSONLines(cls, path):
+        """
+        Creates CrawlResult object from JSON Lines file written by result_files.JSONLinesSink.
+
+        Results are not loaded into memory, they are read from the file each time they are iterated over.
+
+        :type path: string
+        :param path: Path of the file.
+        """
+
+        description, endTime, truncated = readJSONLinesInfo(path)
+        return cls(description["startAddress"], description["maxDepth"], description["startTime"], endTime, JSONLinesResults(path), truncated)
+
+    @classmethod
+    def fromBinary(cls, path):
+        """
+        Creates CrawlResult object from binary file written by result_files.saveBinary.
+
+        Results are not loaded into memory, each of them is read from memory-mapped file when accessed.
+
+        :type path: string
+        :param path: Path of the file.
+        """
+
+        results = BinaryResults(path)
+        info = results.info
+        return cls(info["startAddress"], info["maxDepth"], info["startTime"], info["endTime"], results, info["truncated"])
+
+    @classmethod
+    def fromCheckpoint(cls, cp):
+        """
+        Creates CrawlResult object with results found before checkpoint was made.
+
+        :type cp: checkpoint.Checkpoint
+        :param cp: Checkpoint of unfinished crawl.
+        """
+
+        results = JSONLinesResults(cp.sinkPath) if cp.sinkPath is not None else [(siteAddress, list(matches)) for siteAddress, matches in cp.results]
+        return cls(cp.startAddress, cp.maxDepth, cp.startTime, cp.savedTime, results, True)
+
+class ResultStore:
+    """
+    This class stores results of action for visited sites in order in which they were added.
+    """
+    def __init__(self, sink=None, onResult=None):
+        """
+        Creates empty ResultStore object.
+
+        :type sink: result_files.JSONLinesSink
+        :param sink: If given, results are written to it instead of being kept in memory.
+
+        :type onResult: function
+        :param onResult: If given, it is called with siteAddress and matches each time results of new site are added.
+        """
+
+        self.sites = {}
+        self.counts = {}
+        self.sink = sink
+        self.onResult = onResult
+
+    def add(self, siteAddress, matches):
+        """
+        Stores matches found on site, replacing ones stored for it before.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+        """
+
+        if self.sink is not None:
+            # site processed again is not written twice, as sink cannot replace its results
+            if siteAddress not in self.counts:
+                self.sink.write(siteAddress, matches)
+        else:
+            self.sites[siteAddress] = tuple(matches)
+        if self.onResult is not None and siteAddress not in self.counts:
+            self.onResult(siteAddress, matches)
+        self.counts[siteAddress] = len(matches)
+
+    def matchCounts(self):
+        """
+        Returns dictionary containing number of matches found on each of sites.
+        """
+
+        return dict(self.counts)
+
+    def restore(self, cp):
+        """
+        Loads results saved in checkpoint.
+
+        :type cp: checkpoint.Checkpoint
+        :param cp: Checkpoint of unfinished crawl.
+        """
+
+        for siteAddress, matches in cp.results:
+            self.sites[siteAddress] = tuple(matches)
+        self.counts.update(cp.counts)
+
+    def results(self):
+        """
+        Returns list of tuples (siteAddress, matches) in format used by CrawlResult
+        or, if results were written to sink, iterable reading them from it.
+        """
+
+        if self.sink is not None:
+            return self.sink.results()
+        return [(siteAddress, list(matches)) for siteAddress, matches in self.sites.items()]
+
+    def __len__(self):
+        return len(self.counts)
 
-def downloadSite(toVisit: queue.Queue, downloaded: queue.Queue, l: threading.Lock):
+class PageBuffer(queue.Queue):
     """
-    Downloads sites.
+    Queue of downloaded sites waiting to be processed, holding at most maxPages sites and maxBytes characters of HTML.
+
+    put() blocks while the buffer is full, so downloading slows down when processing cannot keep up.
+    """
+    def __init__(self, maxPages=0, maxBytes=0, stats=None):
+        """
+        Creates PageBuffer object.
+
+        :type maxPages: int
+        :param maxPages: The biggest number of buffered sites, 0 means no limit.
+
+        :type maxBytes: int
+        :param maxBytes: The biggest total length of buffered HTML documents, 0 means no limit.
+
+        :type stats: metrics.CrawlStats
+        :param stats: If given, buffered sites are counted in it as downloaded.
+        """
+
+        super().__init__(maxPages)
+        self.maxBytes = maxBytes
+        self.stats = stats
+        self.bytes = 0
+        self.totalPages = 0
+        self.totalBytes = 0
+
+    def isFull(self, item):
+        """
+        Returns True if item does not fit in the buffer now.
+
+        :type item: tuple
+        :param item: Tuple (siteAddress, dist, siteHTML) or None.
+        """
+
+        if item is None:
+            return False
+        if 0 < self.maxsize <= self._qsize():
+            return True
+        # single site bigger than the limit is let through when buffer is empty
+        return 0 < self.maxBytes < self.bytes + len(item[2]) and self.bytes > 0
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            while self.isFull(item):
+                self.not_full.wait()
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _put(self, item):
+        self.queue.append(item)
+        if item is not None:
+            self.bytes += len(item[2])
+            self.totalPages += 1
+            self.totalBytes += len(item[2])
+            if self.stats is not None:
+                self.stats.count('pages')
+                self.stats.count('bytesDecoded', len(item[2]))
+
+    def _get(self):
+        item = self.queue.popleft()
+        if item is not None:
+            self.bytes -= len(item[2])
+        return item
+
+class CrawlProgress:
+    """
+    Live statistics of running crawl, which can be read from other threads while crawl goes on.
+    """
+    def __init__(self):
+        """
+        Creates CrawlProgress object, which is filled once it is passed to crawl.
+        """
+
+        self.toVisit = None
+        self.downloaded = None
+        self.actionRes = None
+        self.startTime = None
+        self.finished = False
+
+    def attach(self, toVisit, downloaded, actionRes):
+        """
+        Makes statistics describe crawl using given queues and results.
+
+        :type toVisit: frontier.Frontier
+        :param toVisit: Stores unvisited sites.
+
+        :type downloaded: PageBuffer
+        :param downloaded: Stores downloaded sites.
+
+        :type actionRes: ResultStore
+        :param actionRes: Results of action performed on each of visited sites.
+        """
+
+        self.toVisit = toVisit
+        self.downloaded = downloaded
+        self.actionRes = actionRes
+        self.startTime = time.time()
+
+    def pagesDownloaded(self):
+        """
+        Returns number of sites downloaded so far.
+        """
+
+        return self.downloaded.totalPages if self.downloaded is not None else 0
 
-    :type toVisit: queue.Queue
+    def bytesDownloaded(self):
+        """
+        Returns total length of HTML documents downloaded so far.
+        """
+
+        return self.downloaded.totalBytes if self.downloaded is not None else 0
+
+    def pagesPerSecond(self):
+        """
+        Returns average number of sites downloaded per second.
+        """
+
+        if self.startTime is None:
+            return 0.0
+        return self.pagesDownloaded() / max(time.time() - self.startTime, 1e-6)
+
+    def queueDepth(self):
+        """
+        Returns number of sites waiting to be downloaded.
+        """
+
+        return self.toVisit.qsize() if self.toVisit is not None else 0
+
+    def sitesWithResults(self):
+        """
+        Returns number of sites on which action found anything.
+        """
+
+        return len(self.actionRes) if self.actionRes is not None else 0
+
+class CrawlBudget:
+    """
+    Cancellation token and limits of crawl, checked by all of its workers.
+
+    Once crawl is cancelled or its deadline passes, workers drop sites they get and crawl ends
+    as soon as sites being downloaded are finished. Once page or byte budget is used up,
+    no more sites are downloaded, but sites already downloaded are still processed.
+    Can be used by single crawl only.
+    """
+    def __init__(self, deadline=None, maxPages=None, maxBytes=None):
+        """
+        Creates CrawlBudget object.
+
+        :type deadline: float
+        :param deadline: Time (as returned by time.time()) at which crawl is stopped, None means no limit.
+
+        :type maxPages: int
+        :param maxPages: The biggest number of sites downloaded, None means no limit.
+
+        :type maxBytes: int
+        :param maxBytes: Number of characters of HTML after downloading which no more sites are downloaded, None means no limit.
+        """
+
+        self.deadline = deadline
+        self.maxPages = maxPages
+        self.maxBytes = maxBytes
+        self.pages = 0
+        self.bytes = 0
+        self.dropped = False
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+
+    def cancel(self):
+        """
+        Stops crawl. Can be called from any thread.
+        """
+
+        self.stopEvent.set()
+
+    def cancelled(self):
+        """
+        Returns True if crawl has been cancelled or its deadline has passed.
+        """
+
+        if not self.stopEvent.is_set() and self.deadline is not None and time.time() >= self.deadline:
+            self.stopEvent.set()
+        return self.stopEvent.is_set()
+
+    def exhausted(self):
+        """
+        Returns True if no more sites should be downloaded.
+        """
+
+        if self.cancelled():
+            return True
+        with self.lock:
+            return (self.maxPages is not None and self.pages >= self.maxPages) or (self.maxBytes is not None and self.bytes >= self.maxBytes)
+
+    def admit(self, pageBytes):
+        """
+        Charges downloaded site to the budget. Returns False if it does not fit and should be dropped.
+
+        :type pageBytes: int
+        :param pageBytes: Length of HTML document of site.
+        """
+
+        with self.lock:
+            if (self.maxPages is not None and self.pages >= self.maxPages) or (self.maxBytes is not None and self.bytes >= self.maxBytes) \
+                    or self.stopEvent.is_set():
+                self.dropped = True
+                return False
+            self.pages += 1
+            self.bytes += pageBytes
+            return True
+
+    def drop(self):
+        """
+        Records that site has been dropped without being visited.
+        """
+
+        self.dropped = True
+
+def downloadSite(toVisit: Frontier, downloaded: PageBuffer, l: threading.Lock, cache=None, maxBodySize=MAX_BODY_SIZE, budget=None, stats=None, hooks=None, reuse=None):
+    """
+    Downloads sites until it receives None from toVisit queue.
+
+    Every site taken from toVisit is either passed on to downloaded queue or,
+    if it could not be downloaded, marked as done in toVisit right away.
+    Outcome of every download is reported to toVisit, which may ask for site to be queued again.
+
+    :type toVisit: frontier.Frontier
     :param toVisit: Stores unvisited sites.
 
-    :type downloaded: queue.Queue
+    :type downloaded: PageBuffer
     :param downloaded: Stores downloaded sites.
 
     :type l: threading.Lock
     :param l: Thread lock used to secure thread-unsafe operations.
+
+    :type cache: caching.PageCache
+    :param cache: If given, fresh pages are taken from it and stale ones are revalidated.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of decompressed body in bytes, bigger sites are skipped.
+
+    :type budget: CrawlBudget
+    :param budget: If given, downloading stops once it is used up or cancelled.
+
+    :type stats: metrics.CrawlStats
+    :param stats: If given, time spent in downloading stages, active downloads and errors are recorded in it.
+
+    :type hooks: incremental.ManifestHooks
+    :param hooks: If given, it is asked which sites have to be downloaded and which of them have changed, see crawl.
+
+    :type reuse: function
+    :param reuse: Called with item taken from toVisit and what hooks stored for the site instead of passing on site
+                  which has not changed. Required if hooks are given.
     """
 
-    while toVisit.empty() == False:
-        siteAddress, dist = toVisit.get()
+    while True:
+        item = toVisit.get()
+        if item is None:
+            toVisit.task_done()
+            return
+        if budget is not None and budget.exhausted():
+            budget.drop()
+            toVisit.task_done(item, deferred=True)
+            return
+        siteAddress, dist = item
+        stored, headers = hooks.prefetch(siteAddress) if hooks is not None else (None, {})
+        if headers is None:
+            reuse(item, stored)
+            continue
+        requestTime = time.monotonic()
         try:
-            req = urllib.request.urlopen(siteAddress, timeout=10)
-            siteHTML = req.read().decode('ascii', 'ignore')
-            downloaded.put((siteAddress, dist, siteHTML))
-        except EnvironmentError as e:
-            l.acquire()
+            with stats.working('download') if stats is not None else contextlib.nullcontext():
+                siteHTML, responseHeaders = fetchPage(siteAddress, headers, 10, cache, maxBodySize, stats)
+        except Exception as e:
+            if stats is not None:
+                stats.count('fetchErrors')
+            status, retryAfter = errorStatus(e)
+            if toVisit.fetched(siteAddress, status, time.monotonic() - requestTime, retryAfter):
+                toVisit.requeue(siteAddress, dist)
+                toVisit.task_done(item)
+                continue
+            with l:
+                print('\n', siteAddress, e)
+            if hooks is not None and hooks.failed(siteAddress, stored, status):
+                reuse(item, stored)
+            else:
+                toVisit.task_done(item)
+            continue
+        toVisit.fetched(siteAddress, 200, time.monotonic() - requestTime)
+        # sites not modified are not charged to budget
+        if siteHTML is not None and budget is not None and not budget.admit(len(siteHTML)):
+            toVisit.task_done(item, deferred=True)
+            continue
+        if hooks is not None and hooks.fetched(siteAddress, stored, siteHTML, responseHeaders):
+            reuse(item, stored)
+            continue
+        downloaded.put((siteAddress, dist, siteHTML))
+
+def reuseSite(toVisit: Frontier, actionRes: ResultStore, hooks, item, stored, l: threading.Lock, budget=None):
+    """
+    Finishes site which has not changed or could not be checked, queueing its stored links and keeping
+    its stored matches instead of processing it again.
+
+    :type toVisit: frontier.Frontier
+    :param toVisit: Stores unvisited sites.
+
+    :type actionRes: ResultStore
+    :param actionRes: Results of action performed on each of visited sites.
+
+    :type hooks: incremental.ManifestHooks
+    :param hooks: Hooks which found site unchanged, told that it is reused.
+
+    :type item: tuple
+    :param item: Tuple (url, dist) taken from toVisit.
+
+    :type stored: incremental.ManifestEntry
+    :param stored: What was stored about the site, with its links and matches.
+
+    :type l: threading.Lock
+    :param l: Thread lock used to secure thread-unsafe operations.
+
+    :type budget: CrawlBudget
+    :param budget: If given, links are not followed once it is used up.
+    """
+
+    siteAddress, dist = item
+    try:
+        depthAllows = dist < toVisit.maxDepth or toVisit.maxDepth == -1
+        if depthAllows and (budget is None or not budget.exhausted()):
+            for link in stored.links:
+                toVisit.put(link, dist+1)
+        elif depthAllows and toVisit.tracksPending():
+            for link in stored.links:
+                toVisit.defer(link, dist+1)
+        hooks.reused(siteAddress, dist, stored)
+        if stored.matches:
+            with l:
+                actionRes.add(siteAddress, stored.matches)
+    except Exception as e:
+        with l:
             print('\n', siteAddress, e)
-            l.release()
+    finally:
+        toVisit.task_done(item)
+
+class SentenceSearch:
+    """
+    Picklable action searching parsed HTML document for sentences containing specified word.
+    """
+    def __init__(self, word, caseSensitive, tagsListToSearch, maxMatches=None):
+        """
+        Creates SentenceSearch object. See searchForSentencesContainingWord for parameters description.
+        """
+
+        self.word = word
+        self.caseSensitive = caseSensitive
+        self.tagsListToSearch = tagsListToSearch
+        self.maxMatches = maxMatches
+        self.matcher = SentenceMatcher(word, caseSensitive)
+
+    def spec(self):
+        """
+        Returns description of action from which it can be recreated with actionFromSpec.
+        """
+
+        return {"type": "sentences", "word": self.word, "caseSensitive": self.caseSensitive,
+                "tagsListToSearch": self.tagsListToSearch, "maxMatches": self.maxMatches}
+
+    def __call__(self, parsedSite):
+        return collectMatches(self.matcher, parsedSite.tagTexts(self.tagsListToSearch, bodyOnly=True), self.maxMatches)
+
+class WordSearch:
+    """
+    Picklable action searching parsed HTML document for specified words.
+    """
+    def __init__(self, word, caseSensitive, tagsListToSearch, engine='keywords', maxMatches=None):
+        """
+        Creates WordSearch object. See searchForWord for parameters description.
+        """
+
+        self.word = word
+        self.caseSensitive = caseSensitive
+        self.tagsListToSearch = tagsListToSearch
+        self.maxMatches = maxMatches
+        self.engine = engine
+        words = [word] if isinstance(word, str) else list(word)
+        if engine == 'keywords':
+            self.matcher = KeywordMatcher(words, caseSensitive)
+        elif engine == 'regex':
+            self.matcher = RegexMatcher(r'\b(?:' + '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True)) + r')\b', caseSensitive)
+        else:
+            raise ValueError('Unknown matcher engine: ' + str(engine))
+
+    def spec(self):
+        """
+        Returns description of action from which it can be recreated with actionFromSpec.
+        """
+
+        return {"type": "words", "word": self.word, "caseSensitive": self.caseSensitive,
+                "tagsListToSearch": self.tagsListToSearch, "engine": self.engine, "maxMatches": self.maxMatches}
+
+    def __call__(self, parsedSite):
+        return collectMatches(self.matcher, parsedSite.tagTexts(self.tagsListToSearch), self.maxMatches)
 
-def searchForSentencesContainingWord(word: str, caseSensitive: bool, tagsListToSearch: list):
+class PatternSearch:
     """
-    Returns function that searches HTML document for sentences containing specified word.
+    Picklable action searching parsed HTML document for texts matching specified pattern.
+    """
+    def __init__(self, pattern, caseSensitive, tagsListToSearch, maxMatches=None):
+        """
+        Creates PatternSearch object. See searchForPattern for parameters description.
+        """
+
+        self.pattern = pattern
+        self.caseSensitive = caseSensitive
+        self.tagsListToSearch = tagsListToSearch
+        self.maxMatches = maxMatches
+        self.matcher = RegexMatcher(pattern, caseSensitive)
+
+    def spec(self):
+        """
+        Returns description of action from which it can be recreated with actionFromSpec.
+        """
+
+        return {"type": "pattern", "pattern": self.pattern, "caseSensitive": self.caseSensitive,
+                "tagsListToSearch": self.tagsListToSearch, "maxMatches": self.maxMatches}
+
+    def __call__(self, parsedSite):
+        return collectMatches(self.matcher, parsedSite.tagTexts(self.tagsListToSearch), self.maxMatches)
+
+def searchForSentencesContainingWord(word: str, caseSensitive: bool, tagsListToSearch: list, maxMatches=None):
+    """
+    Returns function that searches parsed HTML document (parsing.ParsedSite) for sentences containing specified word.
 
     :type word: string
     :param word: Word to search for in sentences.
@@ -98,25 +651,16 @@ def searchForSentencesContainingWord(word: str, caseSensitive: bool, tagsListToS
 
     :type tagsListToSearch: list
     :param tagsListToSearch: List of tags inside of which searching should be performed.
+
+    :type maxMatches: int
+    :param maxMatches: If given, site is searched only until that many distinct matches are found.
     """
     
-    def aux(siteHTML):
-        if caseSensitive:
-            regEx = re.compile(r'((?:(?:\b' + word + r'\b)|(?:[A-Z](?:[a-zA-Z0-9, \'])*?\b' + word + r'\b))(?:[a-zA-Z0-9, \'])*?(?:(?:\.\.\.)|[\.\!\?]){1})')
-        else:
-            regEx = re.compile(r'((?:(?:\b' + word + r'\b)|(?:[A-Z](?:[a-zA-Z0-9, \'])*?\b' + word + r'\b))(?:[a-zA-Z0-9, \'])*?(?:(?:\.\.\.)|[\.\!\?]){1})', re.IGNORECASE)
-        bs = bs4.BeautifulSoup(siteHTML, 'lxml')
-        sentencesContainingWord = []
-        for tag in bs.body.findAll(tagsListToSearch):
-            for match in regEx.finditer(tag.text):
-                if not match.group() in sentencesContainingWord:
-                    sentencesContainingWord.append(match.group())
-        return sentencesContainingWord
-    return aux
+    return SentenceSearch(word, caseSensitive, tagsListToSearch, maxMatches)
 
-def searchForWord(word: str, caseSensitive: bool, tagsListToSearch: list):
+def searchForWord(word: str, caseSensitive: bool, tagsListToSearch: list, engine='keywords', maxMatches=None):
     """
-    Returns function that searches HTML document for specified word.
+    Returns function that searches parsed HTML document (parsing.ParsedSite) for specified word.
 
     :type word: string
     :param word: Word to search for in HTML tags.
@@ -126,25 +670,41 @@ def searchForWord(word: str, caseSensitive: bool, tagsListToSearch: list):
 
     :type tagsListToSearch: list
     :param tagsListToSearch: List of tags inside of which searching should be performed.
+
+    :type engine: string
+    :param engine: 'keywords' to use matching.KeywordMatcher or 'regex' to use regular expression.
+
+    :type maxMatches: int
+    :param maxMatches: If given, site is searched only until that many distinct matches are found.
     """
 
-    def aux(siteHTML):
-        if caseSensitive:
-            regEx = re.compile(r'\b' + word + r'\b')
-        else:
-            regEx = re.compile(r'\b' + word + r'\b', re.IGNORECASE)
-        bs = bs4.BeautifulSoup(siteHTML, 'lxml')
-        tagsContainingWord = []
-        for tag in bs.findAll(tagsListToSearch):
-            for match in regEx.finditer(tag.text):
-                if not match.group() in tagsContainingWord:
-                    tagsContainingWord.append(match.group())
-        return tagsContainingWord
-    return aux
+    return WordSearch(word, caseSensitive, tagsListToSearch, engine, maxMatches)
 
-def searchForPattern(pattern: str, caseSensitive: bool, tagsListToSearch: list):
+def searchForWords(words: list, caseSensitive: bool, tagsListToSearch: list, engine='keywords', maxMatches=None):
     """
-    Returns function that searches HTML texts matching specified pattern.
+    Returns function that searches parsed HTML document (parsing.ParsedSite) for any of specified words in single pass.
+
+    :type words: list
+    :param words: Words to search for in HTML tags.
+
+    :type caseSensitive: bool
+    :param caseSensitive: Flag specifying whether capital and lowercase letters should be treated as the same.
+
+    :type tagsListToSearch: list
+    :param tagsListToSearch: List of tags inside of which searching should be performed.
+
+    :type engine: string
+    :param engine: 'keywords' to use matching.KeywordMatcher or 'regex' to use regular expression.
+
+    :type maxMatches: int
+    :param maxMatches: If given, site is searched only until that many distinct matches are found.
+    """
+
+    return WordSearch(words, caseSensitive, tagsListToSearch, engine, maxMatches)
+
+def searchForPattern(pattern: str, caseSensitive: bool, tagsListToSearch: list, maxMatches=None):
+    """
+    Returns function that searches parsed HTML document (parsing.ParsedSite) for texts matching specified pattern.
 
     :type pattern: string
     :param pattern: Regular expression.
@@ -154,36 +714,106 @@ def searchForPattern(pattern: str, caseSensitive: bool, tagsListToSearch: list):
 
     :type tagsListToSearch: list
     :param tagsListToSearch: List of tags inside of which searching should be performed.
+
+    :type maxMatches: int
+    :param maxMatches: If given, site is searched only until that many distinct matches are found.
     """
 
-    def aux(siteHTML):
-        if caseSensitive:
-            regEx = re.compile(pattern)
-        else:
-            regEx = re.compile(pattern, re.IGNORECASE)
-        bs = bs4.BeautifulSoup(siteHTML, 'lxml')
-        tagsContainingMatch = []
-        for tag in bs.findAll(tagsListToSearch):
-            for match in regEx.finditer(tag.text):
-                if not match.group() in tagsContainingMatch:
-                    tagsContainingMatch.append(match.group())
-        return tagsContainingMatch
-    return aux
+    return PatternSearch(pattern, caseSensitive, tagsListToSearch, maxMatches)
+
+def actionFromSpec(spec: dict):
+    """
+    Returns action described by dictionary returned by its spec() method.
+
+    :type spec: dict
+    :param spec: Description of action.
+    """
+
+    if spec["type"] == "sentences":
+        return SentenceSearch(spec["word"], spec["caseSensitive"], spec["tagsListToSearch"], spec.get("maxMatches"))
+    if spec["type"] == "words":
+        return WordSearch(spec["word"], spec["caseSensitive"], spec["tagsListToSearch"], spec.get("engine", "keywords"), spec.get("maxMatches"))
+    if spec["type"] == "pattern":
+        return PatternSearch(spec["pattern"], spec["caseSensitive"], spec["tagsListToSearch"], spec.get("maxMatches"))
+    raise ValueError('Unknown action type: ' + str(spec["type"]))
+
+def getLinks(parsedSite: ParsedSite, siteAddress: str, aAttrsFilter: dict):
+    """
+    Returns list of canonical addresses of sites linked from parsed site, without repetitions.
+
+    Links are found by link_extraction.extractLinks in HTML of the site, its BeautifulSoup tree is not used.
 
-def processSite(toVisit: queue.Queue, downloaded: queue.Queue, visited: set, actionRes: list, maxDepth, aAttrsFilter: dict, action, l: threading.Lock):
+    :type parsedSite: parsing.ParsedSite
+    :param parsedSite: Site to get links from.
+
+    :type siteAddress: string
+    :param siteAddress: Address of the site, against which relative links are resolved unless it has <base> tag.
+
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+    """
+
+    return extractLinks(parsedSite.html, siteAddress, aAttrsFilter)
+
+def processBatch(batch: list, maxDepth, aAttrsFilter: dict, action, indexTags=None, anchorTexts=False):
     """
-    Gets all links from site and returns result of action on it.
+    Parses batch of downloaded sites and performs action on them. Meant to be run in worker process.
+
+    Returns list of tuples (siteAddress, dist, links, result, error, texts, timings) in the same order as in batch,
+    where timings are times in seconds spent in parse, links and action stages.
+
+    :type batch: list
+    :param batch: List of tuples (siteAddress, dist, siteHTML).
+
+    :type maxDepth: int
+    :param maxDepth: The biggest distance from start site crawler can reach.
 
-    :type toVisit: queue.Queue
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+    :type action: function
+    :param action: Picklable action to perform on downloaded sites.
+
+    :type indexTags: list
+    :param indexTags: If given, texts of tags with these names are extracted for inverted_index.InvertedIndex, otherwise texts is None.
+
+    :type anchorTexts: bool
+    :param anchorTexts: Flag specifying whether links should be returned as tuples (address, text), see link_extraction.extractLinks.
+    """
+
+    processed = []
+    for siteAddress, dist, siteHTML in batch:
+        try:
+            start = time.perf_counter()
+            links = []
+            if dist < maxDepth or maxDepth == -1:
+                links = extractLinks(siteHTML, siteAddress, aAttrsFilter, anchorTexts)
+            linked = time.perf_counter()
+            parsedSite = ParsedSite(siteHTML)
+            parsed = time.perf_counter()
+            result = action(parsedSite)
+            timings = {"links": linked - start, "parse": parsed - linked, "action": time.perf_counter() - parsed}
+            texts = extractTexts(parsedSite, indexTags) if indexTags is not None else None
+            processed.append((siteAddress, dist, links, result, None, texts, timings))
+        except Exception as e:
+            processed.append((siteAddress, dist, [], [], str(e), None, {}))
+    return processed
+
+def processSite(toVisit: Frontier, downloaded: PageBuffer, actionRes: ResultStore, maxDepth, aAttrsFilter: dict, action, l: threading.Lock, corpus=None, index=None, budget=None, stats=None, hooks=None):
+    """
+    Gets all links from sites and stores results of action on them until it receives None from downloaded queue.
+
+    Links are put back to toVisit as soon as site is processed. Site is marked
+    as done in toVisit only after all of its links have been queued,
+    so toVisit.join() returns once there is nothing left to crawl.
+
+    :type toVisit: frontier.Frontier
     :param toVisit: Stores unvisited sites.
 
-    :type downloaded: queue.Queue
+    :type downloaded: PageBuffer
     :param downloaded: Stores downloaded sites.
 
-    :type visited: set
-    :param visited: Stores visited sites.
-
-    :type actionRes: list
+    :type actionRes: ResultStore
     :param actionRes: Results of action performed on each of visited sites.
 
     :type maxDepth: int
@@ -193,46 +823,240 @@ def processSite(toVisit: queue.Queue, downloaded: queue.Queue, visited: set, act
     :param aAttrsFilter: Contains allowed attribute values of <a> tags.
 
     :type action: function
-    :param action: Action to perform on downloaded sites.
+    :param action: Action to perform on downloaded sites. It is given parsing.ParsedSite object.
 
     :type l: threading.Lock
     :param l: Thread lock used to secure thread-unsafe operations.
+
+    :type corpus: corpus.CorpusStore
+    :param corpus: If given, downloaded sites are stored in it.
+
+    :type index: inverted_index.InvertedIndex
+    :param index: If given, texts of processed sites are added to it.
+
+    :type budget: CrawlBudget
+    :param budget: If given, sites are dropped once crawl is cancelled and links are not followed once it is used up.
+
+    :type stats: metrics.CrawlStats
+    :param stats: If given, time spent in processing stages, active workers and errors are recorded in it.
+
+    :type hooks: incremental.ManifestHooks
+    :param hooks: If given, it is told about links and results of every processed site, see crawl.
     """
     
-    while downloaded.empty() == False:
-        siteAddress, dist, siteHTML = downloaded.get()
-        l.acquire()
-        visited.add(siteAddress)
-        l.release()
-        if dist < maxDepth or maxDepth == -1:
-            bs = bs4.BeautifulSoup(siteHTML, 'lxml')
-            for tag in bs.body.findAll('a', attrs=aAttrsFilter):
-                link = tag.get('href')
-                if not re.match(r'#.*', link): # don't try to follow anchors
-                    matchObj1 = re.match(r'(\/.*)', link) # hrefs of type '/link' which should be interpreted as 'root/link'
-                    matchObj2 = re.match(r'(\/\/.+)', link) # hrefs of type '//link' which should be interpreted as 'http://link'
-                    if matchObj2:
-                        fullLink = r'http:' + matchObj2.group(1)
-                    elif matchObj1:
-                        fullLink = re.match(r'(.+)\/', siteAddress).group(1) + matchObj1.group(1)
-                    else:
-                        fullLink = link # regular hrefs of type http[s]://link
-                    matchObj = re.match(r'(.+)\#.*', fullLink) # escape anchors
-                    if matchObj:
-                        fullLink = matchObj.group(1)
-                    if not fullLink in visited:
-                        toVisit.put((fullLink, dist+1))
-
-        result = action(siteHTML)
-        if len(result) != 0:
-            l.acquire()
-            actionRes.append((siteAddress, result))
-            l.release()
+    stats = stats if stats is not None else CrawlStats()
+    while True:
+        item = downloaded.get()
+        if item is None:
+            return
+        siteAddress, dist, siteHTML = item
+        if budget is not None and budget.cancelled():
+            budget.drop()
+            toVisit.task_done((siteAddress, dist), deferred=True)
+            continue
+        stats.started('process')
+        try:
+            if corpus is not None:
+                corpus.add(siteAddress, dist, siteHTML)
+            follow = (dist < maxDepth or maxDepth == -1) and (budget is None or not budget.exhausted())
+            # links not followed because budget is used up are kept pending, so resumed crawl follows them
+            defer = (dist < maxDepth or maxDepth == -1) and not follow and toVisit.tracksPending()
+            # links are found without building BeautifulSoup tree, so they are queued before site is parsed,
+            # unless frontier orders them using result of action
+            hints = follow and toVisit.usesHints()
+            # hooks are given links even if they are not followed
+            links = []
+            if (follow and not hints) or defer or hooks is not None:
+                with stats.timed('links'):
+                    links = extractLinks(siteHTML, siteAddress, aAttrsFilter)
+                for fullLink in links:
+                    if follow:
+                        toVisit.put(fullLink, dist+1)
+                    elif defer:
+                        toVisit.defer(fullLink, dist+1)
+            with stats.timed('parse'):
+                parsedSite = ParsedSite(siteHTML)
 
-def crawl(startPage, maxDepth, aAttrsFilter, action):
+            if index is not None:
+                index.addSite(siteAddress, parsedSite)
+            with stats.timed('action'):
+                result = action(parsedSite)
+            if hints:
+                with stats.timed('links'):
+                    links = extractLinks(siteHTML, siteAddress, aAttrsFilter, anchorTexts=True)
+                for fullLink, text in links:
+                    toVisit.put(fullLink, dist+1, LinkHint(text, len(result)))
+            if hooks is not None:
+                hooks.processed(siteAddress, dist, siteHTML, links, result)
+            if len(result) != 0:
+                # lock is released even if sink fails to write results, which counts as error of the site
+                with l:
+                    actionRes.add(siteAddress, result)
+        except Exception as e:
+            stats.count('processErrors')
+            with l:
+                print('\n', siteAddress, e)
+        finally:
+            stats.stopped('process')
+            toVisit.task_done((siteAddress, dist))
+
+def processSitesInPool(toVisit: Frontier, downloaded: PageBuffer, actionRes: ResultStore, maxDepth, aAttrsFilter: dict, action, processes: int, batchSize: int, l: threading.Lock, corpus=None, index=None, budget=None, stats=None, hooks=None):
+    """
+    Processes sites in pool of worker processes until it receives None from downloaded queue.
+
+    Downloaded sites are sent to workers in batches of at most batchSize sites.
+    Links and results returned by workers are handled the same way processSite handles them.
+
+    :type toVisit: frontier.Frontier
+    :param toVisit: Stores unvisited sites.
+
+    :type downloaded: PageBuffer
+    :param downloaded: Stores downloaded sites.
+
+    :type actionRes: ResultStore
+    :param actionRes: Results of action performed on each of visited sites.
+
+    :type maxDepth: int
+    :param maxDepth: The biggest distance from start site crawler can reach.
+
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+    :type action: function
+    :param action: Picklable action to perform on downloaded sites.
+
+    :type processes: int
+    :param processes: Number of worker processes.
+
+    :type batchSize: int
+    :param batchSize: The biggest number of sites sent to worker at once.
+
+    :type l: threading.Lock
+    :param l: Thread lock used to secure thread-unsafe operations.
+
+    :type corpus: corpus.CorpusStore
+    :param corpus: If given, downloaded sites are stored in it.
+
+    :type index: inverted_index.InvertedIndex
+    :param index: If given, texts of processed sites are added to it.
+
+    :type budget: CrawlBudget
+    :param budget: If given, sites are dropped once crawl is cancelled and links are not followed once it is used up.
+
+    :type stats: metrics.CrawlStats
+    :param stats: If given, time spent in processing stages, batches being processed and errors are recorded in it.
+
+    :type hooks: incremental.ManifestHooks
+    :param hooks: If given, it is told about links and results of every processed site, see crawl.
+    """
+
+    stats = stats if stats is not None else CrawlStats()
+    # limits number of batches waiting for workers, so downloaded sites are not all copied to the pool at once
+    inFlight = threading.Semaphore(2 * processes)
+    hints = toVisit.usesHints()
+
+    def collect(future, batch):
+        try:
+            processed = future.result()
+        except Exception as e:
+            processed = [(siteAddress, dist, [], [], str(e), None, {}) for siteAddress, dist, _ in batch]
+        stats.stopped('process')
+        # exceptions raised here would be swallowed by the executor, so every site is marked as done whatever happens
+        try:
+            for (siteAddress, dist, links, result, error, texts, timings), (_, _, siteHTML) in zip(processed, batch):
+                try:
+                    for stage, seconds in timings.items():
+                        stats.record(stage, seconds)
+                    if error is not None:
+                        stats.count('processErrors')
+                    if texts is not None:
+                        index.add(siteAddress, texts)
+                    if hooks is not None:
+                        if error is None:
+                            hooks.processed(siteAddress, dist, siteHTML, links, result)
+                        if not (dist < maxDepth or maxDepth == -1):
+                            # links were extracted only for hooks
+                            links = []
+                    with l:
+                        if error is not None:
+                            print('\n', siteAddress, error)
+                        if budget is None or not budget.exhausted():
+                            for link in links:
+                                if hints:
+                                    toVisit.put(link[0], dist+1, LinkHint(link[1], len(result)))
+                                else:
+                                    toVisit.put(link, dist+1)
+                        elif toVisit.tracksPending():
+                            # kept pending, so resumed crawl follows them
+                            for link in links:
+                                toVisit.defer(link[0] if hints else link, dist+1)
+                        if len(result) != 0:
+                            actionRes.add(siteAddress, result)
+                except Exception as e:
+                    stats.count('processErrors')
+                    with l:
+                        print('\n', siteAddress, e)
+                finally:
+                    toVisit.task_done((siteAddress, dist))
+        finally:
+            inFlight.release()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        finished = False
+        while not finished:
+            item = downloaded.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < batchSize:
+                try:
+                    item = downloaded.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            if budget is not None and budget.cancelled():
+                budget.drop()
+                for siteAddress, dist, _ in batch:
+                    toVisit.task_done((siteAddress, dist), deferred=True)
+                continue
+            if corpus is not None:
+                stored = []
+                for siteAddress, dist, siteHTML in batch:
+                    try:
+                        corpus.add(siteAddress, dist, siteHTML)
+                        stored.append((siteAddress, dist, siteHTML))
+                    except Exception as e:
+                        stats.count('processErrors')
+                        with l:
+                            print('\n', siteAddress, e)
+                        toVisit.task_done((siteAddress, dist))
+                batch = stored
+                if not batch:
+                    continue
+            inFlight.acquire()
+            # batch counts as active from being sent to the pool until its results are collected
+            stats.started('process')
+            try:
+                # with hooks links of every site are extracted, as they are given links even if they are not followed
+                future = executor.submit(processBatch, batch, maxDepth if hooks is None else -1, aAttrsFilter, action,
+                                         index.tags if index is not None else None, hints)
+            except Exception as e:
+                # e.g. broken pool, reported for every site of the batch by collect
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda f, batch=batch: collect(f, batch))
+
+def crawl(startPage, maxDepth, aAttrsFilter, action, downloadThreads=8, processThreads=8, fetcher=None, processes=None, batchSize=16, frontier=None, maxBufferedPages=1000, maxBufferedBytes=0, sink=None, checkpointPath=None, checkpointInterval=60, resume=None, cache=None, corpus=None, index=None, maxBodySize=MAX_BODY_SIZE, onResult=None, progress=None, budget=None, stats=None, metricsPath=None, metricsInterval=10, hooks=None):
     """
     Traverses the Internet and returns CrawlResult object.
 
+    Downloading and processing run concurrently in long-lived worker threads,
+    so links found on processed sites are downloaded without waiting
+    for the rest of the sites at the same distance.
+
     :type startPage: string
     :param startPage: Address of site from which crawl begins.
 
@@ -243,35 +1067,334 @@ def crawl(startPage, maxDepth, aAttrsFilter, action):
     :param aAttrsFilter: Contains allowed attribute values of <a> tags.
 
     :type action: function
-    :param action: Action to perform on downloaded sites.
+    :param action: Action to perform on downloaded sites. It is given parsing.ParsedSite object.
+
+    :type downloadThreads: int
+    :param downloadThreads: Number of threads downloading sites.
+
+    :type processThreads: int
+    :param processThreads: Number of threads processing downloaded sites.
+
+    :type fetcher: fetching.AsyncFetcher
+    :param fetcher: If given, sites are downloaded with it in a single asyncio thread instead of downloadThreads threads.
+
+    :type processes: int
+    :param processes: If given, sites are processed in pool of that many worker processes instead of processThreads threads. Action has to be picklable then.
+
+    :type batchSize: int
+    :param batchSize: The biggest number of sites sent to worker process at once.
+
+    :type frontier: frontier.Frontier
+    :param frontier: Stores unvisited and seen sites, e.g. one returned by frontier.diskFrontier, one with politeness.HostQueue
+                     as urlQueue to crawl hosts politely or one returned by priority.bestFirstFrontier to download
+                     most relevant sites first. Defaults to in-memory Frontier.
+
+    :type maxBufferedPages: int
+    :param maxBufferedPages: The biggest number of downloaded sites waiting to be processed, 0 means no limit.
+
+    :type maxBufferedBytes: int
+    :param maxBufferedBytes: The biggest total length of downloaded HTML documents waiting to be processed, 0 means no limit.
+
+    :type sink: result_files.JSONLinesSink
+    :param sink: If given, results of each site are written to it as soon as they are found instead of being kept in memory.
+
+    :type checkpointPath: string
+    :param checkpointPath: If given, state of crawl is saved there every checkpointInterval seconds, so it can be resumed with resumeCrawl. File is removed once crawl ends.
+
+    :type checkpointInterval: float
+    :param checkpointInterval: Time in seconds between checkpoints.
+
+    :type resume: checkpoint.Checkpoint
+    :param resume: Checkpoint from which crawl is continued instead of starting from startPage.
+
+    :type cache: caching.PageCache
+    :param cache: If given, pages are taken from it when fresh or not modified, and stored in it when downloaded.
+
+    :type corpus: corpus.CorpusStore
+    :param corpus: If given, HTML of every downloaded site is stored in it, so other actions can be performed on it later with searchCorpus.
+
+    :type index: inverted_index.InvertedIndex
+    :param index: If given, texts of processed sites are indexed in it, so searches can be answered later with searchIndex.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of decompressed body of site in bytes, bigger sites are skipped. Used by fetcher instead if it is given.
+
+    :type onResult: function
+    :param onResult: If given, it is called with siteAddress and matches as soon as results of site are found. It is called from worker threads.
+
+    :type progress: CrawlProgress
+    :param progress: If given, it is filled with live statistics of the crawl.
+
+    :type budget: CrawlBudget
+    :param budget: If given, crawl can be cancelled with it and ends once its deadline passes or its page or byte budget is used up.
+                   Returned result is marked as truncated then and checkpoint, if saved, is kept so crawl can be resumed.
+
+    :type stats: metrics.CrawlStats
+    :param stats: Statistics of the crawl, which can be read while it runs. New one is created if not given.
+                  They are returned as stats of CrawlResult.
+
+    :type metricsPath: string
+    :param metricsPath: If given, statistics of crawl are written there in Prometheus text format every metricsInterval seconds and when crawl ends.
+
+    :type metricsInterval: float
+    :param metricsInterval: Time in seconds between writing statistics.
+
+    :type hooks: incremental.ManifestHooks
+    :param hooks: If given, before each site is downloaded prefetch(siteAddress) returns tuple (stored, headers)
+                  of what was stored about the site and conditional request headers, None if site need not be downloaded.
+                  After download fetched(siteAddress, stored, siteHTML, responseHeaders) returns True if site has not
+                  changed (siteHTML is None for 304 Not Modified), and failed(siteAddress, stored, status) returns True
+                  if site which could not be downloaded should keep what was stored. Such sites are not processed,
+                  links and matches of stored are reused and reused(siteAddress, dist, stored) is called.
+                  Other sites are passed to processed(siteAddress, dist, siteHTML, links, matches) once processed.
+                  Used by incremental.recrawl, frontiers ordering sites by hints are rejected with ValueError then.
     """
 
-    toVisit = queue.Queue()
-    downloaded = queue.Queue()
-    visited = set()
-    actionRes = []
+    if frontier is None:
+        frontier = Frontier(maxDepth)
+    if hooks is not None and frontier.usesHints():
+        # links of unchanged sites are reused without their anchor texts and matches, so they cannot be scored
+        raise ValueError('Crawl with hooks cannot order sites by hints')
+    frontier.maxDepth = maxDepth
+    toVisit = frontier
+    if checkpointPath is not None:
+        toVisit.trackPending()
+    if stats is None:
+        stats = CrawlStats()
+    downloaded = PageBuffer(maxBufferedPages, maxBufferedBytes, stats)
+    stats.watch('toVisit', toVisit.qsize)
+    stats.watch('downloaded', downloaded.qsize)
+    actionRes = ResultStore(sink, onResult)
     l = threading.Lock()
-    startTime = time.time()
+    if progress is not None:
+        progress.attach(toVisit, downloaded, actionRes)
+
+    if resume is not None:
+        startTime = resume.startTime
+        for key, dist in resume.seen:
+            toVisit.seen[key] = dist
+        actionRes.restore(resume)
+        if sink is not None:
+            sink.begin(startPage, maxDepth, startTime, append=True)
+        if corpus is not None:
+            corpus.begin(startPage, maxDepth, startTime, append=True)
+        if index is not None:
+            index.begin(startPage, maxDepth, append=True)
+        for url, dist in resume.pending:
+            toVisit.requeue(url, dist)
+    else:
+        startTime = time.time()
+        if sink is not None:
+            sink.begin(startPage, maxDepth, startTime)
+        if corpus is not None:
+            corpus.begin(startPage, maxDepth, startTime)
+        if index is not None:
+            index.begin(startPage, maxDepth)
+        toVisit.put(startPage, 0)
+    if fetcher is not None:
+        downloadThreads = 1
+        if cache is not None:
+            fetcher.cache = cache
+        fetcher.stats = stats
+
+    def reuse(item, stored):
+        reuseSite(toVisit, actionRes, hooks, item, stored, l, budget)
+
+    threads = []
+    for _ in range(max(1, downloadThreads)):
+        if fetcher is not None:
+            t = threading.Thread(target=downloadSitesAsync, args=(toVisit, downloaded, fetcher, l, budget, hooks, reuse), daemon=True)
+        else:
+            t = threading.Thread(target=downloadSite, args=(toVisit, downloaded, l, cache, maxBodySize, budget, stats, hooks, reuse), daemon=True)
+        threads.append(t)
+        t.start()
+    if processes is not None:
+        processThreads = 1
+    for _ in range(max(1, processThreads)):
+        if processes is not None:
+            t = threading.Thread(target=processSitesInPool, args=(toVisit, downloaded, actionRes, maxDepth, aAttrsFilter, action, processes, batchSize, l, corpus, index, budget, stats, hooks), daemon=True)
+        else:
+            t = threading.Thread(target=processSite, args=(toVisit, downloaded, actionRes, maxDepth, aAttrsFilter, action, l, corpus, index, budget, stats, hooks), daemon=True)
+        threads.append(t)
+        t.start()
+
+    def saveCheckpoint():
+        l.acquire()
+        try:
+            pending, seen = toVisit.snapshot()
+            cp = Checkpoint(startPage, maxDepth, aAttrsFilter, action.spec() if hasattr(action, 'spec') else None, startTime,
+                            pending, seen, actionRes.results() if sink is None else [], actionRes.matchCounts(),
+                            sink.path if sink is not None else None, corpusPath=corpus.path if corpus is not None else None,
+                            indexPath=index.path if index is not None else None)
+        finally:
+            l.release()
+        if corpus is not None:
+            corpus.flush()
+        if index is not None:
+            index.flush()
+        cp.save(checkpointPath)
 
-    toVisit.put((startPage, 0))
-    while toVisit.empty() == False:
-        threads = []
-        # downloading sites
-        for _ in range(max(1, min(toVisit.qsize(), 8))):
-            t = threading.Thread(target=downloadSite, args=(toVisit, downloaded, l))
-            threads.append(t)
-            t.start()
-        for t in threads:
-            t.join()
-        threads.clear()
-
-        # processing sites
-        for _ in range(max(1, min(downloaded.qsize(), 8))):
-            t = threading.Thread(target=processSite, args=(toVisit, downloaded, visited, actionRes, maxDepth, aAttrsFilter, action, l))
-            threads.append(t)
-            t.start()
-        for t in threads:
-            t.join()
-        threads.clear()
+    # every queued site is marked as done only after it has been downloaded and processed
+    # (or failed to download), so join returns when there are no sites left to crawl
+    truncated = False
+    nextCheckpoint = time.monotonic() + checkpointInterval
+    nextMetrics = time.monotonic()
+    while True:
+        if metricsPath is not None and time.monotonic() >= nextMetrics:
+            stats.dump(metricsPath)
+            nextMetrics = time.monotonic() + metricsInterval
+        timeout = max(0.0, nextCheckpoint - time.monotonic()) if checkpointPath is not None else None
+        if metricsPath is not None:
+            timeout = max(0.0, nextMetrics - time.monotonic()) if timeout is None else min(timeout, max(0.0, nextMetrics - time.monotonic()))
+        if budget is not None:
+            # budget is used up by workers, so it is polled
+            timeout = BUDGET_POLL_INTERVAL if timeout is None else min(timeout, BUDGET_POLL_INTERVAL)
+        if toVisit.join(timeout):
+            break
+        if budget is not None and budget.exhausted():
+            truncated = True
+            break
+        if checkpointPath is not None and time.monotonic() >= nextCheckpoint:
+            saveCheckpoint()
+            nextCheckpoint = time.monotonic() + checkpointInterval
+    truncated = truncated or (budget is not None and budget.dropped)
+    toVisit.stop(max(1, downloadThreads))
+    for _ in range(max(1, processThreads)):
+        downloaded.put(None)
+    for t in threads:
+        t.join()
+    if truncated and checkpointPath is not None:
+        # saved once workers are stopped, so sites they dropped and links they did not follow are pending in it
+        # and crawl can be continued later
+        saveCheckpoint()
     
-    return CrawlResult(startPage, maxDepth, startTime, time.time(), actionRes)
+    endTime = time.time()
+    stats.finish(endTime)
+    if metricsPath is not None:
+        stats.dump(metricsPath)
+    if progress is not None:
+        progress.finished = True
+    if sink is not None:
+        sink.end(endTime, truncated)
+    if corpus is not None:
+        corpus.end(endTime)
+    if index is not None:
+        index.flush()
+    if checkpointPath is not None and os.path.exists(checkpointPath) and not truncated:
+        os.remove(checkpointPath)
+    return CrawlResult(startPage, maxDepth, startTime, endTime, actionRes.results(), truncated, stats)
+
+def resumeCrawl(checkpointPath, action=None, **kwargs):
+    """
+    Continues crawl from checkpoint saved by crawl and returns CrawlResult object.
+
+    Crawl keeps saving checkpoints to the same file until it ends.
+
+    :type checkpointPath: string
+    :param checkpointPath: Path of checkpoint file.
+
+    :type action: function
+    :param action: Action to perform on downloaded sites. Required only if action could not be saved in checkpoint.
+
+    :type kwargs: dict
+    :param kwargs: Other arguments passed to crawl, e.g. downloadThreads or fetcher.
+    """
+
+    cp = Checkpoint.load(checkpointPath)
+    if action is None:
+        if cp.action is None:
+            raise ValueError('Action of crawl could not be saved in checkpoint, it has to be given')
+        action = actionFromSpec(cp.action)
+    sink = JSONLinesSink(cp.sinkPath) if cp.sinkPath is not None else None
+    if cp.corpusPath is not None and 'corpus' not in kwargs:
+        kwargs['corpus'] = CorpusStore(cp.corpusPath)
+    if cp.indexPath is not None and 'index' not in kwargs:
+        kwargs['index'] = InvertedIndex(cp.indexPath)
+    return crawl(cp.startAddress, cp.maxDepth, cp.aAttrsFilter, action, sink=sink, checkpointPath=checkpointPath, resume=cp, **kwargs)
+
+def searchCorpus(corpus, action, processes=None, batchSize=16, sink=None):
+    """
+    Performs action on sites stored by crawl in corpus without downloading them again and returns CrawlResult object.
+
+    Sites are processed in pool of worker processes, results are kept in the order in which sites were stored.
+
+    :type corpus: corpus.CorpusStore
+    :param corpus: Sites stored by crawl.
+
+    :type action: function
+    :param action: Picklable action to perform on stored sites. It is given parsing.ParsedSite object.
+
+    :type processes: int
+    :param processes: Number of worker processes. Defaults to number of processors.
+
+    :type batchSize: int
+    :param batchSize: The biggest number of sites sent to worker process at once.
+
+    :type sink: result_files.JSONLinesSink
+    :param sink: If given, results of each site are written to it as soon as they are found instead of being kept in memory.
+    """
+
+    info = corpus.info()
+    if info is None:
+        raise ValueError('Corpus is empty')
+    corpus.flush()
+    processes = processes or os.cpu_count() or 1
+    actionRes = ResultStore(sink)
+    startTime = time.time()
+    if sink is not None:
+        sink.begin(info["startAddress"], info["maxDepth"], startTime)
+
+    def collect(future):
+        for siteAddress, dist, links, result, error, _, _ in future.result():
+            if error is not None:
+                print('\n', siteAddress, error)
+            if len(result) != 0:
+                actionRes.add(siteAddress, result)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        # futures are collected in order and only a few batches are kept in flight,
+        # so the corpus is never read into memory at once
+        pending = collections.deque()
+        batch = []
+        for item in corpus:
+            batch.append(item)
+            if len(batch) == batchSize:
+                pending.append(executor.submit(processBatch, batch, 0, None, action))
+                batch = []
+                if len(pending) > 2 * processes:
+                    collect(pending.popleft())
+        if batch:
+            pending.append(executor.submit(processBatch, batch, 0, None, action))
+        while pending:
+            collect(pending.popleft())
+
+    endTime = time.time()
+    if sink is not None:
+        sink.end(endTime)
+    return CrawlResult(info["startAddress"], info["maxDepth"], startTime, endTime, actionRes.results())
+
+def searchIndex(index, action, sink=None):
+    """
+    Answers search action from texts indexed during crawl and returns CrawlResult object.
+
+    :type index: inverted_index.InvertedIndex
+    :param index: Index filled by crawl.
+
+    :type action: SentenceSearch, WordSearch or PatternSearch
+    :param action: Search action, as returned by one of search functions of this module.
+
+    :type sink: result_files.JSONLinesSink
+    :param sink: If given, results are written to it instead of being kept in memory.
+    """
+
+    startTime = time.time()
+    info = index.info()
+    actionRes = ResultStore(sink)
+    if sink is not None:
+        sink.begin(info["startAddress"], info["maxDepth"], startTime)
+    for siteAddress, matches in index.search(action):
+        actionRes.add(siteAddress, matches)
+    endTime = time.time()
+    if sink is not None:
+        sink.end(endTime)
+    return CrawlResult(info["startAddress"], info["maxDepth"], startTime, endTime, actionRes.results())
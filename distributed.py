@@ -0,0 +1,588 @@
+import collections
+import multiprocessing.connection
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+import zlib
+
+from crawling import CrawlResult, ResultStore, PageBuffer, BUDGET_POLL_INTERVAL, actionFromSpec, downloadSite, processSite
+from fetching import MAX_BODY_SIZE
+from frontier import Frontier
+from metrics import CrawlStats
+
+# time in seconds between messages sent by idle worker to coordinator
+SYNC_INTERVAL = 0.2
+# environment variable holding secret shared by coordinator and workers when it is not given explicitly
+AUTHKEY_VARIABLE = 'GUICRAWLER_AUTHKEY'
+
+def parseAddress(address):
+    """
+    Returns tuple (host, port) given string in format host:port.
+
+    :type address: string
+    :param address: Address of coordinator, e.g. localhost:5000.
+    """
+
+    host, sep, port = address.rpartition(':')
+    if sep == '' or not port.isdigit():
+        raise ValueError('Address has to be given as host:port, got %r' % address)
+    return host.strip('[]') or 'localhost', int(port)
+
+def authkeyFrom(authkey=None):
+    """
+    Returns secret shared by coordinator and workers as bytes, taken from AUTHKEY_VARIABLE if not given.
+
+    :type authkey: string
+    :param authkey: Secret given explicitly, e.g. in command line.
+    """
+
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_VARIABLE)
+    if not authkey:
+        raise ValueError('Secret shared with workers has to be given, e.g. in %s environment variable' % AUTHKEY_VARIABLE)
+    return authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+
+def partitionOf(url, partitions):
+    """
+    Returns number of partition to which site belongs. All sites of a host belong to the same partition,
+    so they are downloaded by the same worker, which can crawl the host politely on its own.
+
+    :type url: string
+    :param url: Canonical address of site.
+
+    :type partitions: int
+    :param partitions: Number of partitions.
+    """
+
+    # crc32 is used instead of hash(), which differs between processes
+    return zlib.crc32(urllib.parse.urlsplit(url).netloc.encode('utf-8')) % partitions
+
+class PartitionedQueue(queue.Queue):
+    """
+    Queue of sites split into partitions by host, to be used as urlQueue of frontier.Frontier kept by coordinator.
+
+    Workers take batches of sites from partitions assigned to them with take(). Sites taken by worker
+    which disconnected before processing them are returned with putBack() and remain unfinished meanwhile.
+    """
+    def __init__(self, partitions=64):
+        """
+        Creates PartitionedQueue object.
+
+        :type partitions: int
+        :param partitions: Number of partitions, the biggest number of workers which can be busy at once.
+        """
+
+        self.partitions = partitions
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.parts = [collections.deque() for _ in range(self.partitions)]
+        self.size = 0
+        self.stops = collections.deque()
+
+    def _qsize(self):
+        return self.size + len(self.stops)
+
+    def _put(self, item):
+        if item is None:
+            self.stops.append(item)
+            return
+        self.parts[partitionOf(item[0], self.partitions)].append(item[:2])
+        self.size += 1
+
+    def _get(self):
+        if self.stops:
+            return self.stops.popleft()
+        for part in self.parts:
+            if part:
+                self.size -= 1
+                return part.popleft()
+
+    def take(self, partitions, n):
+        """
+        Returns list of at most n tuples (url, dist) taken from specified partitions without waiting.
+
+        :type partitions: list
+        :param partitions: Numbers of partitions.
+
+        :type n: int
+        :param n: The biggest number of sites to take.
+        """
+
+        items = []
+        with self.mutex:
+            for p in partitions:
+                part = self.parts[p]
+                while part and len(items) < n:
+                    items.append(part.popleft())
+                if len(items) >= n:
+                    break
+            self.size -= len(items)
+            if items:
+                self.not_full.notify()
+        return items
+
+    def putBack(self, items):
+        """
+        Returns sites taken with take() to the front of their partitions without counting them as new tasks.
+
+        :type items: list
+        :param items: Tuples (url, dist).
+        """
+
+        with self.mutex:
+            for item in reversed(items):
+                self.parts[partitionOf(item[0], self.partitions)].appendleft(item)
+            self.size += len(items)
+
+class Coordinator:
+    """
+    Serves shared frontier and collects results of workers connected over a socket (see runWorker).
+
+    Every connection is handled in its own thread. Worker sends batches of links found, sites processed,
+    results and statistics, and receives batch of sites to download from partitions assigned to it.
+    Partitions are spread over connected workers and reassigned when workers join or leave.
+    """
+    def __init__(self, listener, frontier, actionRes, config, leaseSize=32, budget=None, stats=None):
+        """
+        Creates Coordinator object.
+
+        :type listener: multiprocessing.connection.Listener
+        :param listener: Accepts connections of workers.
+
+        :type frontier: frontier.Frontier
+        :param frontier: Frontier with PartitionedQueue as urlQueue.
+
+        :type actionRes: crawling.ResultStore
+        :param actionRes: Stores results reported by workers.
+
+        :type config: dict
+        :param config: Description of crawl sent to each worker.
+
+        :type leaseSize: int
+        :param leaseSize: The biggest number of sites given to worker at once.
+
+        :type budget: crawling.CrawlBudget
+        :param budget: If given, no more sites are given to workers once it is used up or cancelled.
+
+        :type stats: metrics.CrawlStats
+        :param stats: Statistics to which statistics of workers are added.
+        """
+
+        self.listener = listener
+        self.frontier = frontier
+        self.actionRes = actionRes
+        self.config = config
+        self.leaseSize = leaseSize
+        self.budget = budget
+        self.stats = stats if stats is not None else CrawlStats()
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.workerIds = 0
+        self.finished = False
+
+    def serve(self):
+        """
+        Accepts workers until listener is closed. Meant to be run in a separate thread.
+        """
+
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                if self.finished:
+                    return
+                continue
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def partitionsOf(self, workerId):
+        """
+        Returns list of numbers of partitions assigned to worker.
+
+        :type workerId: int
+        :param workerId: Number of worker.
+        """
+
+        with self.lock:
+            workers = sorted(self.workers)
+        partitions = self.frontier.queue.partitions
+        return [p for p in range(partitions) if workers[p % len(workers)] == workerId]
+
+    def handle(self, conn):
+        """
+        Exchanges messages with single worker until crawl ends or worker disconnects.
+        Sites given to worker which it has not processed are put back into frontier.
+
+        :type conn: multiprocessing.connection.Connection
+        :param conn: Connection with worker.
+        """
+
+        leased = collections.Counter()
+        try:
+            worker = conn.recv()
+        except (OSError, EOFError):
+            conn.close()
+            return
+        with self.lock:
+            self.workerIds += 1
+            workerId = self.workerIds
+            self.workers[workerId] = worker
+        try:
+            conn.send(self.config)
+            while True:
+                message = conn.recv()
+                self.report(message, leased)
+                if self.finished or (self.budget is not None and self.budget.exhausted()):
+                    conn.send(None)
+                    return
+                items = []
+                if message["wanted"] > 0:
+                    for item in self.frontier.queue.take(self.partitionsOf(workerId), message["wanted"]):
+                        # site queued again closer to the start site is given to worker once
+                        if self.frontier.isStale(item):
+                            self.frontier.task_done(item)
+                        else:
+                            items.append(item)
+                    leased.update(items)
+                conn.send(items)
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self.lock:
+                del self.workers[workerId]
+            if not self.finished:
+                self.frontier.queue.putBack(list(leased.elements()))
+            conn.close()
+
+    def report(self, message, leased):
+        """
+        Handles links, processed sites, results and statistics sent by worker.
+
+        :type message: dict
+        :param message: Message of worker.
+
+        :type leased: collections.Counter
+        :param leased: Sites given to worker and not processed yet.
+        """
+
+        for url, dist, hint in message["links"]:
+            self.frontier.put(url, dist, hint)
+        with self.lock:
+            for siteAddress, matches in message["results"]:
+                self.actionRes.add(siteAddress, matches)
+        if self.budget is not None:
+            for pageBytes in message["pages"]:
+                self.budget.admit(pageBytes)
+        self.stats.merge(*message["stats"])
+        for item in message["done"]:
+            item = tuple(item)
+            if leased[item] > 0:
+                leased[item] -= 1
+                if leased[item] == 0:
+                    del leased[item]
+                self.frontier.task_done(item)
+
+def crawlDistributed(startPage, maxDepth, aAttrsFilter, action, address, authkey, partitions=64, leaseSize=32, sink=None,
+                     onResult=None, budget=None, stats=None, maxBodySize=MAX_BODY_SIZE, metricsPath=None, metricsInterval=10, onListening=None):
+    """
+    Traverses the Internet with workers started with runWorker, possibly on other machines, and returns crawling.CrawlResult object.
+
+    This process keeps frontier and results, workers download and process sites. Sites are split between workers by host.
+    Crawl waits for workers as long as there are sites left, so workers can be started before or after it.
+
+    :type startPage: string
+    :param startPage: Address of site from which crawl begins.
+
+    :type maxDepth: int
+    :param maxDepth: The biggest distance from start site crawler can reach.
+
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+    :type action: function
+    :param action: Action returned by one of search functions of crawling module. It is sent to workers as its spec().
+
+    :type address: tuple
+    :param address: Host and port on which workers are accepted, port 0 picks free one.
+
+    :type authkey: bytes
+    :param authkey: Secret shared with workers. Messages are pickled, so only trusted workers may know it.
+
+    :type partitions: int
+    :param partitions: Number of partitions of hosts, the biggest number of workers which can be busy at once.
+
+    :type leaseSize: int
+    :param leaseSize: The biggest number of sites given to worker at once. Page budget may be exceeded by that many sites per worker.
+
+    :type sink: result_files.JSONLinesSink
+    :param sink: If given, results of each site are written to it as soon as they are reported instead of being kept in memory.
+
+    :type onResult: function
+    :param onResult: If given, it is called with siteAddress and matches as soon as results of site are reported.
+
+    :type budget: crawling.CrawlBudget
+    :param budget: If given, crawl can be cancelled with it and ends once its deadline passes or its page or byte budget is used up.
+
+    :type stats: metrics.CrawlStats
+    :param stats: Statistics of the crawl, to which statistics of workers are added. New one is created if not given.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of decompressed body of site in bytes, bigger sites are skipped.
+
+    :type metricsPath: string
+    :param metricsPath: If given, statistics of crawl are written there in Prometheus text format every metricsInterval seconds and when crawl ends.
+
+    :type metricsInterval: float
+    :param metricsInterval: Time in seconds between writing statistics.
+
+    :type onListening: function
+    :param onListening: If given, it is called with address on which workers are accepted, e.g. to learn port picked by system.
+    """
+
+    if not hasattr(action, 'spec'):
+        raise ValueError('Action has to have spec() to be sent to workers')
+    if stats is None:
+        stats = CrawlStats()
+    toVisit = Frontier(maxDepth, PartitionedQueue(partitions))
+    stats.watch('toVisit', toVisit.qsize)
+    actionRes = ResultStore(sink, onResult)
+    config = {"maxDepth": maxDepth, "aAttrsFilter": aAttrsFilter, "action": action.spec(), "maxBodySize": maxBodySize}
+    listener = multiprocessing.connection.Listener(address, authkey=authkey)
+    coordinator = Coordinator(listener, toVisit, actionRes, config, leaseSize, budget, stats)
+    threading.Thread(target=coordinator.serve, daemon=True).start()
+    if onListening is not None:
+        onListening(listener.address)
+
+    startTime = time.time()
+    if sink is not None:
+        sink.begin(startPage, maxDepth, startTime)
+    toVisit.put(startPage, 0)
+    truncated = False
+    nextMetrics = time.monotonic()
+    while True:
+        if metricsPath is not None and time.monotonic() >= nextMetrics:
+            stats.dump(metricsPath)
+            nextMetrics = time.monotonic() + metricsInterval
+        if toVisit.join(BUDGET_POLL_INTERVAL):
+            break
+        if budget is not None and budget.exhausted():
+            truncated = True
+            break
+    coordinator.finished = True
+    listener.close()
+
+    endTime = time.time()
+    stats.finish(endTime)
+    if metricsPath is not None:
+        stats.dump(metricsPath)
+    if sink is not None:
+        sink.end(endTime, truncated)
+    return CrawlResult(startPage, maxDepth, startTime, endTime, actionRes.results(), truncated, stats)
+
+class RemoteFrontier:
+    """
+    Frontier of worker, standing in for frontier.Frontier in downloadSite and processSite.
+
+    Sites to download are kept in local urlQueue, which is filled with batches received from coordinator,
+    while links found and sites processed are buffered and sent to coordinator with the next message.
+    """
+    def __init__(self, maxDepth, urlQueue=None):
+        """
+        Creates RemoteFrontier object.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type urlQueue: queue.Queue
+        :param urlQueue: Queue storing tuples (url, dist) of sites to download, e.g. politeness.HostQueue. Defaults to FIFO queue.
+        """
+
+        self.maxDepth = maxDepth
+        self.queue = urlQueue if urlQueue is not None else queue.Queue()
+        self.lock = threading.Lock()
+        self.links = []
+        self.done = []
+        self.results = []
+        self.pages = []
+        self.retries = collections.Counter()
+        self.changed = threading.Event()
+        self.closed = False
+
+    def put(self, url, dist, hint=None):
+        with self.lock:
+            self.links.append((url, dist, hint))
+        self.changed.set()
+        return True
+
+    def requeue(self, url, dist):
+        # site is downloaded again by this worker, so coordinator learns it is done only after the last attempt
+        with self.lock:
+            self.retries[(url, dist)] += 1
+        self.queue.put((url, dist))
+
+    def usesHints(self):
+        return False
+
+    def tracksPending(self):
+        return False
+
+    def get(self):
+        item = self.queue.get()
+        # sites left when crawl ends are skipped
+        while self.closed and item is not None:
+            self.queue.task_done()
+            item = self.queue.get()
+        return item
+
+    def fetched(self, url, status=None, elapsed=None, retryAfter=None):
+        if hasattr(self.queue, 'fetched'):
+            return self.queue.fetched(url, status, elapsed, retryAfter)
+        return False
+
+    def task_done(self, item=None, deferred=False):
+        if item is not None:
+            with self.lock:
+                if self.retries[item] > 0:
+                    self.retries[item] -= 1
+                else:
+                    self.done.append(item)
+            self.changed.set()
+        self.queue.task_done()
+
+    def add(self, siteAddress, matches):
+        """
+        Buffers results found on site. It stands in for crawling.ResultStore in processSite.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+        """
+
+        with self.lock:
+            self.results.append((siteAddress, list(matches)))
+
+    def admit(self, pageBytes):
+        """
+        Buffers size of downloaded site, so coordinator can count it in its budget. It stands in for crawling.CrawlBudget in downloadSite.
+
+        :type pageBytes: int
+        :param pageBytes: Length of HTML of the site.
+        """
+
+        with self.lock:
+            self.pages.append(pageBytes)
+        return True
+
+    def exhausted(self):
+        return False
+
+    def cancelled(self):
+        return False
+
+    def drop(self):
+        pass
+
+    def message(self, wanted, stats):
+        """
+        Returns message for coordinator with everything buffered since the previous one.
+
+        :type wanted: int
+        :param wanted: Number of sites worker asks for.
+
+        :type stats: metrics.CrawlStats
+        :param stats: Statistics of worker.
+        """
+
+        with self.lock:
+            message = {"links": self.links, "done": self.done, "results": self.results, "pages": self.pages,
+                       "stats": stats.drain(), "wanted": wanted}
+            self.links, self.done, self.results, self.pages = [], [], [], []
+            self.changed.clear()
+        return message
+
+    def stop(self, workers):
+        self.closed = True
+        for _ in range(workers):
+            self.queue.put(None)
+
+def runWorker(address, authkey, downloadThreads=8, processThreads=2, batchSize=32, urlQueue=None, cache=None, stats=None):
+    """
+    Downloads and processes sites given by coordinator (see crawlDistributed) until it ends the crawl. Returns statistics of worker.
+
+    Sites are downloaded and processed by the same functions as in crawling.crawl. To use more CPUs,
+    run more workers, each in its own process.
+
+    :type address: tuple
+    :param address: Host and port of coordinator.
+
+    :type authkey: bytes
+    :param authkey: Secret shared with coordinator.
+
+    :type downloadThreads: int
+    :param downloadThreads: Number of threads downloading sites.
+
+    :type processThreads: int
+    :param processThreads: Number of threads processing downloaded sites.
+
+    :type batchSize: int
+    :param batchSize: Number of sites worker tries to keep queued locally.
+
+    :type urlQueue: queue.Queue
+    :param urlQueue: Local queue of sites, e.g. politeness.HostQueue to crawl hosts assigned to worker politely.
+
+    :type cache: caching.PageCache
+    :param cache: If given, pages are taken from it when fresh or not modified, and stored in it when downloaded.
+
+    :type stats: metrics.CrawlStats
+    :param stats: Statistics of worker. New one is created if not given.
+    """
+
+    if stats is None:
+        stats = CrawlStats()
+    conn = multiprocessing.connection.Client(address, authkey=authkey)
+    conn.send({"host": socket.gethostname(), "pid": os.getpid()})
+    config = conn.recv()
+    action = actionFromSpec(config["action"])
+    toVisit = RemoteFrontier(config["maxDepth"], urlQueue)
+    downloaded = PageBuffer(2 * batchSize, 0, stats)
+    l = threading.Lock()
+    threads = []
+    for _ in range(max(1, downloadThreads)):
+        threads.append(threading.Thread(target=downloadSite, args=(toVisit, downloaded, l, cache, config["maxBodySize"], toVisit, stats), daemon=True))
+    for _ in range(max(1, processThreads)):
+        threads.append(threading.Thread(target=processSite, args=(toVisit, downloaded, toVisit, config["maxDepth"], config["aAttrsFilter"], action, l, None, None, None, stats), daemon=True))
+    for t in threads:
+        t.start()
+
+    # sites received from coordinator and not reported as done yet
+    leased = 0
+    try:
+        while True:
+            message = toVisit.message(max(0, batchSize - leased), stats)
+            leased -= len(message["done"])
+            conn.send(message)
+            items = conn.recv()
+            if items is None:
+                break
+            for url, dist in items:
+                toVisit.queue.put((url, dist))
+            leased += len(items)
+            if not items:
+                # nothing to do until sites are processed or coordinator has new ones
+                toVisit.changed.wait(SYNC_INTERVAL)
+    except (OSError, EOFError):
+        pass
+    finally:
+        conn.close()
+        toVisit.stop(max(1, downloadThreads))
+        for _ in range(max(1, processThreads)):
+            downloaded.put(None)
+        for t in threads:
+            t.join()
+        stats.finish()
+    return stats
@@ -0,0 +1,880 @@
+import asyncio
+import codecs
+import contextlib
+import http.client
+import queue
+import re
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+import urllib.error
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# the biggest size in bytes of decompressed body of downloaded site
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+# types of documents worth downloading, responses of other types are rejected before their body is read
+TEXT_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain', 'text/xml', 'application/xml')
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+CHUNK_SIZE = 64 * 1024
+
+class HTTPResponse:
+    """
+    This class stores response received by AsyncFetcher.
+    """
+    def __init__(self, url, status, headers, body):
+        """
+        Creates HTTPResponse object.
+
+        :type url: string
+        :param url: Address from which response was received (after following redirects).
+
+        :type status: int
+        :param status: HTTP status code.
+
+        :type headers: dict
+        :param headers: Response headers with lowercase names.
+
+        :type body: bytes
+        :param body: Response body, decompressed if it was sent compressed.
+        """
+
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self):
+        """
+        Returns body decoded with charset given in headers or in the document.
+        """
+
+        return decodeText(self.body, self.headers)
+
+class HTTPError(Exception):
+    """
+    Raised when site responds with unexpected status code or malformed response.
+    """
+    def __init__(self, message, status=None, retryAfter=None):
+        """
+        Creates HTTPError object.
+
+        :type message: string
+        :param message: Description of error.
+
+        :type status: int
+        :param status: HTTP status code of response, if any.
+
+        :type retryAfter: float
+        :param retryAfter: Time in seconds given in Retry-After header, if any.
+        """
+
+        super().__init__(message)
+        self.status = status
+        self.retryAfter = retryAfter
+
+def parseRetryAfter(value):
+    """
+    Returns number of seconds given in Retry-After header or None if it is missing or is not a number.
+
+    :type value: string
+    :param value: Value of the header.
+    """
+
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def errorStatus(e):
+    """
+    Returns tuple (status, retryAfter) describing exception raised while downloading site.
+    Both are None if exception was not caused by HTTP error response.
+
+    :type e: Exception
+    :param e: Exception raised by fetchURL or AsyncFetcher.fetch.
+    """
+
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code, parseRetryAfter(e.headers.get('Retry-After') if e.headers is not None else None)
+    if isinstance(e, HTTPError):
+        return e.status, e.retryAfter
+    return None, None
+
+class ResponseRejected(HTTPError):
+    """
+    Raised when response is not worth downloading: it is not a text document or its body is too big.
+    """
+    pass
+
+def checkResponseHead(headers, maxBodySize=MAX_BODY_SIZE):
+    """
+    Raises ResponseRejected if response headers show that its body is not a text document or is too big.
+
+    :type headers: dict
+    :param headers: Response headers with lowercase names.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of body in bytes.
+    """
+
+    contentType = headers.get('content-type', '').split(';')[0].strip().lower()
+    if contentType and contentType not in TEXT_CONTENT_TYPES:
+        raise ResponseRejected('Not a text document: ' + contentType)
+    contentLength = headers.get('content-length', '')
+    if contentLength.isdigit() and int(contentLength) > maxBodySize:
+        raise ResponseRejected('Body too big: %s bytes' % contentLength)
+
+class BodyDecompressor:
+    """
+    Collects chunks of response body, decompressing them as they arrive and rejecting body that grows too big.
+    """
+    def __init__(self, contentEncoding, maxBodySize=MAX_BODY_SIZE):
+        """
+        Creates BodyDecompressor object.
+
+        :type contentEncoding: string
+        :param contentEncoding: Value of Content-Encoding header.
+
+        :type maxBodySize: int
+        :param maxBodySize: The biggest size of decompressed body in bytes.
+        """
+
+        self.maxBodySize = maxBodySize
+        self.chunks = []
+        self.size = 0
+        self.received = 0
+        contentEncoding = (contentEncoding or 'identity').strip().lower()
+        if contentEncoding in ('gzip', 'x-gzip'):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif contentEncoding == 'deflate':
+            self.decompressor = zlib.decompressobj()
+        elif contentEncoding == 'br' and brotli is not None:
+            self.decompressor = brotli.Decompressor()
+        elif contentEncoding == 'identity':
+            self.decompressor = None
+        else:
+            raise ResponseRejected('Unsupported content encoding: ' + contentEncoding)
+        self.deflate = contentEncoding == 'deflate'
+        self.brotli = contentEncoding == 'br'
+
+    def feed(self, chunk):
+        """
+        Adds next chunk of body as received.
+
+        :type chunk: bytes
+        :param chunk: Part of body.
+        """
+
+        self.received += len(chunk)
+        if self.decompressor is None:
+            data = chunk
+        elif self.deflate and not self.chunks and self.size == 0:
+            # some servers send raw deflate stream without zlib header
+            try:
+                data = self.decompressor.decompress(chunk, self.maxBodySize + 1)
+            except zlib.error:
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = self.decompressor.decompress(chunk, self.maxBodySize + 1)
+        elif self.brotli:
+            data = self.decompressor.process(chunk)
+        else:
+            # output is limited, so small compressed chunk cannot expand into huge body at once
+            data = self.decompressor.decompress(chunk, self.maxBodySize + 1 - self.size)
+        self.size += len(data)
+        if self.size > self.maxBodySize:
+            raise ResponseRejected('Body too big: over %d bytes' % self.maxBodySize)
+        self.chunks.append(data)
+
+    def body(self):
+        """
+        Returns whole decompressed body.
+        """
+
+        return b''.join(self.chunks)
+
+def decodeText(body, headers):
+    """
+    Decodes body of text document with charset given in Content-Type header,
+    byte order mark or <meta> tag, falling back to UTF-8 and then Windows-1252.
+
+    :type body: bytes
+    :param body: Decompressed body.
+
+    :type headers: dict
+    :param headers: Response headers with lowercase names.
+    """
+
+    charset = None
+    match = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', headers.get('content-type', ''), re.IGNORECASE)
+    if match is not None:
+        charset = match.group(1)
+    elif body.startswith(codecs.BOM_UTF8):
+        charset = 'utf-8-sig'
+    elif body.startswith(codecs.BOM_UTF16_LE) or body.startswith(codecs.BOM_UTF16_BE):
+        charset = 'utf-16'
+    else:
+        match = re.search(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', body[:4096], re.IGNORECASE)
+        if match is not None:
+            charset = match.group(1).decode('ascii')
+    if charset is not None:
+        try:
+            return body.decode(codecs.lookup(charset).name, 'replace')
+        except LookupError:
+            pass
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError:
+        return body.decode('cp1252', 'replace')
+
+def timedConnectionClass(connectionClass, timings):
+    """
+    Returns subclass of http.client.HTTPConnection class which adds time of name lookup
+    and of opening connection to timings under 'dns' and 'connect' keys.
+
+    :type connectionClass: type
+    :param connectionClass: http.client.HTTPConnection or http.client.HTTPSConnection.
+
+    :type timings: dict
+    :param timings: Dictionary to which times in seconds are added.
+    """
+
+    def createConnection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, sourceAddress=None, *args, **kwargs):
+        host, port = address
+        start = time.perf_counter()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        connectStart = time.perf_counter()
+        timings['dns'] = timings.get('dns', 0.0) + connectStart - start
+        try:
+            error = None
+            for _, _, _, _, sockaddr in addresses:
+                try:
+                    return socket.create_connection(sockaddr[:2], timeout, sourceAddress)
+                except OSError as e:
+                    error = e
+            raise error if error is not None else OSError('getaddrinfo returned no addresses')
+        finally:
+            timings['connect'] = timings.get('connect', 0.0) + time.perf_counter() - connectStart
+
+    class TimedConnection(connectionClass):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._create_connection = createConnection
+
+    return TimedConnection
+
+def timedOpener(timings):
+    """
+    Returns urllib opener which adds time of name lookup and of opening connection of its requests to timings.
+
+    :type timings: dict
+    :param timings: Dictionary to which times in seconds are added under 'dns' and 'connect' keys.
+    """
+
+    class TimedHTTPHandler(urllib.request.HTTPHandler):
+        def http_open(self, req):
+            return self.do_open(timedConnectionClass(http.client.HTTPConnection, timings), req)
+
+    class TimedHTTPSHandler(urllib.request.HTTPSHandler):
+        def https_open(self, req):
+            return self.do_open(timedConnectionClass(http.client.HTTPSConnection, timings), req, context=self._context)
+
+    return urllib.request.build_opener(TimedHTTPHandler, TimedHTTPSHandler)
+
+def fetchURL(url, timeout=10, cache=None, maxBodySize=MAX_BODY_SIZE, stats=None):
+    """
+    Downloads site with urllib and returns its text.
+
+    Body is read in chunks and decompressed as it arrives. Response which is not a text document
+    or which body exceeds maxBodySize is rejected with ResponseRejected without reading the rest of it.
+
+    :type url: string
+    :param url: Address of site to download.
+
+    :type timeout: float
+    :param timeout: Time in seconds after which request is abandoned.
+
+    :type cache: caching.PageCache
+    :param cache: If given, fresh pages are taken from it and stale ones are revalidated.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of decompressed body in bytes.
+
+    :type stats: metrics.CrawlStats
+    :param stats: If given, time spent in downloading stages and bytes received are recorded in it.
+    """
+
+    return fetchPage(url, None, timeout, cache, maxBodySize, stats)[0]
+
+def fetchPage(url, headers=None, timeout=10, cache=None, maxBodySize=MAX_BODY_SIZE, stats=None):
+    """
+    Downloads site like fetchURL and returns tuple (text, responseHeaders) with lowercase header names,
+    or (None, None) if server responds 304 Not Modified to conditional headers.
+
+    Page taken from cache or revalidated with it is returned with its stored validators as headers,
+    so conditional headers are sent only for pages which are not in cache.
+
+    :type url: string
+    :param url: Address of site to download.
+
+    :type headers: dict
+    :param headers: Request headers, e.g. If-None-Match or If-Modified-Since.
+
+    :type timeout: float
+    :param timeout: Time in seconds after which request is abandoned.
+
+    :type cache: caching.PageCache
+    :param cache: If given, fresh pages are taken from it and stale ones are revalidated.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of decompressed body in bytes.
+
+    :type stats: metrics.CrawlStats
+    :param stats: If given, time spent in downloading stages, bytes received and not modified responses are recorded in it.
+    """
+
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None and cache.isFresh(entry):
+        if stats is not None:
+            stats.count('cacheHits')
+        return entry.body.decode('utf-8'), cachedHeaders(entry)
+    text, responseHeaders = fetchIfModified(url, cache.conditionalHeaders(entry) if entry is not None else headers, timeout, maxBodySize, stats)
+    if text is None:
+        if entry is None:
+            return None, None
+        cache.revalidated(url)
+        return entry.body.decode('utf-8'), cachedHeaders(entry)
+    if cache is not None:
+        cache.store(url, text.encode('utf-8'), responseHeaders)
+    return text, responseHeaders
+
+def cachedHeaders(entry):
+    """
+    Returns headers of response made from page stored in cache, with its stored validators.
+
+    :type entry: caching.CacheEntry
+    :param entry: Page stored in cache.
+    """
+
+    headers = {'content-type': 'text/html; charset=utf-8'}
+    if entry.etag:
+        headers['etag'] = entry.etag
+    if entry.lastModified:
+        headers['last-modified'] = entry.lastModified
+    return headers
+
+def fetchIfModified(url, headers=None, timeout=10, maxBodySize=MAX_BODY_SIZE, stats=None):
+    """
+    Downloads site with urllib unless request is conditional and server responds that site has not changed.
+    Returns tuple (text, responseHeaders) with lowercase header names, or (None, None) for 304 Not Modified response.
+
+    See fetchURL for how body is read.
+
+    :type url: string
+    :param url: Address of site to download.
+
+    :type headers: dict
+    :param headers: Request headers, e.g. If-None-Match or If-Modified-Since.
+
+    :type timeout: float
+    :param timeout: Time in seconds after which request is abandoned.
+
+    :type maxBodySize: int
+    :param maxBodySize: The biggest size of decompressed body in bytes.
+
+    :type stats: metrics.CrawlStats
+    :param stats: If given, time spent in downloading stages, bytes received and not modified responses are recorded in it.
+    """
+
+    headers = dict(headers) if headers is not None else {}
+    conditional = 'If-None-Match' in headers or 'If-Modified-Since' in headers
+    headers['Accept-Encoding'] = ACCEPT_ENCODING
+    timings = {}
+    requestTime = time.perf_counter()
+    try:
+        if stats is not None:
+            req = timedOpener(timings).open(urllib.request.Request(url, headers=headers), timeout=timeout)
+        else:
+            req = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and conditional:
+            if stats is not None:
+                stats.count('notModified')
+            return None, None
+        raise
+    headTime = time.perf_counter()
+    with req:
+        responseHeaders = {name.lower(): value for name, value in req.headers.items()}
+        checkResponseHead(responseHeaders, maxBodySize)
+        decompressor = BodyDecompressor(responseHeaders.get('content-encoding'), maxBodySize)
+        while True:
+            chunk = req.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            decompressor.feed(chunk)
+    if stats is not None:
+        for stage in ('dns', 'connect'):
+            if stage in timings:
+                stats.record(stage, timings[stage])
+        # urllib opens connection while sending request, so its time is subtracted
+        stats.record('ttfb', max(0.0, headTime - requestTime - timings.get('dns', 0.0) - timings.get('connect', 0.0)))
+        stats.record('body', time.perf_counter() - headTime)
+        stats.count('bytesTransferred', decompressor.received)
+    return decodeText(decompressor.body(), responseHeaders), responseHeaders
+
+class HostConnectionPool:
+    """
+    This class keeps open keep-alive connections to a single host.
+    """
+    def __init__(self, scheme, host, port, maxConnections, sslContext, stats=None):
+        """
+        Creates HostConnectionPool object.
+
+        :type scheme: string
+        :param scheme: Either 'http' or 'https'.
+
+        :type host: string
+        :param host: Host name.
+
+        :type port: int
+        :param port: Port number.
+
+        :type maxConnections: int
+        :param maxConnections: The biggest number of connections opened to the host at once.
+
+        :type sslContext: ssl.SSLContext
+        :param sslContext: Context used for https connections.
+
+        :type stats: metrics.CrawlStats
+        :param stats: If given, time of name lookup and of opening connections is recorded in it.
+        """
+
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.sslContext = sslContext
+        self.slots = asyncio.Semaphore(maxConnections)
+        self.idle = []
+        self.stats = stats
+
+    async def acquire(self):
+        """
+        Returns tuple (reader, writer, reused) with connection to the host, waiting for free slot if necessary.
+        """
+
+        await self.slots.acquire()
+        try:
+            while self.idle:
+                reader, writer = self.idle.pop()
+                if not writer.is_closing() and not reader.at_eof():
+                    return reader, writer, True
+                writer.close()
+            return (*await self.connect(), False)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    async def connect(self):
+        """
+        Resolves host name and opens new connection to the host. Returns tuple (reader, writer).
+        """
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        addresses = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+        connectStart = time.perf_counter()
+        if self.stats is not None:
+            self.stats.record('dns', connectStart - start)
+        error = None
+        try:
+            for _, _, _, _, sockaddr in addresses:
+                try:
+                    return await asyncio.open_connection(sockaddr[0], self.port, ssl=self.sslContext if self.scheme == 'https' else None,
+                                                         server_hostname=self.host if self.scheme == 'https' else None)
+                except OSError as e:
+                    error = e
+            raise error if error is not None else OSError('getaddrinfo returned no addresses')
+        finally:
+            if self.stats is not None:
+                self.stats.record('connect', time.perf_counter() - connectStart)
+
+    def release(self, reader, writer, reusable):
+        """
+        Returns connection to the pool or closes it.
+
+        :type reader: asyncio.StreamReader
+        :param reader: Reading end of connection.
+
+        :type writer: asyncio.StreamWriter
+        :param writer: Writing end of connection.
+
+        :type reusable: bool
+        :param reusable: Whether connection may be used for another request.
+        """
+
+        if reusable:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        self.slots.release()
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+class AsyncFetcher:
+    """
+    Downloads sites with asyncio reusing HTTP/1.1 keep-alive connections to each host.
+    """
+    def __init__(self, concurrency=500, maxConnectionsPerHost=8, timeout=10, maxRedirects=5, cache=None, maxBodySize=MAX_BODY_SIZE, stats=None):
+        """
+        Creates AsyncFetcher object.
+
+        :type concurrency: int
+        :param concurrency: The biggest number of requests in flight at once.
+
+        :type maxConnectionsPerHost: int
+        :param maxConnectionsPerHost: The biggest number of connections opened to single host at once.
+
+        :type timeout: float
+        :param timeout: Time in seconds after which single request is abandoned.
+
+        :type maxRedirects: int
+        :param maxRedirects: The biggest number of redirects followed for single request.
+
+        :type cache: caching.PageCache
+        :param cache: If given, fresh pages are taken from it and stale ones are revalidated.
+
+        :type maxBodySize: int
+        :param maxBodySize: The biggest size of decompressed body in bytes, bigger responses are rejected.
+
+        :type stats: metrics.CrawlStats
+        :param stats: If given, time spent in downloading stages and bytes received are recorded in it.
+        """
+
+        self.concurrency = concurrency
+        self.maxConnectionsPerHost = maxConnectionsPerHost
+        self.timeout = timeout
+        self.maxRedirects = maxRedirects
+        self.cache = cache
+        self.maxBodySize = maxBodySize
+        self.stats = stats
+        self.sslContext = ssl.create_default_context()
+        self.pools = {}
+
+    def getPool(self, scheme, host, port):
+        """
+        Returns connection pool for specified host, creating it if necessary.
+
+        :type scheme: string
+        :param scheme: Either 'http' or 'https'.
+
+        :type host: string
+        :param host: Host name.
+
+        :type port: int
+        :param port: Port number.
+        """
+
+        key = (scheme, host, port)
+        if key not in self.pools:
+            self.pools[key] = HostConnectionPool(scheme, host, port, self.maxConnectionsPerHost, self.sslContext, self.stats)
+        return self.pools[key]
+
+    async def fetch(self, url, headers=None):
+        """
+        Downloads site following redirects and returns HTTPResponse object.
+
+        :type url: string
+        :param url: Address of site to download.
+
+        :type headers: dict
+        :param headers: Conditional request headers, sent only if site is not in cache. If server responds
+                        304 Not Modified to them, response with status 304 and empty body is returned.
+        """
+
+        originalURL = url
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and self.cache.isFresh(entry):
+            if self.stats is not None:
+                self.stats.count('cacheHits')
+            return HTTPResponse(url, 200, cachedHeaders(entry), entry.body)
+        headers = self.cache.conditionalHeaders(entry) if entry is not None else (headers or {})
+        for _ in range(self.maxRedirects + 1):
+            response = await asyncio.wait_for(self.request(url, headers), self.timeout)
+            if response.status in (301, 302, 303, 307, 308) and 'location' in response.headers:
+                url = urllib.parse.urljoin(url, response.headers['location'])
+                continue
+            if response.status == 304 and headers:
+                if self.stats is not None:
+                    self.stats.count('notModified')
+                if entry is None:
+                    return response
+                self.cache.revalidated(originalURL)
+                return HTTPResponse(url, 200, cachedHeaders(entry), entry.body)
+            if not 200 <= response.status < 300:
+                # e.g. redirect without Location or 304 to request which was not conditional
+                raise HTTPError('HTTP Error %d' % response.status, response.status, parseRetryAfter(response.headers.get('retry-after')))
+            if self.cache is not None:
+                self.cache.store(originalURL, response.text().encode('utf-8'), response.headers)
+            return response
+        raise HTTPError('Too many redirects')
+
+    async def request(self, url, extraHeaders=None):
+        """
+        Sends single GET request and returns HTTPResponse object.
+
+        Successful response which is not a text document or which body exceeds maxBodySize
+        is rejected with ResponseRejected without reading the rest of it.
+
+        :type url: string
+        :param url: Address of site to download.
+
+        :type extraHeaders: dict
+        :param extraHeaders: Additional request headers.
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('unknown url type: ' + url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        hostHeader = parts.hostname if parts.port is None else '%s:%d' % (parts.hostname, parts.port)
+        request = ('GET %s HTTP/1.1\r\n'
+                   'Host: %s\r\n'
+                   'User-Agent: GUIcrawler\r\n'
+                   'Accept-Encoding: %s\r\n'
+                   'Connection: keep-alive\r\n') % (target, hostHeader, ACCEPT_ENCODING)
+        for name, value in (extraHeaders or {}).items():
+            request += '%s: %s\r\n' % (name, value)
+        request += '\r\n'
+
+        pool = self.getPool(parts.scheme, parts.hostname, port)
+        # connection kept alive might have been closed by the server in the meantime,
+        # in which case request is repeated once on a new connection
+        for attempt in range(2):
+            reader, writer, reused = await pool.acquire()
+            reusable = False
+            try:
+                requestTime = time.perf_counter()
+                writer.write(request.encode('ascii'))
+                await writer.drain()
+                statusLine = await reader.readline()
+                if not statusLine and reused and attempt == 0:
+                    continue
+                status, headers = await readHead(statusLine, reader)
+                headTime = time.perf_counter()
+                if 200 <= status < 300:
+                    checkResponseHead(headers, self.maxBodySize)
+                    decompressor = BodyDecompressor(headers.get('content-encoding'), self.maxBodySize)
+                else:
+                    # body of other responses is not used
+                    decompressor = BodyDecompressor(None, self.maxBodySize)
+                reusable = await readBody(reader, status, headers, decompressor)
+                reusable = reusable and statusLine.startswith(b'HTTP/1.1') and headers.get('connection', '').lower() != 'close'
+                if self.stats is not None:
+                    self.stats.record('ttfb', headTime - requestTime)
+                    self.stats.record('body', time.perf_counter() - headTime)
+                    self.stats.count('bytesTransferred', decompressor.received)
+                return HTTPResponse(url, status, headers, decompressor.body())
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not (reused and attempt == 0):
+                    raise
+            finally:
+                pool.release(reader, writer, reusable)
+        raise HTTPError('Connection closed by ' + parts.hostname)
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+
+        for pool in self.pools.values():
+            pool.close()
+        self.pools.clear()
+
+async def readHead(statusLine, reader):
+    """
+    Parses status line and reads response headers. Returns tuple (status, headers).
+
+    :type statusLine: bytes
+    :param statusLine: First line of response.
+
+    :type reader: asyncio.StreamReader
+    :param reader: Stream to read headers from.
+    """
+
+    parts = statusLine.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+        raise HTTPError('Malformed status line: %r' % statusLine)
+    status = int(parts[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        value = value.strip()
+        headers[name] = headers[name] + ', ' + value if name in headers else value
+    return status, headers
+
+async def readBody(reader, status, headers, decompressor):
+    """
+    Reads response body in chunks passing them to decompressor. Returns True if connection may be used for another request.
+
+    :type reader: asyncio.StreamReader
+    :param reader: Stream to read body from.
+
+    :type status: int
+    :param status: Status of response.
+
+    :type headers: dict
+    :param headers: Response headers with lowercase names.
+
+    :type decompressor: BodyDecompressor
+    :param decompressor: Collects body.
+    """
+
+    async def readExactly(size):
+        while size > 0:
+            chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+            decompressor.feed(chunk)
+            size -= len(chunk)
+
+    # these responses never have a body, even without Content-Length (RFC 7230, section 3.3.3)
+    if status < 200 or status in (204, 304):
+        return True
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            sizeLine = await reader.readline()
+            size = int(sizeLine.split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                # skip trailers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return True
+            await readExactly(size)
+            await reader.readline()
+    if 'content-length' in headers:
+        await readExactly(int(headers['content-length']))
+        return True
+    while True:
+        chunk = await reader.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        decompressor.feed(chunk)
+
+def downloadSitesAsync(toVisit: queue.Queue, downloaded: queue.Queue, fetcher: AsyncFetcher, l: threading.Lock, budget=None, hooks=None, reuse=None):
+    """
+    Downloads sites with AsyncFetcher until it receives None from toVisit queue.
+
+    Runs its own event loop, so it should be started in a separate thread.
+    Sites are passed on to downloaded queue the same way downloadSite does it.
+
+    :type toVisit: queue.Queue
+    :param toVisit: Stores unvisited sites.
+
+    :type downloaded: queue.Queue
+    :param downloaded: Stores downloaded sites.
+
+    :type fetcher: AsyncFetcher
+    :param fetcher: Fetcher used to download sites.
+
+    :type l: threading.Lock
+    :param l: Thread lock used to secure thread-unsafe operations.
+
+    :type budget: crawling.CrawlBudget
+    :param budget: If given, downloading stops once it is used up or cancelled.
+
+    :type hooks: incremental.ManifestHooks
+    :param hooks: If given, it is asked which sites have to be downloaded and which of them have changed, see crawling.crawl.
+
+    :type reuse: function
+    :param reuse: Called with item taken from toVisit and what hooks stored for the site instead of passing on site
+                  which has not changed. Required if hooks are given.
+    """
+
+    async def worker(pending):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            if budget is not None and budget.exhausted():
+                budget.drop()
+                toVisit.task_done(item, deferred=True)
+                continue
+            siteAddress, dist = item
+            # hooks and reuse read and write files, so they do not run in the event loop thread
+            stored, headers = await loop.run_in_executor(None, hooks.prefetch, siteAddress) if hooks is not None else (None, None)
+            if hooks is not None and headers is None:
+                await loop.run_in_executor(None, reuse, item, stored)
+                continue
+            requestTime = loop.time()
+            try:
+                with fetcher.stats.working('download') if fetcher.stats is not None else contextlib.nullcontext():
+                    response = await fetcher.fetch(siteAddress, headers)
+            except Exception as e:
+                if fetcher.stats is not None:
+                    fetcher.stats.count('fetchErrors')
+                status, retryAfter = errorStatus(e)
+                if toVisit.fetched(siteAddress, status, loop.time() - requestTime, retryAfter):
+                    toVisit.requeue(siteAddress, dist)
+                    toVisit.task_done(item)
+                    continue
+                l.acquire()
+                print('\n', siteAddress, e if str(e) else type(e).__name__)
+                l.release()
+                if hooks is not None and hooks.failed(siteAddress, stored, status):
+                    await loop.run_in_executor(None, reuse, item, stored)
+                else:
+                    toVisit.task_done(item)
+                continue
+            toVisit.fetched(siteAddress, response.status, loop.time() - requestTime)
+            text = response.text() if response.status != 304 else None
+            # sites not modified are not charged to budget
+            if text is not None and budget is not None and not budget.admit(len(text)):
+                toVisit.task_done(item, deferred=True)
+                continue
+            if hooks is not None and hooks.fetched(siteAddress, stored, text, response.headers):
+                await loop.run_in_executor(None, reuse, item, stored)
+                continue
+            # put() blocks while buffer of downloaded sites is full, so it must not run in the event loop thread
+            await loop.run_in_executor(None, downloaded.put, (siteAddress, dist, text))
+
+    async def aux():
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue(maxsize=fetcher.concurrency)
+        workers = [asyncio.ensure_future(worker(pending)) for _ in range(fetcher.concurrency)]
+        while True:
+            item = await loop.run_in_executor(None, toVisit.get)
+            if item is None:
+                toVisit.task_done()
+                break
+            if budget is not None and budget.exhausted():
+                budget.drop()
+                toVisit.task_done(item, deferred=True)
+                break
+            await pending.put(item)
+        for _ in workers:
+            await pending.put(None)
+        await asyncio.gather(*workers)
+        fetcher.close()
+
+    asyncio.run(aux())
@@ -0,0 +1,635 @@
+import collections
+import hashlib
+import math
+import os
+import queue
+import re
+import sqlite3
+import threading
+import urllib.parse
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+def normalisePercentEncoding(s):
+    """
+    Decodes percent-encoded unreserved characters and uppercases hex digits of the remaining ones (RFC 3986, 6.2.2.2).
+
+    :type s: string
+    :param s: URL component to normalise.
+    """
+
+    if '%' not in s:
+        return s
+
+    def aux(matchObj):
+        c = chr(int(matchObj.group(1), 16))
+        return c if c in UNRESERVED else matchObj.group().upper()
+    return re.sub(r'%([0-9a-fA-F]{2})', aux, s)
+
+def removeDotSegments(path):
+    """
+    Removes '.' and '..' segments from path (RFC 3986, 5.2.4).
+
+    :type path: string
+    :param path: Path component of URL.
+    """
+
+    output = []
+    for segment in path.split('/')[1:]:
+        if segment == '..':
+            if output:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    if path.split('/')[-1] in ('.', '..'):
+        output.append('')
+    return '/' + '/'.join(output)
+
+def canonicaliseURL(url):
+    """
+    Returns URL in canonical form or None if it is not valid http(s) URL.
+
+    Scheme and host are lowercased, default port, fragment and dot segments
+    are removed, percent-encoding is normalised and query parameters are sorted.
+
+    :type url: string
+    :param url: URL to canonicalise.
+    """
+
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if ':' in netloc:
+        netloc = '[' + netloc + ']'
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc += ':%d' % port
+    if parts.username is not None:
+        userinfo = parts.netloc.rpartition('@')[0]
+        netloc = userinfo + '@' + netloc
+    path = removeDotSegments(normalisePercentEncoding(parts.path or '/'))
+    query = '&'.join(sorted(normalisePercentEncoding(param) for param in parts.query.split('&') if param))
+    return urllib.parse.urlunsplit((scheme, netloc, path, query, ''))
+
+def canonicalKey(url):
+    """
+    Returns key under which canonical URL is remembered as seen.
+
+    Addresses differing only in scheme (http or https) or trailing slash have the same key.
+
+    :type url: string
+    :param url: Canonical URL.
+    """
+
+    key = url.split(':', 1)[1]
+    path, sep, query = key.partition('?')
+    if path.endswith('/') and path.count('/') > 3:
+        path = path[:-1]
+    return path + sep + query
+
+def resolveLink(baseAddress, link):
+    """
+    Returns canonical absolute URL which link found on site points to or None if it does not point to http(s) site.
+
+    :type baseAddress: string
+    :param baseAddress: Address against which relative links are resolved.
+
+    :type link: string
+    :param link: Value of href attribute.
+    """
+
+    link = link.strip()
+    if link == '' or link.startswith('#'): # don't try to follow anchors
+        return None
+    return canonicaliseURL(urllib.parse.urljoin(baseAddress, link))
+
+def resolveLinks(baseAddress, links):
+    """
+    Returns list of canonical absolute URLs which links found on single site point to, in order of first occurrence,
+    without repetitions and without links which do not point to http(s) sites.
+
+    Each distinct link is resolved once and absolute links are not joined with baseAddress.
+
+    :type baseAddress: string
+    :param baseAddress: Address against which relative links are resolved.
+
+    :type links: list
+    :param links: Values of href attributes.
+    """
+
+    resolved = {}
+    seen = set()
+    fullLinks = []
+    for link in links:
+        if link in resolved:
+            continue
+        stripped = link.strip()
+        if stripped == '' or stripped.startswith('#'): # don't try to follow anchors
+            fullLink = None
+        elif stripped.startswith(('http://', 'https://')):
+            fullLink = canonicaliseURL(stripped)
+        else:
+            fullLink = canonicaliseURL(urllib.parse.urljoin(baseAddress, stripped))
+        resolved[link] = fullLink
+        if fullLink is not None and fullLink not in seen:
+            seen.add(fullLink)
+            fullLinks.append(fullLink)
+    return fullLinks
+
+class Frontier:
+    """
+    This class stores sites waiting to be downloaded and remembers every site that has ever been queued.
+
+    Sites are remembered when they are queued, not when they are processed, so site
+    linked from many others is downloaded once. It behaves like queue.Queue:
+    every site taken with get() has to be marked with task_done() once processed,
+    and join() blocks until there are no sites left.
+    """
+    def __init__(self, maxDepth=-1, urlQueue=None, seen=None):
+        """
+        Creates Frontier object.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type urlQueue: queue.Queue
+        :param urlQueue: Queue storing tuples (url, dist) of sites to download. Defaults to FIFO queue.
+
+        :type seen: dict
+        :param seen: Maps canonicalKey of each queued site to the smallest distance it was found at.
+        """
+
+        self.maxDepth = maxDepth
+        self.queue = urlQueue if urlQueue is not None else queue.Queue()
+        self.seen = seen if seen is not None else {}
+        self.lock = threading.Lock()
+        self.pending = None
+
+    def trackPending(self):
+        """
+        Makes frontier remember sites queued but not processed yet, so they can be saved in checkpoint.
+
+        It costs memory proportional to the number of queued sites, so it is off by default.
+        """
+
+        self.pending = collections.Counter()
+
+    def tracksPending(self):
+        """
+        Returns True if frontier remembers sites queued but not processed yet (see trackPending).
+        """
+
+        return self.pending is not None
+
+    def put(self, url, dist, hint=None):
+        """
+        Queues site if it has not been queued before. Returns True if site was queued.
+
+        Site already seen is queued again only if it is now found closer to the start site,
+        since then more of its links may be followed.
+
+        :type url: string
+        :param url: Address of site.
+
+        :type dist: int
+        :param dist: Distance from start site.
+
+        :type hint: priority.LinkHint
+        :param hint: What is known about link to the site, passed to urlQueue if it scores sites (see usesHints).
+        """
+
+        url = self.remember(url, dist)
+        if url is None:
+            return False
+        self.queue.put((url, dist, hint) if hint is not None and self.usesHints() else (url, dist))
+        return True
+
+    def defer(self, url, dist):
+        """
+        Remembers site as seen and pending without queueing it, so it is saved in checkpoint
+        and downloaded when crawl is resumed. Used for links not followed because budget of crawl is used up.
+        Returns True if site was remembered.
+
+        :type url: string
+        :param url: Address of site.
+
+        :type dist: int
+        :param dist: Distance from start site.
+        """
+
+        return self.remember(url, dist) is not None
+
+    def remember(self, url, dist):
+        """
+        Marks site as seen and pending unless it has already been seen as close to the start site.
+        Returns canonical address of site if it was marked, None otherwise.
+
+        :type url: string
+        :param url: Address of site.
+
+        :type dist: int
+        :param dist: Distance from start site.
+        """
+
+        url = canonicaliseURL(url)
+        if url is None:
+            return None
+        key = canonicalKey(url)
+        self.lock.acquire()
+        try:
+            oldDist = self.seen.get(key)
+            if oldDist is not None and (self.maxDepth == -1 or dist >= oldDist):
+                return None
+            self.seen[key] = dist
+            if self.pending is not None:
+                self.pending[(url, dist)] += 1
+        finally:
+            self.lock.release()
+        return url
+
+    def usesHints(self):
+        """
+        Returns True if urlQueue orders sites using hints given to put(), e.g. priority.BestFirstQueue,
+        so they are worth computing.
+        """
+
+        return getattr(self.queue, 'usesHints', False)
+
+    def requeue(self, url, dist):
+        """
+        Queues site restored from checkpoint without checking whether it has been seen.
+
+        :type url: string
+        :param url: Canonical address of site.
+
+        :type dist: int
+        :param dist: Distance from start site.
+        """
+
+        self.lock.acquire()
+        if self.pending is not None:
+            self.pending[(url, dist)] += 1
+        self.lock.release()
+        self.queue.put((url, dist))
+
+    def get(self):
+        """
+        Returns tuple (url, dist) of next site to download or None if workers should stop.
+
+        Site queued again because it was found closer to the start site is downloaded once:
+        copy queued before is skipped if it has not been taken yet.
+        """
+
+        while True:
+            item = self.queue.get()
+            if item is None or not self.isStale(item):
+                return item
+            # skipped site still counts as taken for urlQueue scheduling sites per host and for join()
+            self.fetched(item[0])
+            self.task_done(item)
+
+    def isStale(self, item):
+        """
+        Returns True if site has been queued again since item was queued, at smaller distance.
+
+        :type item: tuple
+        :param item: Tuple (url, dist) of queued site.
+        """
+
+        key = canonicalKey(item[0])
+        self.lock.acquire()
+        try:
+            dist = self.seen.get(key)
+        finally:
+            self.lock.release()
+        return dist is not None and dist < item[1]
+
+    def fetched(self, url, status=None, elapsed=None, retryAfter=None):
+        """
+        Reports that site taken with get() has been downloaded or failed, so urlQueue scheduling
+        sites per host (e.g. politeness.HostQueue) can adapt to it. Returns True if site should be queued again.
+
+        :type url: string
+        :param url: Address of site.
+
+        :type status: int
+        :param status: HTTP status of response, None if no response was received.
+
+        :type elapsed: float
+        :param elapsed: Time in seconds it took to receive the response.
+
+        :type retryAfter: float
+        :param retryAfter: Time in seconds given in Retry-After header, if any.
+        """
+
+        if hasattr(self.queue, 'fetched'):
+            return self.queue.fetched(url, status, elapsed, retryAfter)
+        return False
+
+    def task_done(self, item=None, deferred=False):
+        """
+        Marks site taken with get() as processed.
+
+        :type item: tuple
+        :param item: Tuple (url, dist) returned by get(), None for stop signal.
+
+        :type deferred: bool
+        :param deferred: Flag specifying whether site was dropped without being visited, e.g. because budget of crawl is used up.
+                         It stays pending then, so it is saved in checkpoint.
+        """
+
+        if item is not None and self.pending is not None and not deferred:
+            self.lock.acquire()
+            self.pending[item] -= 1
+            if self.pending[item] <= 0:
+                del self.pending[item]
+            self.lock.release()
+        self.queue.task_done()
+
+    def join(self, timeout=None):
+        """
+        Blocks until all queued sites have been processed or timeout expires. Returns True if there are no sites left.
+
+        :type timeout: float
+        :param timeout: The longest time in seconds to wait, None means no limit.
+        """
+
+        with self.queue.all_tasks_done:
+            if self.queue.unfinished_tasks:
+                self.queue.all_tasks_done.wait(timeout)
+            return self.queue.unfinished_tasks == 0
+
+    def stop(self, workers):
+        """
+        Makes get() return None to specified number of workers.
+
+        :type workers: int
+        :param workers: Number of workers to stop.
+        """
+
+        for _ in range(workers):
+            self.queue.put(None)
+
+    def qsize(self):
+        """
+        Returns number of sites waiting to be downloaded.
+        """
+
+        return self.queue.qsize()
+
+    def close(self):
+        """
+        Closes files of urlQueue and seen index, if they keep sites in files (e.g. those of diskFrontier).
+        """
+
+        for store in (self.queue, self.seen):
+            if hasattr(store, 'close'):
+                store.close()
+
+    def snapshot(self):
+        """
+        Returns tuple (pending, seen) of lists of tuples (url, dist) and (key, dist) describing state of frontier.
+
+        Requires trackPending() to have been called before any site was queued.
+        """
+
+        self.lock.acquire()
+        try:
+            pending = [item for item, count in self.pending.items() for _ in range(count)]
+            seen = list(self.seen.items())
+        finally:
+            self.lock.release()
+        return pending, seen
+
+class BloomFilter:
+    """
+    Compact probabilistic set. It may claim that key was added when it was not,
+    but never the other way round.
+    """
+    def __init__(self, capacity, errorRate=0.01):
+        """
+        Creates empty BloomFilter object.
+
+        :type capacity: int
+        :param capacity: Expected number of keys.
+
+        :type errorRate: float
+        :param errorRate: Expected fraction of false positives after capacity keys have been added.
+        """
+
+        self.size = max(8, int(-capacity * math.log(errorRate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        """
+        Yields positions of bits corresponding to key.
+
+        :type key: string
+        :param key: Key to hash.
+        """
+
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key):
+        """
+        Adds key to the filter.
+
+        :type key: string
+        :param key: Key to add.
+        """
+
+        for pos in self.positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(key))
+
+class DiskSeenIndex:
+    """
+    Maps keys of seen sites to distances keeping them in sqlite database.
+
+    Bloom filter kept in memory answers most lookups of sites never seen before
+    without touching the disk. Recent writes are buffered and stored in batches.
+    It supports get() and item assignment, so it can be used as seen index of Frontier.
+    """
+    def __init__(self, path, expectedSites=10000000, errorRate=0.01, writeBuffer=10000, resume=False):
+        """
+        Creates DiskSeenIndex object.
+
+        :type path: string
+        :param path: Path of sqlite database file.
+
+        :type expectedSites: int
+        :param expectedSites: Expected number of seen sites, determines memory used by bloom filter.
+
+        :type errorRate: float
+        :param errorRate: Fraction of lookups of unseen sites allowed to reach the disk.
+
+        :type writeBuffer: int
+        :param writeBuffer: Number of writes kept in memory before they are stored.
+
+        :type resume: bool
+        :param resume: Flag specifying whether sites stored in the file before should be kept. They are removed by default.
+        """
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, dist INTEGER)')
+        if not resume:
+            self.db.execute('DELETE FROM seen')
+            self.db.commit()
+        self.bloom = BloomFilter(expectedSites, errorRate)
+        for (key,) in self.db.execute('SELECT key FROM seen'):
+            self.bloom.add(key)
+        self.pending = {}
+        self.writeBuffer = writeBuffer
+
+    def get(self, key, default=None):
+        """
+        Returns distance stored for key or default if key has not been seen.
+
+        :type key: string
+        :param key: Key of site.
+
+        :type default: any
+        :param default: Value returned if key has not been seen.
+        """
+
+        if key in self.pending:
+            return self.pending[key]
+        if key not in self.bloom:
+            return default
+        row = self.db.execute('SELECT dist FROM seen WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def __setitem__(self, key, dist):
+        self.bloom.add(key)
+        self.pending[key] = dist
+        if len(self.pending) >= self.writeBuffer:
+            self.flush()
+
+    def items(self):
+        """
+        Returns list of tuples (key, dist) of all seen sites.
+        """
+
+        self.flush()
+        return self.db.execute('SELECT key, dist FROM seen').fetchall()
+
+    def flush(self):
+        """
+        Stores buffered writes in the database.
+        """
+
+        self.db.executemany('INSERT OR REPLACE INTO seen VALUES (?, ?)', self.pending.items())
+        self.db.commit()
+        self.pending.clear()
+
+    def close(self):
+        """
+        Stores buffered writes and closes the database.
+        """
+
+        self.flush()
+        self.db.close()
+
+class DiskQueue(queue.Queue):
+    """
+    FIFO queue keeping at most maxInMemory items in memory and the rest in sqlite database.
+    """
+    def __init__(self, path, maxInMemory=100000, resume=False):
+        """
+        Creates DiskQueue object.
+
+        :type path: string
+        :param path: Path of sqlite database file.
+
+        :type maxInMemory: int
+        :param maxInMemory: The biggest number of items kept in memory.
+
+        :type resume: bool
+        :param resume: Flag specifying whether items stored in the file before should be kept. They are removed by default.
+        """
+
+        self.path = path
+        self.maxInMemory = max(1, maxInMemory)
+        self.resume = resume
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.queue = collections.deque()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, dist INTEGER)')
+        if not self.resume:
+            self.db.execute('DELETE FROM queue')
+            self.db.commit()
+        self.onDisk = self.db.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
+
+    def _qsize(self):
+        return len(self.queue) + self.onDisk
+
+    def _put(self, item):
+        # once items are spilled, newer ones have to follow them to the disk to keep FIFO order
+        if self.onDisk == 0 and len(self.queue) < self.maxInMemory:
+            self.queue.append(item)
+        else:
+            self.db.execute('INSERT INTO queue (url, dist) VALUES (?, ?)', item if item is not None else (None, None))
+            self.onDisk += 1
+
+    def _get(self):
+        if not self.queue:
+            rows = self.db.execute('SELECT id, url, dist FROM queue ORDER BY id LIMIT ?', (max(1, self.maxInMemory // 2),)).fetchall()
+            self.db.execute('DELETE FROM queue WHERE id <= ?', (rows[-1][0],))
+            self.db.commit()
+            self.onDisk -= len(rows)
+            self.queue.extend((url, dist) if url is not None else None for _, url, dist in rows)
+        return self.queue.popleft()
+
+    def close(self):
+        """
+        Commits items stored in the database and closes it. Items kept in memory are lost.
+        """
+
+        with self.mutex:
+            self.db.commit()
+            self.db.close()
+
+def diskFrontier(directory, maxDepth=-1, maxInMemory=100000, expectedSites=10000000, errorRate=0.01, resume=False):
+    """
+    Returns Frontier keeping queued and seen sites in sqlite databases, for crawls too big to fit in memory.
+
+    Sites left in the directory by previous crawl are removed, so new crawl starts from scratch, unless resume is set.
+
+    :type directory: string
+    :param directory: Directory in which database files are created.
+
+    :type maxDepth: int
+    :param maxDepth: The biggest distance from start site crawler can reach.
+
+    :type maxInMemory: int
+    :param maxInMemory: The biggest number of queued sites kept in memory.
+
+    :type expectedSites: int
+    :param expectedSites: Expected number of seen sites, determines memory used by bloom filter.
+
+    :type errorRate: float
+    :param errorRate: Fraction of lookups of unseen sites allowed to reach the disk.
+
+    :type resume: bool
+    :param resume: Flag specifying whether queued and seen sites left in the directory by previous crawl should be used.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    return Frontier(maxDepth,
+                    DiskQueue(os.path.join(directory, 'queue.db'), maxInMemory, resume),
+                    DiskSeenIndex(os.path.join(directory, 'seen.db'), expectedSites, errorRate, resume=resume))
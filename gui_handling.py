@@ -3,8 +3,13 @@ import pickle
 import datetime
 import json
 import threading
+import collections
+import time
 
-from crawling import crawl, CrawlResult, searchForSentencesContainingWord, searchForWord, searchForPattern
+from crawling import crawl, resumeCrawl, CrawlResult, CrawlProgress, CrawlBudget, searchForSentencesContainingWord, searchForWord, searchForPattern
+from checkpoint import Checkpoint
+from result_files import BinaryResults, saveBinary, saveJSONLines
+from input_parsing import comaSepToList, parseAttrSpec, parseStartSiteAddress
 
 import gi
 gi.require_version('Gtk', '3.0')
@@ -14,57 +19,11 @@ import os
 import sys
 sys.path.insert(0, re.match(r'(.*/)', os.path.abspath(__file__)).group(1))
 
-def comaSepToList(s: str):
-    """
-    Returns [] if s is empty or list of strings which were originally separated by commas in s.
-
-    :type s: string
-    :param s: String to process.
-    """
-
-    if s == '':
-        return []
-    return s.split(',')
-
-def parseAttrSpec(text):
-    """
-    Creates dictionary from text in this way:
-
-    href:foo,bar
-    id:foo
-
-    will be converted to
+# the longest time in seconds results view may block GTK main loop while adding rows
+ROWS_TIME_SLICE = 0.01
 
-    {
-        'href': ['foo', 'bar'],
-        'id': ['foo']
-    }
-    
-    :type text: string
-    :param text: Text to process.
-    """
-
-    hyplnAttrSpec = {}
-    for line in text.split(sep='\n'):
-        if re.match(r'[a-zA-Z0-9\-\_]+:([a-zA-Z0-9\-\_ ]+)(,([a-zA-Z0-9\-\_ ]+))*', line):
-            attr, valString = line.split(sep=':')
-            hyplnAttrSpec[attr] = comaSepToList(valString)
-    if hyplnAttrSpec == {}:
-        hyplnAttrSpec = None
-    return hyplnAttrSpec
-
-def parseStartSiteAddress(address):
-    """
-    Adds '/' to the end of address if there isn't already.
-
-    :type address: string
-    :param address: Url string.
-    """
-    if len(address) == 0:
-        return address
-    if address[len(address)-1] != '/':
-        address += '/'
-    return address
+# text of row shown under site until it is expanded
+MATCHES_PLACEHOLDER = '...'
 
 class GUIcrawler:
     """
@@ -81,6 +40,14 @@ class GUIcrawler:
         self.window = self.builder.get_object('mainWindow')
         self.builder.connect_signals(self)
         self.res = None
+        self.shownRes = None
+        self.progress = None
+        self.budget = None
+        self.rowsLock = threading.Lock()
+        self.pendingRows = collections.deque()
+        self.rowsSource = None
+        self.flushScheduled = False
+        self.collapsedMatches = {}
 
     def quitApp(self, widget, data=None):
         """
@@ -139,17 +106,13 @@ class GUIcrawler:
         startSite = self.builder.get_object("c1StartAddress_entry").get_text()
         startSite = parseStartSiteAddress(startSite)
 
-        def aux():
-            self.res = crawl(   startSite,
+        self.startCrawl(    widget,
+                            startSite,
                             self.builder.get_object("c1MaxDepth_spinButton").get_value_as_int(),
                             hyplnAttrSpec,
                             searchForSentencesContainingWord(   self.builder.get_object("c1WordToSearch_entry").get_text(),
                                                                 self.builder.get_object("c1_caseSensitive_checkButton").get_active(),
                                                                 comaSepToList(self.builder.get_object("c1TagToSearch_entry").get_text())))
-            GLib.idle_add(widget.show_all)
-
-        t = threading.Thread(target=aux)
-        t.start()
     
     def on_c2GoButton_clicked(self, widget, data=None):
         """
@@ -168,17 +131,13 @@ class GUIcrawler:
         startSite = self.builder.get_object("c2StartAddress_entry").get_text()
         startSite = parseStartSiteAddress(startSite)
 
-        def aux():
-            self.res = crawl(   startSite,
+        self.startCrawl(    widget,
+                            startSite,
                             self.builder.get_object("c2MaxDepth_spinButton").get_value_as_int(),
                             hyplnAttrSpec,
                             searchForWord(  self.builder.get_object("c2WordToSearch_entry").get_text(),
                                             self.builder.get_object("c2_caseSensitive_checkButton").get_active(),
                                             comaSepToList(self.builder.get_object("c2TagToSearch_entry").get_text())))
-            GLib.idle_add(widget.show_all)
-
-        t = threading.Thread(target=aux)
-        t.start()
 
     def on_c3GoButton_clicked(self, widget, data=None):
         """
@@ -197,22 +156,119 @@ class GUIcrawler:
         startSite = self.builder.get_object("c3StartAddress_entry").get_text()
         startSite = parseStartSiteAddress(startSite)
 
-        def aux():
-            self.res = crawl(   startSite,
+        self.startCrawl(    widget,
+                            startSite,
                             self.builder.get_object("c3MaxDepth_spinButton").get_value_as_int(),
                             hyplnAttrSpec,
                             searchForPattern(   self.builder.get_object("c3PatternToSearch_entry").get_text(),
                                                 self.builder.get_object("c3_caseSensitive_checkButton").get_active(),
                                                 comaSepToList(self.builder.get_object("c3TagToSearch_entry").get_text())))
-            GLib.idle_add(widget.show_all)
+
+    def startCrawl(self, resultsWindow, startSite, maxDepth, hyplnAttrSpec, action):
+        """
+        Starts crawl in a separate thread and shows results window right away.
+        Results are added to the window as soon as they are found and progress of crawl is shown live.
+
+        :type resultsWindow: Gtk.Widget
+        :param resultsWindow: Window showing crawl results.
+
+        :type startSite: string
+        :param startSite: Address of site from which crawl begins.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type hyplnAttrSpec: dict
+        :param hyplnAttrSpec: Contains allowed attribute values of <a> tags.
+
+        :type action: function
+        :param action: Action to perform on downloaded sites.
+        """
+
+        progress, budget = self.startProgress()
+        self.res = None
+        self.clearResults()
+        self.fillCrawlInfo(startSite, maxDepth, time.time(), None)
+        resultsWindow.show_all()
+
+        def aux():
+            res, error = None, None
+            try:
+                res = crawl(startSite, maxDepth, hyplnAttrSpec, action, budget=budget, progress=progress,
+                            onResult=lambda siteAddress, matches: self.queueResultRow(siteAddress, matches, progress))
+            except Exception as e:
+                error = e
+            finally:
+                # window leaves crawling state even if crawl failed
+                GLib.idle_add(self.crawlFinished, res, progress, error)
 
         t = threading.Thread(target=aux)
         t.start()
 
-    def on_crawlResultsWindow_show(self, widget, data=None):
+    def startProgress(self):
         """
-        Fills labels with data in results window.
-        
+        Stops crawl started before, if it is still running, and returns tuple (progress, budget) for a new one.
+        """
+
+        if self.budget is not None:
+            self.budget.cancel()
+        self.rowsLock.acquire()
+        self.progress = CrawlProgress()
+        self.rowsLock.release()
+        self.budget = CrawlBudget()
+        self.builder.get_object("stopCrawlButton").set_sensitive(True)
+        GLib.timeout_add(500, self.updateProgress, self.progress)
+        return self.progress, self.budget
+
+    def crawlFinished(self, res, progress, error=None):
+        """
+        Shows information about finished crawl. Its results have already been added to results window.
+
+        :type res: crawling.CrawlResult
+        :param res: Results of the crawl, None if it failed.
+
+        :type progress: crawling.CrawlProgress
+        :param progress: Statistics of the crawl.
+
+        :type error: Exception
+        :param error: Exception which stopped the crawl, if any.
+        """
+
+        if progress is not self.progress:
+            # crawl was replaced by another one
+            return False
+        self.budget = None
+        self.builder.get_object("stopCrawlButton").set_sensitive(False)
+        if error is not None:
+            self.showError("Crawl failed", str(error) or type(error).__name__)
+        if res is None:
+            return False
+        self.res = res
+        self.shownRes = res
+        self.fillCrawlInfo(res.startAddress, res.maxDepth, res.startTime, res.endTime, res.truncated)
+        return False
+
+    def showError(self, title, message):
+        """
+        Shows modal dialog with error message.
+
+        :type title: string
+        :param title: Short description of the error.
+
+        :type message: string
+        :param message: Details of the error.
+        """
+
+        dialog = Gtk.MessageDialog(transient_for=self.window, modal=True, message_type=Gtk.MessageType.ERROR,
+                                   buttons=Gtk.ButtonsType.CLOSE, text=title)
+        dialog.format_secondary_text(message)
+        dialog.run()
+        dialog.destroy()
+
+    def on_stopCrawlButton_clicked(self, widget, data=None):
+        """
+        Stops running crawl. Results found so far are kept.
+
         :type widget: Gtk.Widget
         :param widget: Widget handling by this method.
 
@@ -220,18 +276,195 @@ class GUIcrawler:
         :param data: Additional data.
         """
 
-        self.builder.get_object("res_startSite").set_text(self.res.startAddress)
-        self.builder.get_object("res_maxDepth").set_text(str(self.res.maxDepth))
-        self.builder.get_object("res_startTime").set_text(datetime.datetime.fromtimestamp(self.res.startTime).strftime("%A, %d %B, %Y %I:%M:%S"))
-        self.builder.get_object("res_endTime").set_text(datetime.datetime.fromtimestamp(self.res.endTime).strftime("%A, %d %B, %Y %I:%M:%S"))
-        self.builder.get_object("res_crawlTime").set_text(str(self.res.crawlTime))
+        if self.budget is not None:
+            self.budget.cancel()
+        widget.set_sensitive(False)
+
+    def fillCrawlInfo(self, startAddress, maxDepth, startTime, endTime, truncated=False):
+        """
+        Fills labels describing crawl in results window.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl began.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started.
+
+        :type endTime: float
+        :param endTime: Time at which crawl ended or None if it is still running.
+
+        :type truncated: bool
+        :param truncated: Flag specifying whether crawl was stopped before visiting all sites.
+        """
+
+        self.builder.get_object("res_startSite").set_text(startAddress)
+        self.builder.get_object("res_maxDepth").set_text(str(maxDepth))
+        self.builder.get_object("res_startTime").set_text(datetime.datetime.fromtimestamp(startTime).strftime("%A, %d %B, %Y %I:%M:%S"))
+        if endTime is None:
+            self.builder.get_object("res_endTime").set_text("in progress")
+            self.builder.get_object("res_crawlTime").set_text("-")
+        else:
+            self.builder.get_object("res_endTime").set_text(datetime.datetime.fromtimestamp(endTime).strftime("%A, %d %B, %Y %I:%M:%S")
+                                                            + (" (stopped before visiting all sites)" if truncated else ""))
+            self.builder.get_object("res_crawlTime").set_text(str(endTime - startTime))
+
+    def updateProgress(self, progress):
+        """
+        Shows statistics of running crawl in results window. Returns True while they should be updated again.
+
+        :type progress: crawling.CrawlProgress
+        :param progress: Statistics of the crawl.
+        """
+
+        if progress is not self.progress:
+            # another crawl has been started in the meantime
+            return False
+        self.builder.get_object("res_pages").set_text("%d (%d with results)" % (progress.pagesDownloaded(), progress.sitesWithResults()))
+        self.builder.get_object("res_pagesPerSecond").set_text("%.1f" % progress.pagesPerSecond())
+        self.builder.get_object("res_queueDepth").set_text(str(progress.queueDepth()))
+        self.builder.get_object("res_downloaded").set_text("%.2f" % (progress.bytesDownloaded() / 1024 / 1024))
+        return not progress.finished
+
+    def clearResults(self):
+        """
+        Removes all results from results window.
+        """
+
+        self.rowsLock.acquire()
+        self.pendingRows.clear()
+        self.rowsLock.release()
+        self.rowsSource = None
+        self.collapsedMatches = {}
+        self.builder.get_object("resultsTreeStore").clear()
+
+    def queueResultRow(self, siteAddress, matches, progress):
+        """
+        Queues results of site to be added to results window unless they come from crawl replaced by another one.
+        Can be called from any thread.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+
+        :type progress: crawling.CrawlProgress
+        :param progress: Statistics of the crawl which found the results.
+        """
+
+        self.rowsLock.acquire()
+        if progress is self.progress:
+            self.pendingRows.append((siteAddress, matches))
+        self.rowsLock.release()
+        self.scheduleFlush()
+
+    def scheduleFlush(self):
+        """
+        Makes rows from rowsSource and pendingRows be added to results window when GTK main loop is idle.
+        """
+
+        self.rowsLock.acquire()
+        schedule = not self.flushScheduled
+        self.flushScheduled = True
+        self.rowsLock.release()
+        if schedule:
+            GLib.idle_add(self.flushResultRows)
+
+    def flushResultRows(self):
+        """
+        Adds queued results to results window for at most ROWS_TIME_SLICE seconds,
+        so the window stays responsive. Returns True if there are rows left.
+        """
+
+        deadline = time.monotonic() + ROWS_TIME_SLICE
+        while time.monotonic() < deadline:
+            row = None
+            if self.rowsSource is not None:
+                row = next(self.rowsSource, None)
+                if row is None:
+                    self.rowsSource = None
+            if row is None:
+                self.rowsLock.acquire()
+                if self.pendingRows:
+                    row = self.pendingRows.popleft()
+                else:
+                    self.flushScheduled = False
+                self.rowsLock.release()
+                if row is None:
+                    return False
+            self.appendSiteRow(*row)
+        return True
+
+    def appendSiteRow(self, siteAddress, matches):
+        """
+        Adds row of site to results window. Its matches are added only once the row is expanded.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+        """
 
         resultsTreeStore = self.builder.get_object("resultsTreeStore")
-        resultsTreeStore.clear()
-        for siteAddress, foundOnSite in self.res.results:
-            bIter = resultsTreeStore.append(None, [siteAddress])
-            for singleResult in foundOnSite:
+        bIter = resultsTreeStore.append(None, [siteAddress])
+        if len(matches) != 0:
+            self.collapsedMatches[siteAddress] = matches
+            resultsTreeStore.append(bIter, [MATCHES_PLACEHOLDER])
+
+    def on_resultsTreeView_test_expand_row(self, widget, bIter, path, data=None):
+        """
+        Replaces placeholder with matches found on site when its row is expanded for the first time.
+
+        :type widget: Gtk.TreeView
+        :param widget: Widget handling by this method.
+
+        :type bIter: Gtk.TreeIter
+        :param bIter: Expanded row.
+
+        :type path: Gtk.TreePath
+        :param path: Path of expanded row.
+
+        :type data: any
+        :param data: Additional data.
+        """
+
+        resultsTreeStore = widget.get_model()
+        matches = self.collapsedMatches.pop(resultsTreeStore[bIter][0], None)
+        if matches is not None:
+            placeholder = resultsTreeStore.iter_children(bIter)
+            for singleResult in matches:
                 resultsTreeStore.append(bIter, [singleResult])
+            resultsTreeStore.remove(placeholder)
+        return False
+
+    def on_crawlResultsWindow_show(self, widget, data=None):
+        """
+        Fills labels with data in results window and starts adding results to it, unless they are already shown.
+        
+        :type widget: Gtk.Widget
+        :param widget: Widget handling by this method.
+
+        :type data: any
+        :param data: Additional data.
+        """
+
+        if self.res is None or self.res is self.shownRes:
+            return
+        # results pickled before crawls could be truncated lack the flag
+        self.fillCrawlInfo(self.res.startAddress, self.res.maxDepth, self.res.startTime, self.res.endTime, getattr(self.res, 'truncated', False))
+        self.shownRes = self.res
+        self.collapsedMatches = {}
+        self.builder.get_object("resultsTreeStore").clear()
+        if isinstance(self.res.results, BinaryResults):
+            # matches of collapsed rows stay in the file until they are expanded
+            self.rowsSource = self.res.results.rows()
+        else:
+            self.rowsSource = iter(self.res.results)
+        self.scheduleFlush()
     
     def on_saveButton_clicked(self, widget, data=None):
         """
@@ -253,6 +486,9 @@ class GUIcrawler:
                 savedFileName = readFileName
             else:
                 savedFileName = readFileName + '.store'
+            if not isinstance(self.res.results, list):
+                # results read lazily from file have to be loaded before pickling
+                self.res = CrawlResult(self.res.startAddress, self.res.maxDepth, self.res.startTime, self.res.endTime, list(self.res.results), getattr(self.res, 'truncated', False))
             with open(savedFileName, 'wb') as f:
                 pickle.dump(self.res, f)
         elif model[curId][0] == "*.json":
@@ -262,6 +498,18 @@ class GUIcrawler:
                 savedFileName = readFileName + '.json'
             with open(savedFileName, 'w') as f:
                 json.dump(self.res.jsonify(), f)
+        elif model[curId][0] == "*.jsonl":
+            if re.search(r'\.jsonl$', readFileName):
+                savedFileName = readFileName
+            else:
+                savedFileName = readFileName + '.jsonl'
+            saveJSONLines(self.res, savedFileName)
+        elif model[curId][0] == "*.gcr":
+            if re.search(r'\.gcr$', readFileName):
+                savedFileName = readFileName
+            else:
+                savedFileName = readFileName + '.gcr'
+            saveBinary(self.res, savedFileName)
     
     def on_openButton_clicked(self, widget, data=None):
         """
@@ -281,3 +529,24 @@ class GUIcrawler:
         elif re.search(r"\.json$", fname):
             with open(fname, 'r') as f:
                 self.res = CrawlResult.fromJSON(json.load(f))
+        elif re.search(r"\.jsonl$", fname):
+            self.res = CrawlResult.fromJSONLines(fname)
+        elif re.search(r"\.gcr$", fname):
+            self.res = CrawlResult.fromBinary(fname)
+        elif re.search(r"\.checkpoint$", fname):
+            # results found before interruption are shown right away and those of resumed crawl are added as they are found
+            self.res = CrawlResult.fromCheckpoint(Checkpoint.load(fname))
+            progress, budget = self.startProgress()
+
+            def aux():
+                res, error = None, None
+                try:
+                    res = resumeCrawl(fname, budget=budget, progress=progress,
+                                      onResult=lambda siteAddress, matches: self.queueResultRow(siteAddress, matches, progress))
+                except Exception as e:
+                    error = e
+                finally:
+                    GLib.idle_add(self.crawlFinished, res, progress, error)
+
+            t = threading.Thread(target=aux)
+            t.start()
@@ -0,0 +1,646 @@
+import calendar
+import collections
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+import lxml.etree
+
+from crawling import crawl
+from fetching import fetchURL
+from frontier import canonicaliseURL, canonicalKey
+from metrics import CrawlStats
+
+# statuses meaning that site no longer exists, so its results are removed
+GONE_STATUSES = (404, 410)
+
+def contentHash(siteHTML):
+    """
+    Returns hash of HTML document used to find out whether site has changed.
+
+    :type siteHTML: string
+    :param siteHTML: HTML document.
+    """
+
+    return hashlib.sha1(siteHTML.encode('utf-8')).hexdigest()
+
+def crawlSettings(aAttrsFilter, action):
+    """
+    Returns JSON text describing what crawl searches for and which links it follows,
+    or None if action cannot be described (it has no spec() method).
+
+    Links and matches stored in SiteManifest are reused only by crawl with the same settings.
+
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+    :type action: function
+    :param action: Action returned by one of search functions of crawling module.
+    """
+
+    if not hasattr(action, 'spec'):
+        return None
+    attrs = {attr: sorted(values) for attr, values in aAttrsFilter.items()} if aAttrsFilter else None
+    return json.dumps({"action": action.spec(), "aAttrsFilter": attrs}, sort_keys=True)
+
+class ManifestEntry:
+    """
+    This class stores what is known about site visited by previous crawl.
+    """
+    def __init__(self, site, dist, hash, etag, lastModified, fetchedAt, links, matches):
+        """
+        Creates ManifestEntry object.
+
+        :type site: string
+        :param site: Canonical address of site.
+
+        :type dist: int
+        :param dist: Distance of site from start site.
+
+        :type hash: string
+        :param hash: Hash of HTML document of site, see contentHash.
+
+        :type etag: string
+        :param etag: Value of ETag header or None.
+
+        :type lastModified: string
+        :param lastModified: Value of Last-Modified header or None.
+
+        :type fetchedAt: float
+        :param fetchedAt: Time at which site was last downloaded or revalidated.
+
+        :type links: list
+        :param links: Canonical addresses of sites linked from the site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+        """
+
+        self.site = site
+        self.dist = dist
+        self.hash = hash
+        self.etag = etag
+        self.lastModified = lastModified
+        self.fetchedAt = fetchedAt
+        self.links = links
+        self.matches = matches
+
+    def conditionalHeaders(self):
+        """
+        Returns dictionary of headers making request conditional on site having changed since it was stored.
+        """
+
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.lastModified:
+            headers['If-Modified-Since'] = self.lastModified
+        return headers
+
+class SiteManifest:
+    """
+    Stores hash, validators, links and matches of every site visited by crawl, so the next crawl
+    can skip sites which have not changed (see recrawl).
+
+    Sites are kept in sqlite database keyed by canonicalKey of their address. Sites not visited
+    by the latest complete crawl are removed with prune().
+    """
+    def __init__(self, path, commitEvery=256):
+        """
+        Creates SiteManifest object.
+
+        :type path: string
+        :param path: Path of sqlite database file.
+
+        :type commitEvery: int
+        :param commitEvery: Number of stored sites after which they are committed to the file.
+        """
+
+        self.path = path
+        self.commitEvery = commitEvery
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS info (id INTEGER PRIMARY KEY CHECK (id = 0), startAddress TEXT, maxDepth INTEGER, '
+                        'settings TEXT, startTime REAL, endTime REAL, truncated INTEGER)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS sites (key TEXT PRIMARY KEY, site TEXT, dist INTEGER, hash TEXT, etag TEXT, '
+                        'lastModified TEXT, fetchedAt REAL, seenAt REAL, links TEXT, matches TEXT)')
+        self.db.commit()
+
+    def begin(self, startAddress, maxDepth, settings, startTime):
+        """
+        Writes description of starting crawl. Returns True if links and matches stored by previous crawl
+        can be reused, i.e. it had the same settings.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl begins.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type settings: string
+        :param settings: Settings of crawl returned by crawlSettings.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started.
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT settings FROM info').fetchone()
+            reusable = row is not None and settings is not None and row[0] == settings
+            self.db.execute('INSERT OR REPLACE INTO info VALUES (0, ?, ?, ?, ?, NULL, NULL)', (startAddress, maxDepth, settings, startTime))
+            self.db.commit()
+        return reusable
+
+    def lookup(self, url):
+        """
+        Returns ManifestEntry stored for site or None.
+
+        :type url: string
+        :param url: Canonical address of site.
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT site, dist, hash, etag, lastModified, fetchedAt, links, matches FROM sites WHERE key = ?',
+                                  (canonicalKey(url),)).fetchone()
+        if row is None:
+            return None
+        return ManifestEntry(row[0], row[1], row[2], row[3], row[4], row[5], json.loads(row[6]), json.loads(row[7]))
+
+    def store(self, entry, seenAt):
+        """
+        Stores site visited by crawl, replacing what was stored for it before.
+
+        :type entry: ManifestEntry
+        :param entry: What is known about the site.
+
+        :type seenAt: float
+        :param seenAt: Time at which crawl visiting the site started.
+        """
+
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO sites VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (canonicalKey(entry.site), entry.site, entry.dist, entry.hash, entry.etag, entry.lastModified,
+                             entry.fetchedAt, seenAt, json.dumps(entry.links), json.dumps(entry.matches)))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commitEvery:
+                self.db.commit()
+                self.uncommitted = 0
+
+    def prune(self, seenAt):
+        """
+        Removes sites not visited by crawl started at seenAt and returns list of tuples (site, matches) describing them.
+
+        :type seenAt: float
+        :param seenAt: Time at which crawl started.
+        """
+
+        with self.lock:
+            removed = [(site, json.loads(matches)) for site, matches in
+                       self.db.execute('SELECT site, matches FROM sites WHERE seenAt < ?', (seenAt,))]
+            self.db.execute('DELETE FROM sites WHERE seenAt < ?', (seenAt,))
+            self.db.commit()
+            self.uncommitted = 0
+        return removed
+
+    def end(self, endTime, truncated=False):
+        """
+        Writes crawl end time and commits stored sites.
+
+        :type endTime: float
+        :param endTime: Time at which crawl ended.
+
+        :type truncated: bool
+        :param truncated: Flag specifying whether crawl ended before visiting all sites.
+        """
+
+        with self.lock:
+            self.db.execute('UPDATE info SET endTime = ?, truncated = ?', (endTime, int(truncated)))
+            self.db.commit()
+            self.uncommitted = 0
+
+    def info(self):
+        """
+        Returns dictionary describing the latest crawl or None if nothing was stored yet.
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT startAddress, maxDepth, settings, startTime, endTime, truncated FROM info').fetchone()
+        if row is None:
+            return None
+        return {"startAddress": row[0], "maxDepth": row[1], "settings": row[2], "startTime": row[3], "endTime": row[4],
+                "truncated": bool(row[5])}
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM sites').fetchone()[0]
+
+    def close(self):
+        """
+        Commits stored sites and closes the file.
+        """
+
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+def parseLastmod(value):
+    """
+    Returns time given in <lastmod> tag of sitemap as seconds since epoch or None if it cannot be parsed.
+
+    Date without time means the end of that day, so site changed later that day is not taken as unchanged.
+
+    :type value: string
+    :param value: Date in W3C Datetime format, e.g. 2024-05-01 or 2024-05-01T10:00:00+02:00.
+    """
+
+    value = value.strip()
+    try:
+        if len(value) == 10:
+            return calendar.timegm(time.strptime(value, '%Y-%m-%d')) + 24 * 3600
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+class SitemapIndex:
+    """
+    Last modification times of sites read from /sitemap.xml of their hosts.
+
+    Sitemap of each host is downloaded once, when first site of the host is looked up.
+    Sitemap indexes are followed to sitemaps of the same host, at most maxSitemaps of them.
+    """
+    def __init__(self, timeout=10, maxSitemaps=16):
+        """
+        Creates SitemapIndex object.
+
+        :type timeout: float
+        :param timeout: Time in seconds after which downloading sitemap is abandoned.
+
+        :type maxSitemaps: int
+        :param maxSitemaps: The biggest number of sitemaps downloaded for each host.
+        """
+
+        self.timeout = timeout
+        self.maxSitemaps = maxSitemaps
+        self.lock = threading.Lock()
+        self.hostLocks = collections.defaultdict(threading.Lock)
+        self.hosts = {}
+
+    def lastModified(self, url):
+        """
+        Returns time of last modification of site given in sitemap of its host as seconds since epoch, or None if it is unknown.
+
+        :type url: string
+        :param url: Canonical address of site.
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        host = parts.scheme + '://' + parts.netloc
+        with self.lock:
+            hostLock = self.hostLocks[host]
+        # other threads wait only for sitemap of the same host
+        with hostLock:
+            if host not in self.hosts:
+                self.hosts[host] = self.load(host)
+        return self.hosts[host].get(canonicalKey(url))
+
+    def load(self, host):
+        """
+        Returns dictionary mapping canonicalKey of sites to their modification times read from sitemap of host.
+
+        :type host: string
+        :param host: Scheme and host, e.g. https://example.com.
+        """
+
+        lastmods = {}
+        toRead = [host + '/sitemap.xml']
+        visited = set()
+        while toRead and len(visited) < self.maxSitemaps:
+            sitemapAddress = toRead.pop()
+            if sitemapAddress in visited:
+                continue
+            visited.add(sitemapAddress)
+            try:
+                text = fetchURL(sitemapAddress, self.timeout)
+                # document was decoded already, so encoding it declares is overridden
+                root = lxml.etree.fromstring(text.encode('utf-8'), lxml.etree.XMLParser(encoding='utf-8', recover=True, resolve_entities=False))
+            except Exception:
+                continue
+            if root is None:
+                continue
+            for element in root.iter('{*}sitemap'):
+                loc = element.findtext('{*}loc')
+                if loc is not None and loc.strip().startswith(host + '/'):
+                    toRead.append(loc.strip())
+            for element in root.iter('{*}url'):
+                loc, lastmod = element.findtext('{*}loc'), element.findtext('{*}lastmod')
+                site = canonicaliseURL(loc.strip()) if loc is not None else None
+                modified = parseLastmod(lastmod) if lastmod is not None else None
+                if site is not None and modified is not None:
+                    lastmods[canonicalKey(site)] = modified
+        return lastmods
+
+# difference between results of site in two crawls, status is 'added', 'removed' or 'changed'
+SiteDelta = collections.namedtuple('SiteDelta', ['site', 'status', 'added', 'removed'])
+
+class ResultDelta:
+    """
+    Differences between results of two crawls, for each site which results differ.
+
+    Site is 'added' if it had no results before, 'removed' if it has no results now and 'changed' otherwise.
+    """
+    def __init__(self):
+        """
+        Creates empty ResultDelta object.
+        """
+
+        self.lock = threading.Lock()
+        self.sites = {}
+
+    def record(self, site, oldMatches, newMatches):
+        """
+        Records results of site in both crawls, if they differ.
+
+        :type site: string
+        :param site: Address of site.
+
+        :type oldMatches: list
+        :param oldMatches: Results of previous crawl on the site.
+
+        :type newMatches: list
+        :param newMatches: Results of current crawl on the site.
+        """
+
+        oldSet, newSet = set(oldMatches), set(newMatches)
+        added = [match for match in newMatches if match not in oldSet]
+        removed = [match for match in oldMatches if match not in newSet]
+        if not added and not removed:
+            return
+        status = 'added' if not oldMatches else 'removed' if not newMatches else 'changed'
+        with self.lock:
+            self.sites[site] = SiteDelta(site, status, added, removed)
+
+    def withStatus(self, status):
+        """
+        Returns list of SiteDelta objects of sites with given status.
+
+        :type status: string
+        :param status: One of 'added', 'removed' and 'changed'.
+        """
+
+        return [siteDelta for siteDelta in self.sites.values() if siteDelta.status == status]
+
+    def __iter__(self):
+        return iter(list(self.sites.values()))
+
+    def __len__(self):
+        return len(self.sites)
+
+    def jsonify(self):
+        """
+        Returns ResultDelta object in JSON format.
+        """
+
+        return {"sites": [siteDelta._asdict() for siteDelta in self.sites.values()]}
+
+    def save(self, path):
+        """
+        Writes ResultDelta object to JSON file.
+
+        :type path: string
+        :param path: Path of the file.
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.jsonify(), f, indent=4)
+
+def diffResults(oldResults, newResults):
+    """
+    Returns ResultDelta between results of two crawls, e.g. results of two CrawlResult objects.
+
+    :type oldResults: iterable
+    :param oldResults: Tuples (siteAddress, matches) of previous crawl.
+
+    :type newResults: iterable
+    :param newResults: Tuples (siteAddress, matches) of current crawl.
+    """
+
+    delta = ResultDelta()
+    old = {siteAddress: matches for siteAddress, matches in oldResults}
+    for siteAddress, matches in newResults:
+        delta.record(siteAddress, old.pop(siteAddress, []), matches)
+    for siteAddress, matches in old.items():
+        delta.record(siteAddress, matches, [])
+    return delta
+
+class ManifestHooks:
+    """
+    Hooks of crawling.crawl used by recrawl: sites which have not changed since they were stored in SiteManifest
+    are not processed again, their stored links and matches are reused, and every visited site is stored in manifest.
+    """
+    def __init__(self, manifest, reusable, delta, startTime, sitemaps=None, stats=None):
+        """
+        Creates ManifestHooks object.
+
+        :type manifest: SiteManifest
+        :param manifest: Sites stored by previous crawl, updated with sites visited by this one.
+
+        :type reusable: bool
+        :param reusable: Flag specifying whether links and matches stored in manifest can be reused, see SiteManifest.begin.
+
+        :type delta: ResultDelta
+        :param delta: Differences found between results of previous and current crawl.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started, stored as time at which sites were seen.
+
+        :type sitemaps: SitemapIndex
+        :param sitemaps: If given, sites which sitemap shows as unchanged are not downloaded at all.
+
+        :type stats: metrics.CrawlStats
+        :param stats: If given, unchanged sites and sites skipped thanks to sitemaps are counted in it.
+        """
+
+        self.manifest = manifest
+        self.reusable = reusable
+        self.delta = delta
+        self.startTime = startTime
+        self.sitemaps = sitemaps
+        self.stats = stats if stats is not None else CrawlStats()
+        # entries and response headers of changed sites, until they are processed
+        self.changed = {}
+        self.l = threading.Lock()
+
+    def prefetch(self, siteAddress):
+        """
+        Returns tuple (entry, headers) of ManifestEntry stored for site, None if its links and matches cannot be reused,
+        and headers making request conditional on site having changed, None if sitemap shows it has not.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site about to be downloaded.
+        """
+
+        entry = self.manifest.lookup(siteAddress) if self.reusable else None
+        if entry is None:
+            return None, {}
+        if self.sitemaps is not None:
+            modified = self.sitemaps.lastModified(siteAddress)
+            if modified is not None and modified <= entry.fetchedAt:
+                self.stats.count('sitemapSkips')
+                self.stats.count('unchanged')
+                return entry, None
+        return entry, entry.conditionalHeaders()
+
+    def fetched(self, siteAddress, entry, siteHTML, headers):
+        """
+        Returns True if downloaded site has not changed since entry was stored, updating its validators.
+
+        :type siteAddress: string
+        :param siteAddress: Address of downloaded site.
+
+        :type entry: ManifestEntry
+        :param entry: Entry returned by prefetch.
+
+        :type siteHTML: string
+        :param siteHTML: HTML document of site, None if server responded 304 Not Modified.
+
+        :type headers: dict
+        :param headers: Response headers with lowercase names.
+        """
+
+        if entry is not None and (siteHTML is None or contentHash(siteHTML) == entry.hash):
+            if siteHTML is not None:
+                entry.etag, entry.lastModified = headers.get('etag'), headers.get('last-modified')
+            entry.fetchedAt = time.time()
+            self.stats.count('unchanged')
+            return True
+        with self.l:
+            self.changed[siteAddress] = (entry, headers)
+        return False
+
+    def failed(self, siteAddress, entry, status):
+        """
+        Returns True if site which could not be downloaded should keep its stored links and matches.
+
+        Site which could not be checked keeps them, so neither it nor sites found through it are reported as removed,
+        unless server responded that it is gone.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type entry: ManifestEntry
+        :param entry: Entry returned by prefetch.
+
+        :type status: int
+        :param status: HTTP status of response, None if no response was received.
+        """
+
+        return entry is not None and status not in GONE_STATUSES
+
+    def reused(self, siteAddress, dist, entry):
+        """
+        Stores site which has not changed or could not be checked, with its previous links and matches.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type dist: int
+        :param dist: Distance of site from start site.
+
+        :type entry: ManifestEntry
+        :param entry: Entry returned by prefetch.
+        """
+
+        entry.dist = dist
+        self.manifest.store(entry, self.startTime)
+
+    def processed(self, siteAddress, dist, siteHTML, links, matches):
+        """
+        Stores new or changed site and records how its matches differ from the stored ones.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type dist: int
+        :param dist: Distance of site from start site.
+
+        :type siteHTML: string
+        :param siteHTML: HTML document of site.
+
+        :type links: list
+        :param links: Canonical addresses of sites linked from the site, including ones not followed.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+        """
+
+        with self.l:
+            entry, headers = self.changed.pop(siteAddress, (None, {}))
+        matches = list(matches)
+        self.manifest.store(ManifestEntry(siteAddress, dist, contentHash(siteHTML), headers.get('etag'), headers.get('last-modified'),
+                                          time.time(), links, matches), self.startTime)
+        self.delta.record(siteAddress, entry.matches if entry is not None else [], matches)
+
+def recrawl(startPage, maxDepth, aAttrsFilter, action, manifest, sitemaps=True, **kwargs):
+    """
+    Crawls with crawling.crawl, but action is performed only on sites which changed since previous crawl stored in manifest.
+    Returns tuple (result, delta) of crawling.CrawlResult containing results of all visited sites
+    and ResultDelta describing how they differ from results of previous crawl.
+
+    Site is taken as unchanged, and its links and matches stored in manifest are reused, if its sitemap shows
+    it was not modified since it was stored, if server responds 304 Not Modified to request with stored
+    ETag and Last-Modified, or if hash of its HTML is the same. Stored links and matches are reused only
+    if previous crawl searched for the same thing with the same link filter. Sites visited by previous crawl
+    and not found now are reported as removed, unless crawl is truncated. The first crawl with empty manifest
+    visits all sites and stores them.
+
+    Only downloaded bodies are charged to budget of crawl, sites not modified are not.
+
+    :type startPage: string
+    :param startPage: Address of site from which crawl begins.
+
+    :type maxDepth: int
+    :param maxDepth: The biggest distance from start site crawler can reach.
+
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+    :type action: function
+    :param action: Action returned by one of search functions of crawling module.
+
+    :type manifest: SiteManifest
+    :param manifest: Sites stored by previous crawl, updated with sites visited by this one.
+
+    :type sitemaps: bool
+    :param sitemaps: Flag specifying whether sitemaps of hosts should be read to skip unchanged sites without request.
+
+    :type kwargs: dict
+    :param kwargs: Other arguments passed to crawl, e.g. downloadThreads, fetcher or cache. Checkpoints are not supported,
+                   nor are frontiers ordering sites by hints (e.g. priority.bestFirstFrontier), both are rejected with ValueError.
+    """
+
+    if 'checkpointPath' in kwargs or 'resume' in kwargs:
+        # sites visited before crawl was interrupted would be pruned from manifest as not seen by resumed one
+        raise ValueError('Incremental crawl cannot be checkpointed')
+    if kwargs.get('stats') is None:
+        kwargs['stats'] = CrawlStats()
+    delta = ResultDelta()
+    startTime = time.time()
+    reusable = manifest.begin(startPage, maxDepth, crawlSettings(aAttrsFilter, action), startTime)
+    hooks = ManifestHooks(manifest, reusable, delta, startTime, SitemapIndex() if sitemaps else None, kwargs['stats'])
+    result = crawl(startPage, maxDepth, aAttrsFilter, action, hooks=hooks, **kwargs)
+    if not result.truncated:
+        # sites not visited at all are known to be gone only if crawl visited everything it could
+        for siteAddress, matches in manifest.prune(startTime):
+            delta.record(siteAddress, matches, [])
+    manifest.end(result.endTime, result.truncated)
+    return result, delta
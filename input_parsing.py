@@ -0,0 +1,53 @@
+import re
+
+def comaSepToList(s: str):
+    """
+    Returns [] if s is empty or list of strings which were originally separated by commas in s.
+
+    :type s: string
+    :param s: String to process.
+    """
+
+    if s == '':
+        return []
+    return s.split(',')
+
+def parseAttrSpec(text):
+    """
+    Creates dictionary from text in this way:
+
+    href:foo,bar
+    id:foo
+
+    will be converted to
+
+    {
+        'href': ['foo', 'bar'],
+        'id': ['foo']
+    }
+    
+    :type text: string
+    :param text: Text to process.
+    """
+
+    hyplnAttrSpec = {}
+    for line in text.split(sep='\n'):
+        if re.match(r'[a-zA-Z0-9\-\_]+:([a-zA-Z0-9\-\_ ]+)(,([a-zA-Z0-9\-\_ ]+))*', line):
+            attr, valString = line.split(sep=':')
+            hyplnAttrSpec[attr] = comaSepToList(valString)
+    if hyplnAttrSpec == {}:
+        hyplnAttrSpec = None
+    return hyplnAttrSpec
+
+def parseStartSiteAddress(address):
+    """
+    Adds '/' to the end of address if there isn't already.
+
+    :type address: string
+    :param address: Url string.
+    """
+    if len(address) == 0:
+        return address
+    if address[len(address)-1] != '/':
+        address += '/'
+    return address
@@ -0,0 +1,267 @@
+import itertools
+import json
+import re
+import sqlite3
+import threading
+
+from matching import collectMatches
+
+WORD_REGEX = re.compile(r'\w+')
+
+def extractTexts(parsedSite, tags):
+    """
+    Returns list of tuples (tag, inBody, text, terms) for tags with specified names, where terms maps
+    lowercase words of the text to lists of their positions. Meant to be run in processing workers.
+
+    :type parsedSite: parsing.ParsedSite
+    :param parsedSite: Parsed HTML document.
+
+    :type tags: list
+    :param tags: Names of tags which texts should be indexed.
+    """
+
+    inBody = set(map(id, parsedSite.findAll(tags, bodyOnly=True)))
+    extracted = []
+    for tag in parsedSite.findAll(tags):
+        text = tag.text
+        terms = {}
+        for match in WORD_REGEX.finditer(text):
+            terms.setdefault(match.group().lower(), []).append(match.start())
+        extracted.append((tag.name, id(tag) in inBody, text, terms))
+    return extracted
+
+class InvertedIndex:
+    """
+    On-disk index mapping words to sites, tags and positions at which they appear.
+
+    Texts of indexed tags are stored too, so search actions can be answered from the index
+    without downloading or parsing sites again. Word searches are answered from stored positions
+    and other searches are performed only on texts containing the searched words.
+    """
+    def __init__(self, path, tags=None, commitEvery=256):
+        """
+        Creates InvertedIndex object.
+
+        :type path: string
+        :param path: Path of sqlite database file.
+
+        :type tags: list
+        :param tags: Names of tags which texts are indexed. Required when index is created, taken from the file otherwise.
+
+        :type commitEvery: int
+        :param commitEvery: Number of indexed sites after which they are committed to the file.
+        """
+
+        self.path = path
+        self.commitEvery = commitEvery
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS info (id INTEGER PRIMARY KEY CHECK (id = 0), startAddress TEXT, maxDepth INTEGER, tags TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY, site TEXT UNIQUE)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, siteId INTEGER, tag TEXT, inBody INTEGER, text TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS postings (term TEXT, textId INTEGER, positions TEXT, PRIMARY KEY (term, textId)) WITHOUT ROWID')
+        row = self.db.execute('SELECT tags FROM info').fetchone()
+        if row is not None:
+            self.tags = json.loads(row[0])
+        elif tags is None:
+            raise ValueError('Tags to index have to be given when index is created')
+        else:
+            self.tags = list(tags)
+            self.db.execute('INSERT INTO info VALUES (0, NULL, NULL, ?)', (json.dumps(self.tags),))
+        self.db.commit()
+
+    def begin(self, startAddress, maxDepth, append=False):
+        """
+        Writes description of indexed crawl, removing sites indexed by previous crawl unless append is set.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl began.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type append: bool
+        :param append: Flag specifying whether sites should be added to those indexed by interrupted crawl.
+        """
+
+        with self.lock:
+            if not append:
+                self.db.execute('DELETE FROM postings')
+                self.db.execute('DELETE FROM texts')
+                self.db.execute('DELETE FROM sites')
+            self.db.execute('UPDATE info SET startAddress = ?, maxDepth = ?', (startAddress, maxDepth))
+            self.db.commit()
+            self.uncommitted = 0
+
+    def info(self):
+        """
+        Returns dictionary describing indexed crawl.
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT startAddress, maxDepth, tags FROM info').fetchone()
+        return {"startAddress": row[0], "maxDepth": row[1], "tags": json.loads(row[2])}
+
+    def add(self, siteAddress, extracted):
+        """
+        Adds texts of site to the index. Sites indexed before are skipped.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type extracted: list
+        :param extracted: Texts of site returned by extractTexts.
+        """
+
+        with self.lock:
+            if self.db.execute('SELECT 1 FROM sites WHERE site = ?', (siteAddress,)).fetchone() is not None:
+                return
+            siteId = self.db.execute('INSERT INTO sites (site) VALUES (?)', (siteAddress,)).lastrowid
+            for tag, inBody, text, terms in extracted:
+                textId = self.db.execute('INSERT INTO texts (siteId, tag, inBody, text) VALUES (?, ?, ?, ?)',
+                                         (siteId, tag, int(inBody), text)).lastrowid
+                self.db.executemany('INSERT INTO postings VALUES (?, ?, ?)',
+                                    ((term, textId, ','.join(map(str, positions))) for term, positions in terms.items()))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commitEvery:
+                self.db.commit()
+                self.uncommitted = 0
+
+    def addSite(self, siteAddress, parsedSite):
+        """
+        Extracts texts of indexed tags from parsed site and adds them to the index.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type parsedSite: parsing.ParsedSite
+        :param parsedSite: Parsed HTML document of site.
+        """
+
+        self.add(siteAddress, extractTexts(parsedSite, self.tags))
+
+    def flush(self):
+        """
+        Commits indexed sites to the file.
+        """
+
+        with self.lock:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def postings(self, word):
+        """
+        Returns list of tuples (siteAddress, tag, position) at which word appears, ignoring case.
+
+        :type word: string
+        :param word: Word consisting only of word characters.
+        """
+
+        with self.lock:
+            rows = self.db.execute('SELECT s.site, t.tag, p.positions FROM postings p JOIN texts t ON t.id = p.textId '
+                                   'JOIN sites s ON s.id = t.siteId WHERE p.term = ? ORDER BY t.id', (word.lower(),)).fetchall()
+        return [(site, tag, int(position)) for site, tag, positions in rows for position in positions.split(',')]
+
+    def candidateTexts(self, words, tags, bodyOnly):
+        """
+        Returns list of tuples (siteAddress, text, positions) in document order for texts of specified tags
+        containing all words of any of the phrases in words, where positions are those of the words.
+
+        :type words: list
+        :param words: Searched words or phrases. If None, all texts of specified tags are returned.
+
+        :type tags: list
+        :param tags: Names of tags which texts should be returned.
+
+        :type bodyOnly: bool
+        :param bodyOnly: Flag specifying whether only tags inside of <body> should be returned.
+        """
+
+        missing = [tag for tag in tags if tag not in self.tags]
+        if missing:
+            raise ValueError('Tags not indexed: ' + ', '.join(missing))
+        phrases = None
+        if words is not None:
+            phrases = [set(term.lower() for term in WORD_REGEX.findall(word)) for word in words]
+            if not all(phrases):
+                # phrase without any word characters cannot be looked up
+                phrases = None
+        tagsSQL = 't.tag IN (%s)' % ','.join('?' * len(tags)) + (' AND t.inBody = 1' if bodyOnly else '')
+        texts = {}
+        with self.lock:
+            if phrases is None:
+                for textId, site, text in self.db.execute('SELECT t.id, s.site, t.text FROM texts t JOIN sites s ON s.id = t.siteId '
+                                                          'WHERE ' + tagsSQL, tags):
+                    texts[textId] = (site, text, [])
+                return [texts[textId] for textId in sorted(texts)]
+            query = ('SELECT t.id, s.site, t.text, p.positions FROM postings p JOIN texts t ON t.id = p.textId '
+                     'JOIN sites s ON s.id = t.siteId WHERE p.term = ? AND ' + tagsSQL)
+            for terms in phrases:
+                matching = None
+                for term in terms:
+                    found = {textId: (site, text, positions) for textId, site, text, positions in self.db.execute(query, [term] + list(tags))}
+                    if matching is None:
+                        matching = found
+                    else:
+                        matching = {textId: matching[textId][:2] + (matching[textId][2] + ',' + found[textId][2],)
+                                    for textId in matching if textId in found}
+                for textId, (site, text, positions) in matching.items():
+                    if textId not in texts:
+                        texts[textId] = (site, text, [])
+                    texts[textId][2].extend(int(position) for position in positions.split(','))
+        return [texts[textId] for textId in sorted(texts)]
+
+    def search(self, action):
+        """
+        Performs search action on indexed texts and returns list of tuples (siteAddress, matches) in order of indexing.
+
+        :type action: crawling.SentenceSearch, crawling.WordSearch or crawling.PatternSearch
+        :param action: Search action, as returned by one of search functions of crawling module.
+        """
+
+        spec = action.spec()
+        words = None
+        if spec["type"] in ("words", "sentences"):
+            words = [spec["word"]] if isinstance(spec["word"], str) else list(spec["word"])
+        candidates = self.candidateTexts(words, spec["tagsListToSearch"], spec["type"] == "sentences")
+        fromPositions = spec["type"] == "words" and spec["engine"] == "keywords" and all(WORD_REGEX.fullmatch(word) for word in words)
+        wanted = set(words) if fromPositions and spec["caseSensitive"] else None
+
+        results = []
+        # texts of a site are stored one after another, so they are adjacent in candidates
+        for site, siteTexts in itertools.groupby(candidates, key=lambda candidate: candidate[0]):
+            if fromPositions:
+                # every word is a single term, so matches are read at stored positions without searching texts
+                found = {}
+                for _, text, positions in siteTexts:
+                    for position in sorted(positions):
+                        token = WORD_REGEX.match(text, position).group()
+                        if wanted is None or token in wanted:
+                            found[token] = None
+                            if spec["maxMatches"] is not None and len(found) >= spec["maxMatches"]:
+                                break
+                    else:
+                        continue
+                    break
+                matches = list(found)
+            else:
+                matches = collectMatches(action.matcher, (text for _, text, _ in siteTexts), spec["maxMatches"])
+            if matches:
+                results.append((site, matches))
+        return results
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM sites').fetchone()[0]
+
+    def close(self):
+        """
+        Commits indexed sites and closes the file.
+        """
+
+        with self.lock:
+            self.db.commit()
+            self.db.close()
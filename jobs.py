@@ -0,0 +1,325 @@
+import concurrent.futures
+import json
+import os
+import time
+
+from corpus import CorpusStore
+from crawling import crawl, resumeCrawl, CrawlBudget, searchForSentencesContainingWord, searchForWord, searchForPattern
+from fetching import AsyncFetcher
+from input_parsing import comaSepToList, parseAttrSpec
+from distributed import crawlDistributed
+from incremental import SiteManifest, recrawl
+from inverted_index import InvertedIndex
+from priority import bestFirstFrontier
+from result_files import JSONLinesSink
+
+# search factories by name used in job files
+SEARCHES = {
+    "sentences": searchForSentencesContainingWord,
+    "words": searchForWord,
+    "pattern": searchForPattern
+}
+
+class CrawlJob:
+    """
+    Single crawl to run without GUI: where it starts, what it searches for, where its results go and how much it may cost.
+    """
+    def __init__(self, startAddress, maxDepth, search, query, tags, caseSensitive=False, aAttrsFilter=None, output=None,
+                 maxPages=None, maxBytes=None, timeLimit=None, metrics=None, bestFirst=False, manifest=None, delta=None,
+                 checkpoint=None, corpus=None, index=None, indexTags=None):
+        """
+        Creates CrawlJob object.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl begins.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach, -1 means no limit.
+
+        :type search: string
+        :param search: Name of search to perform, one of keys of SEARCHES.
+
+        :type query: string
+        :param query: Word, list of words or pattern to search for.
+
+        :type tags: list
+        :param tags: List of tags inside of which searching should be performed.
+
+        :type caseSensitive: bool
+        :param caseSensitive: Flag specifying whether capital and lowercase letters should be treated as different.
+
+        :type aAttrsFilter: dict
+        :param aAttrsFilter: Contains allowed attribute values of <a> tags followed by crawler.
+
+        :type output: string
+        :param output: If given, results are written to this JSON Lines file as soon as they are found.
+
+        :type maxPages: int
+        :param maxPages: The biggest number of sites downloaded, None means no limit.
+
+        :type maxBytes: int
+        :param maxBytes: Number of characters of HTML after downloading which crawl stops, None means no limit.
+
+        :type timeLimit: float
+        :param timeLimit: Time in seconds after which crawl is stopped, None means no limit.
+
+        :type metrics: string
+        :param metrics: If given, statistics of crawl are periodically written to this file in Prometheus text format.
+
+        :type bestFirst: bool
+        :param bestFirst: Flag specifying whether sites most likely to contain searched texts should be downloaded first,
+                          see priority.bestFirstFrontier. Useful together with maxPages or timeLimit.
+
+        :type manifest: string
+        :param manifest: If given, sites are stored in this incremental.SiteManifest file and only sites
+                         changed since the previous run of the job are searched again, see incremental.recrawl.
+
+        :type delta: string
+        :param delta: If given together with manifest, differences from results of the previous run are written to this JSON file.
+
+        :type checkpoint: string
+        :param checkpoint: If given, crawl periodically saves its state to this file and, if it is stopped before
+                           visiting all sites, keeps the file, so the next run of the job continues it (see crawling.resumeCrawl).
+
+        :type corpus: string
+        :param corpus: If given, downloaded sites are stored in this corpus.CorpusStore file,
+                       so other searches can be run on them later without downloading them again (see crawling.searchCorpus).
+
+        :type index: string
+        :param index: If given, texts of visited sites are indexed in this inverted_index.InvertedIndex file,
+                      so other searches can be answered from it later (see crawling.searchIndex).
+
+        :type indexTags: list
+        :param indexTags: Names of tags which texts are indexed. Defaults to tags. Used only when index file is created.
+        """
+
+        if search not in SEARCHES:
+            raise ValueError('Unknown search: ' + str(search))
+        self.startAddress = startAddress
+        self.maxDepth = maxDepth
+        self.search = search
+        self.query = query
+        self.tags = tags
+        self.caseSensitive = caseSensitive
+        self.aAttrsFilter = aAttrsFilter
+        self.output = output
+        self.maxPages = maxPages
+        self.maxBytes = maxBytes
+        self.timeLimit = timeLimit
+        self.metrics = metrics
+        self.bestFirst = bestFirst
+        self.manifest = manifest
+        self.delta = delta
+        self.checkpoint = checkpoint
+        self.corpus = corpus
+        self.index = index
+        self.indexTags = indexTags if indexTags is not None else tags
+
+    @classmethod
+    def fromJSON(cls, fJSON, defaults=None):
+        """
+        Creates CrawlJob object from JSON object, taking missing fields from defaults.
+
+        Fields are named like parameters of constructor, except "start" (startAddress) and "depth" (maxDepth).
+        Tags may be given as a list or as comma separated string and aAttrsFilter as a dictionary
+        or as text in format accepted by input_parsing.parseAttrSpec.
+
+        :type fJSON: dict
+        :param fJSON: JSON object describing job.
+
+        :type defaults: dict
+        :param defaults: JSON object with fields shared by all jobs.
+        """
+
+        fields = dict(defaults or {})
+        fields.update(fJSON)
+        tags = fields.get("tags", [])
+        if isinstance(tags, str):
+            tags = comaSepToList(tags)
+        indexTags = fields.get("indexTags")
+        if isinstance(indexTags, str):
+            indexTags = comaSepToList(indexTags)
+        aAttrsFilter = fields.get("aAttrsFilter")
+        if isinstance(aAttrsFilter, str):
+            aAttrsFilter = parseAttrSpec(aAttrsFilter)
+        return cls(fields["start"], fields.get("depth", 1), fields.get("search", "words"), fields["query"], tags,
+                   fields.get("caseSensitive", False), aAttrsFilter, fields.get("output"),
+                   fields.get("maxPages"), fields.get("maxBytes"), fields.get("timeLimit"), fields.get("metrics"),
+                   fields.get("bestFirst", False), fields.get("manifest"), fields.get("delta"),
+                   fields.get("checkpoint"), fields.get("corpus"), fields.get("index"), indexTags)
+
+    def action(self):
+        """
+        Returns action performing job's search, as returned by search functions of crawling module.
+        """
+
+        return SEARCHES[self.search](self.query, self.caseSensitive, self.tags)
+
+    def budget(self):
+        """
+        Returns crawling.CrawlBudget enforcing job's limits, counting time limit from now.
+        """
+
+        deadline = time.time() + self.timeLimit if self.timeLimit is not None else None
+        return CrawlBudget(deadline, self.maxPages, self.maxBytes)
+
+def loadJobs(path):
+    """
+    Returns list of CrawlJob objects read from JSON job file.
+
+    File contains either list of jobs or object with list of jobs under "jobs"
+    and, optionally, fields shared by all of them under "defaults", e.g.
+
+    {
+        "defaults": {"depth": 2, "search": "words", "tags": "p,h1"},
+        "jobs": [
+            {"start": "https://example.com/", "query": "foo", "output": "foo.jsonl"},
+            {"start": "https://example.org/", "query": ["bar", "baz"], "maxPages": 100}
+        ]
+    }
+
+    :type path: string
+    :param path: Path of job file.
+    """
+
+    with open(path, 'r') as f:
+        fJSON = json.load(f)
+    if isinstance(fJSON, list):
+        fJSON = {"jobs": fJSON}
+    return [CrawlJob.fromJSON(job, fJSON.get("defaults")) for job in fJSON["jobs"]]
+
+def runJob(job, budget=None, useAsync=False, serve=None, authkey=None, **kwargs):
+    """
+    Runs single job and returns crawling.CrawlResult object.
+
+    :type job: CrawlJob
+    :param job: Job to run.
+
+    :type budget: crawling.CrawlBudget
+    :param budget: Budget of crawl, by default one enforcing job's limits.
+
+    :type useAsync: bool
+    :param useAsync: Flag specifying whether sites should be downloaded with fetching.AsyncFetcher. Rejected for jobs with manifest.
+
+    :type serve: tuple
+    :param serve: If given, job is crawled by workers connecting to this address, see distributed.crawlDistributed.
+
+    :type authkey: bytes
+    :param authkey: Secret shared with workers, required together with serve.
+
+    :type kwargs: dict
+    :param kwargs: Other arguments passed to crawl, e.g. cache or processes. Jobs with manifest accept only stats and metricsInterval.
+    """
+
+    if budget is None:
+        budget = job.budget()
+    action = job.action()
+    if job.checkpoint is not None and (job.manifest is not None or serve is not None):
+        raise ValueError('Incremental and distributed crawls cannot be checkpointed')
+    if (job.corpus is not None or job.index is not None) and (job.manifest is not None or serve is not None):
+        raise ValueError('Incremental and distributed crawls cannot store corpus or index')
+    if job.manifest is not None:
+        if serve is not None or job.bestFirst:
+            raise ValueError('Incremental crawl cannot be distributed or best-first')
+        # only statistics are passed on to recrawl, other options would be silently ignored
+        unsupported = sorted(name for name, value in kwargs.items() if value is not None and name not in ('stats', 'metricsInterval'))
+        if useAsync:
+            unsupported.insert(0, 'useAsync')
+        if unsupported:
+            raise ValueError('Incremental crawl does not support ' + ', '.join(unsupported))
+        return runIncrementalJob(job, action, budget, kwargs.get('stats'), kwargs.get('metricsInterval', 10))
+    if serve is not None:
+        if job.bestFirst:
+            raise ValueError('Best-first order is not supported in distributed crawl')
+        sink = JSONLinesSink(job.output) if job.output is not None else None
+        return crawlDistributed(job.startAddress, job.maxDepth, job.aAttrsFilter, action, serve, authkey, sink=sink, budget=budget,
+                                stats=kwargs.get('stats'), metricsPath=job.metrics, metricsInterval=kwargs.get('metricsInterval', 10))
+    if useAsync:
+        # connections of AsyncFetcher belong to the event loop of single crawl, so every job gets its own fetcher
+        kwargs['fetcher'] = AsyncFetcher()
+    if job.bestFirst:
+        kwargs['frontier'] = bestFirstFrontier(action, job.maxDepth)
+    if job.corpus is not None:
+        kwargs['corpus'] = CorpusStore(job.corpus)
+    if job.index is not None:
+        kwargs['index'] = InvertedIndex(job.index, job.indexTags)
+    try:
+        if job.checkpoint is not None and os.path.exists(job.checkpoint):
+            # previous run was stopped, its results and output file are kept
+            return resumeCrawl(job.checkpoint, action, budget=budget, metricsPath=job.metrics, **kwargs)
+        sink = JSONLinesSink(job.output) if job.output is not None else None
+        return crawl(job.startAddress, job.maxDepth, job.aAttrsFilter, action, sink=sink, budget=budget, metricsPath=job.metrics,
+                     checkpointPath=job.checkpoint, **kwargs)
+    finally:
+        if job.corpus is not None:
+            kwargs['corpus'].close()
+        if job.index is not None:
+            kwargs['index'].close()
+
+def runIncrementalJob(job, action, budget, stats=None, metricsInterval=10):
+    """
+    Runs job with manifest, searching only sites changed since its previous run, and returns crawling.CrawlResult object.
+
+    :type job: CrawlJob
+    :param job: Job to run.
+
+    :type action: function
+    :param action: Action performing job's search.
+
+    :type budget: crawling.CrawlBudget
+    :param budget: Budget of crawl.
+
+    :type stats: metrics.CrawlStats
+    :param stats: Statistics of the crawl.
+
+    :type metricsInterval: float
+    :param metricsInterval: Time in seconds between writing statistics.
+    """
+
+    manifest = SiteManifest(job.manifest)
+    try:
+        sink = JSONLinesSink(job.output) if job.output is not None else None
+        result, delta = recrawl(job.startAddress, job.maxDepth, job.aAttrsFilter, action, manifest, sink=sink, budget=budget,
+                                stats=stats, metricsPath=job.metrics, metricsInterval=metricsInterval)
+    finally:
+        manifest.close()
+    if job.delta is not None:
+        delta.save(job.delta)
+    return result
+
+def runJobs(jobs, concurrentJobs=4, budgets=None, onFinished=None, **kwargs):
+    """
+    Runs jobs concurrently and returns list of tuples (job, result, error) in the order of jobs,
+    where result is crawling.CrawlResult object or None if job failed with error.
+
+    :type jobs: list
+    :param jobs: List of CrawlJob objects.
+
+    :type concurrentJobs: int
+    :param concurrentJobs: The biggest number of jobs run at once.
+
+    :type budgets: list
+    :param budgets: Budgets of jobs, by default ones enforcing their limits. Can be used to cancel jobs.
+
+    :type onFinished: function
+    :param onFinished: If given, it is called with job, result and error as soon as job ends. It is called from worker threads.
+
+    :type kwargs: dict
+    :param kwargs: Other arguments passed to runJob, shared by all jobs, e.g. cache (caching.PageCache) or useAsync.
+    """
+
+    if budgets is None:
+        budgets = [None] * len(jobs)
+
+    def aux(job, budget):
+        try:
+            result, error = runJob(job, budget, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+        if onFinished is not None:
+            onFinished(job, result, error)
+        return job, result, error
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrentJobs)) as executor:
+        futures = [executor.submit(aux, job, budget) for job, budget in zip(jobs, budgets)]
+        return [future.result() for future in futures]
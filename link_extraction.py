@@ -0,0 +1,143 @@
+import lxml.etree
+
+from frontier import resolveLink, resolveLinks
+
+# attributes of <a> tags holding space separated lists of values, matched by any of their values like in BeautifulSoup
+MULTI_VALUED_ATTRS = frozenset(('class', 'rel', 'rev', 'accesskey', 'dropzone'))
+
+class LinkCollector:
+    """
+    Target of lxml's event-based HTML parser collecting href values of <a> tags and of the first <base> tag.
+
+    Only start tag events are handled, so no tree is built and no text is copied into Python.
+    """
+    def __init__(self, aAttrsFilter=None):
+        """
+        Creates LinkCollector object.
+
+        :type aAttrsFilter: dict
+        :param aAttrsFilter: Contains allowed attribute values of <a> tags, as returned by input_parsing.parseAttrSpec.
+        """
+
+        self.aAttrsFilter = {attr: frozenset(values) for attr, values in aAttrsFilter.items()} if aAttrsFilter else None
+        self.links = []
+        self.base = None
+
+    def start(self, tag, attrib):
+        if tag == 'a':
+            link = attrib.get('href')
+            if link is not None and (self.aAttrsFilter is None or self.accepts(attrib)):
+                self.links.append(link)
+        elif tag == 'base' and self.base is None:
+            self.base = attrib.get('href')
+
+    def accepts(self, attrib):
+        """
+        Returns True if attributes of <a> tag have one of allowed values for each of filtered attributes.
+
+        :type attrib: dict
+        :param attrib: Attributes of the tag.
+        """
+
+        for attr, allowed in self.aAttrsFilter.items():
+            value = attrib.get(attr)
+            if value is None:
+                return False
+            if value not in allowed and not (attr in MULTI_VALUED_ATTRS and not allowed.isdisjoint(value.split())):
+                return False
+        return True
+
+    def close(self):
+        return self.links
+
+class AnchorTextCollector(LinkCollector):
+    """
+    LinkCollector collecting also texts of <a> tags, as tuples (href, text).
+
+    Text events are handled only inside of collected <a> tags, but they make parsing slower,
+    so it is used only when texts are needed.
+    """
+    def __init__(self, aAttrsFilter=None):
+        """
+        Creates AnchorTextCollector object.
+
+        :type aAttrsFilter: dict
+        :param aAttrsFilter: Contains allowed attribute values of <a> tags, as returned by input_parsing.parseAttrSpec.
+        """
+
+        super().__init__(aAttrsFilter)
+        self.href = None
+        self.text = None
+
+    def start(self, tag, attrib):
+        if tag == 'a':
+            # <a> tags cannot be nested, so unclosed one ends where the next one starts
+            self.finishLink()
+            link = attrib.get('href')
+            if link is not None and (self.aAttrsFilter is None or self.accepts(attrib)):
+                self.href = link
+                self.text = []
+        elif tag == 'base' and self.base is None:
+            self.base = attrib.get('href')
+
+    def data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+    def end(self, tag):
+        if tag == 'a':
+            self.finishLink()
+
+    def finishLink(self):
+        """
+        Adds tuple (href, text) of <a> tag whose text is being collected.
+        """
+
+        if self.text is not None:
+            self.links.append((self.href, ' '.join(''.join(self.text).split())))
+            self.text = None
+
+    def close(self):
+        self.finishLink()
+        return self.links
+
+def extractLinks(siteHTML, siteAddress, aAttrsFilter=None, anchorTexts=False):
+    """
+    Returns list of canonical addresses of sites linked from HTML document, without repetitions.
+
+    Document is tokenized by lxml without building a tree, and links are resolved
+    against address given in its <base> tag, if there is one, or siteAddress otherwise.
+    If anchorTexts is set, tuples (address, text) are returned instead, where text joins texts of all links to the address.
+
+    :type siteHTML: string
+    :param siteHTML: HTML document.
+
+    :type siteAddress: string
+    :param siteAddress: Address of the document.
+
+    :type aAttrsFilter: dict
+    :param aAttrsFilter: Contains allowed attribute values of <a> tags.
+
+    :type anchorTexts: bool
+    :param anchorTexts: Flag specifying whether texts of links should be returned too.
+    """
+
+    collector = AnchorTextCollector(aAttrsFilter) if anchorTexts else LinkCollector(aAttrsFilter)
+    parser = lxml.etree.HTMLParser(target=collector)
+    parser.feed(siteHTML)
+    links = parser.close()
+    baseAddress = siteAddress
+    if collector.base is not None and collector.base.strip() != '':
+        baseAddress = resolveLinks(siteAddress, [collector.base])
+        baseAddress = baseAddress[0] if baseAddress else siteAddress
+    if not anchorTexts:
+        return resolveLinks(baseAddress, links)
+    resolved = {}
+    texts = {}
+    for link, text in links:
+        if link not in resolved:
+            resolved[link] = resolveLink(baseAddress, link)
+        fullLink = resolved[link]
+        if fullLink is not None:
+            texts[fullLink] = texts[fullLink] + ' ' + text if texts.get(fullLink) else text
+    return list(texts.items())
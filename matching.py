@@ -0,0 +1,167 @@
+import re
+import heapq
+
+SENTENCE_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789, \'')
+
+class RegexMatcher:
+    """
+    Finds texts matching regular expression compiled once.
+    """
+    def __init__(self, pattern, caseSensitive):
+        """
+        Creates RegexMatcher object.
+
+        :type pattern: string
+        :param pattern: Regular expression.
+
+        :type caseSensitive: bool
+        :param caseSensitive: Flag specifying whether capital and lowercase letters should be treated as the same.
+        """
+
+        self.regEx = re.compile(pattern) if caseSensitive else re.compile(pattern, re.IGNORECASE)
+
+    def finditer(self, text):
+        """
+        Yields tuples (position, match) for all matches in text.
+
+        :type text: string
+        :param text: Text to search.
+        """
+
+        for match in self.regEx.finditer(text):
+            yield match.start(), match.group()
+
+class KeywordMatcher:
+    """
+    Finds any of given words in single pass over text.
+
+    Words consisting only of word characters are found by splitting text into
+    words and looking each of them up in a hash set, so the cost does not grow
+    with the number of searched words. Other words (e.g. containing spaces)
+    are searched for with regular expression.
+    """
+    def __init__(self, words, caseSensitive):
+        """
+        Creates KeywordMatcher object.
+
+        :type words: list
+        :param words: Words to search for.
+
+        :type caseSensitive: bool
+        :param caseSensitive: Flag specifying whether capital and lowercase letters should be treated as the same.
+        """
+
+        self.caseSensitive = caseSensitive
+        plainWords = [word for word in words if re.fullmatch(r'\w+', word)]
+        otherWords = [word for word in words if not re.fullmatch(r'\w+', word)]
+        self.plainWords = frozenset(plainWords if caseSensitive else [word.lower() for word in plainWords])
+        self.otherWords = None
+        if otherWords:
+            # the longest words go first, so that alternative does not stop at a shorter prefix
+            otherWords.sort(key=len, reverse=True)
+            self.otherWords = RegexMatcher(r'\b(?:' + '|'.join(re.escape(word) for word in otherWords) + r')\b', caseSensitive)
+
+    def findPlain(self, text):
+        """
+        Yields tuples (position, match) for words consisting only of word characters.
+
+        :type text: string
+        :param text: Text to search.
+        """
+
+        for match in re.finditer(r'\w+', text):
+            token = match.group()
+            if (token if self.caseSensitive else token.lower()) in self.plainWords:
+                yield match.start(), token
+
+    def finditer(self, text):
+        """
+        Yields tuples (position, match) for all words found in text ordered by position.
+
+        :type text: string
+        :param text: Text to search.
+        """
+
+        if self.otherWords is None:
+            return self.findPlain(text)
+        if not self.plainWords:
+            return self.otherWords.finditer(text)
+        return heapq.merge(self.findPlain(text), self.otherWords.finditer(text))
+
+class SentenceMatcher:
+    """
+    Finds sentences containing specified word.
+
+    Sentence is a sequence of letters, digits, spaces, commas and apostrophes
+    ended with '.', '!', '?' or '...'. It starts with capital letter (any letter if search is
+    case insensitive) or with the word itself. Instead of matching one regular
+    expression with nested lazy quantifiers, which backtracks heavily on long texts,
+    sentence boundaries are found around each occurrence of the word, so every
+    character is examined a constant number of times.
+    """
+    def __init__(self, word, caseSensitive):
+        """
+        Creates SentenceMatcher object.
+
+        :type word: string
+        :param word: Word which sentences have to contain.
+
+        :type caseSensitive: bool
+        :param caseSensitive: Flag specifying whether capital and lowercase letters should be treated as the same.
+        """
+
+        flags = 0 if caseSensitive else re.IGNORECASE
+        self.wordRegEx = re.compile(r'\b' + re.escape(word) + r'\b', flags)
+        self.startRegEx = re.compile(r'[A-Z]', flags)
+        self.restRegEx = re.compile(r'[a-zA-Z0-9, \']*', flags)
+        self.endRegEx = re.compile(r'\.\.\.|[\.\!\?]')
+
+    def finditer(self, text):
+        """
+        Yields tuples (position, sentence) for all sentences containing the word.
+
+        :type text: string
+        :param text: Text to search.
+        """
+
+        lastEnd = 0
+        for match in self.wordRegEx.finditer(text):
+            wordStart, wordEnd = match.span()
+            if wordStart < lastEnd:
+                continue
+            restEnd = self.restRegEx.match(text, wordEnd).end()
+            end = self.endRegEx.match(text, restEnd)
+            if end is None:
+                # no later occurrence before restEnd can end a sentence either
+                lastEnd = restEnd
+                continue
+            runStart = wordStart
+            while runStart > lastEnd and text[runStart - 1] in SENTENCE_CHARS:
+                runStart -= 1
+            capital = self.startRegEx.search(text, runStart, wordStart)
+            start = capital.start() if capital else wordStart
+            lastEnd = end.end()
+            yield start, text[start:lastEnd]
+
+def collectMatches(matcher, texts, maxMatches=None):
+    """
+    Returns list of distinct matches found in texts in order of their first appearance.
+
+    :type matcher: RegexMatcher, KeywordMatcher or SentenceMatcher
+    :param matcher: Matcher used to search texts.
+
+    :type texts: iterable
+    :param texts: Texts to search.
+
+    :type maxMatches: int
+    :param maxMatches: If given, searching stops after that many distinct matches have been found.
+    """
+
+    # dict keeps insertion order and makes checking for duplicates O(1)
+    found = {}
+    for text in texts:
+        for _, match in matcher.finditer(text):
+            found[match] = None
+            if maxMatches is not None and len(found) >= maxMatches:
+                return list(found)
+    return list(found)
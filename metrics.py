@@ -0,0 +1,335 @@
+import collections
+import contextlib
+import os
+import random
+import threading
+import time
+
+# stages of crawl pipeline which time is recorded, in order in which site goes through them
+STAGES = ('dns', 'connect', 'ttfb', 'body', 'parse', 'links', 'action')
+
+# quantiles of stage times reported when samples are kept
+QUANTILES = (0.5, 0.9, 0.99)
+
+# counters of crawl with their descriptions
+COUNTERS = {
+    'pages': 'Sites downloaded.',
+    'bytesTransferred': 'Bytes of response bodies received, before decompression.',
+    'bytesDecoded': 'Characters of HTML of downloaded sites.',
+    'cacheHits': 'Sites taken from page cache without request.',
+    'notModified': 'Sites revalidated with 304 response.',
+    'unchanged': 'Sites found unchanged since previous crawl, which were not processed again.',
+    'sitemapSkips': 'Unchanged sites skipped without request because of their sitemap lastmod.',
+    'fetchErrors': 'Sites which could not be downloaded.',
+    'processErrors': 'Sites which could not be processed.'
+}
+
+class CrawlStats:
+    """
+    Thread-safe statistics of crawl: time spent in each of STAGES, COUNTERS, number of active workers
+    and depths of queues, with the biggest values seen.
+
+    Downloading stages are recorded as follows: dns is name lookup, connect is opening connection
+    (with TLS handshake when downloading with fetching.AsyncFetcher), ttfb is time from sending request
+    to receiving response headers (including TLS handshake when downloading with urllib) and body is reading the body.
+    Stages taking no time, e.g. dns and connect for reused connection, are not recorded.
+    """
+    def __init__(self, keepSamples=0):
+        """
+        Creates empty CrawlStats object.
+
+        :type keepSamples: int
+        :param keepSamples: Number of stage times kept for each stage to compute QUANTILES of,
+                            chosen uniformly at random from all recorded ones. 0 means quantiles are not computed.
+        """
+
+        self.lock = threading.Lock()
+        self.stages = {stage: [0, 0.0, 0.0] for stage in STAGES}
+        self.keepSamples = keepSamples
+        self.samples = {stage: [] for stage in STAGES}
+        self.random = random.Random(0)
+        self.counters = collections.Counter({name: 0 for name in COUNTERS})
+        self.active = collections.Counter()
+        self.peakActive = collections.Counter()
+        self.queues = {}
+        self.queueDepths = {}
+        self.peakQueueDepths = collections.Counter()
+        self.startTime = time.time()
+        self.endTime = None
+        self.drained = ({stage: [0, 0.0] for stage in STAGES}, collections.Counter())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # lock and queues watched during crawl cannot be pickled
+        del state['lock']
+        state['queues'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """
+        Adds time spent in stage by single site.
+
+        :type stage: string
+        :param stage: One of STAGES.
+
+        :type seconds: float
+        :param seconds: Time in seconds.
+        """
+
+        with self.lock:
+            entry = self.stages[stage]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            if self.keepSamples > 0:
+                # reservoir sampling, so memory does not grow with number of sites
+                samples = self.samples[stage]
+                if len(samples) < self.keepSamples:
+                    samples.append(seconds)
+                else:
+                    i = self.random.randrange(entry[0])
+                    if i < self.keepSamples:
+                        samples[i] = seconds
+
+    def drain(self):
+        """
+        Returns tuple (stages, counters) of what was recorded since the previous call, to be merged into statistics
+        kept by another process with merge(). Stages map names to lists [count, seconds, max], where max is
+        the longest time recorded so far.
+        """
+
+        with self.lock:
+            drainedStages, drainedCounters = self.drained
+            stages = {}
+            for stage, (count, total, longest) in self.stages.items():
+                previous = drainedStages[stage]
+                if count > previous[0]:
+                    stages[stage] = [count - previous[0], total - previous[1], longest]
+                    drainedStages[stage] = [count, total]
+            counters = {name: n - drainedCounters[name] for name, n in self.counters.items() if n != drainedCounters[name]}
+            drainedCounters.update(counters)
+        return stages, counters
+
+    def merge(self, stages, counters):
+        """
+        Adds statistics returned by drain() of another CrawlStats object.
+
+        :type stages: dict
+        :param stages: Maps names of STAGES to lists [count, seconds, max].
+
+        :type counters: dict
+        :param counters: Maps names of COUNTERS to values to add.
+        """
+
+        with self.lock:
+            for stage, (count, total, longest) in stages.items():
+                entry = self.stages[stage]
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], longest)
+            self.counters.update(counters)
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        """
+        Returns context manager recording time spent inside of it in stage.
+
+        :type stage: string
+        :param stage: One of STAGES.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        """
+        Increases counter.
+
+        :type name: string
+        :param name: One of COUNTERS.
+
+        :type n: int
+        :param n: Value to add.
+        """
+
+        with self.lock:
+            self.counters[name] += n
+
+    def started(self, kind):
+        """
+        Counts worker as active.
+
+        :type kind: string
+        :param kind: Kind of worker, e.g. 'download' or 'process'.
+        """
+
+        with self.lock:
+            self.active[kind] += 1
+            self.peakActive[kind] = max(self.peakActive[kind], self.active[kind])
+
+    def stopped(self, kind):
+        """
+        Counts worker as no longer active.
+
+        :type kind: string
+        :param kind: Kind of worker, e.g. 'download' or 'process'.
+        """
+
+        with self.lock:
+            self.active[kind] -= 1
+
+    @contextlib.contextmanager
+    def working(self, kind):
+        """
+        Returns context manager counting worker inside of it as active.
+
+        :type kind: string
+        :param kind: Kind of worker, e.g. 'download' or 'process'.
+        """
+
+        self.started(kind)
+        try:
+            yield
+        finally:
+            self.stopped(kind)
+
+    def watch(self, name, qsize):
+        """
+        Makes depth of queue be sampled each time statistics are read.
+
+        :type name: string
+        :param name: Name of queue.
+
+        :type qsize: function
+        :param qsize: Function returning number of items in the queue.
+        """
+
+        with self.lock:
+            self.queues[name] = qsize
+
+    def sample(self):
+        """
+        Reads depths of watched queues.
+        """
+
+        with self.lock:
+            queues = list(self.queues.items())
+        depths = {name: qsize() for name, qsize in queues}
+        with self.lock:
+            for name, depth in depths.items():
+                self.queueDepths[name] = depth
+                self.peakQueueDepths[name] = max(self.peakQueueDepths[name], depth)
+
+    def finish(self, endTime=None):
+        """
+        Samples queues for the last time and stops watching them.
+
+        :type endTime: float
+        :param endTime: Time at which crawl ended, now by default.
+        """
+
+        self.sample()
+        with self.lock:
+            self.queues = {}
+            self.endTime = endTime if endTime is not None else time.time()
+
+    def snapshot(self):
+        """
+        Returns dictionary with current statistics, which can be saved as JSON.
+        """
+
+        if self.endTime is None:
+            self.sample()
+        with self.lock:
+            elapsed = (self.endTime if self.endTime is not None else time.time()) - self.startTime
+            return {
+                "elapsed": elapsed,
+                "stages": {stage: dict({"count": count, "seconds": total, "max": longest, "mean": total / count if count else 0.0},
+                                       **quantiles(self.samples[stage]))
+                           for stage, (count, total, longest) in self.stages.items()},
+                "counters": dict(self.counters),
+                "pagesPerSecond": self.counters['pages'] / elapsed if elapsed > 0 else 0.0,
+                "activeWorkers": dict(self.active),
+                "peakActiveWorkers": dict(self.peakActive),
+                "queueDepths": dict(self.queueDepths),
+                "peakQueueDepths": dict(self.peakQueueDepths)
+            }
+
+    def prometheus(self, prefix='crawler'):
+        """
+        Returns statistics in Prometheus text exposition format.
+
+        :type prefix: string
+        :param prefix: Prefix of metric names.
+        """
+
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for labels, value in samples:
+                lines.append('%s_%s%s %r' % (prefix, name, labels, float(value)))
+
+        stages = snapshot["stages"]
+        metric('stage_seconds', 'summary', 'Time spent by sites in pipeline stage.',
+               [('{stage="%s",quantile="%s"}' % (stage, q), stages[stage]['p%g' % (100 * q)]) for stage in STAGES for q in QUANTILES
+                if 'p%g' % (100 * q) in stages[stage]]
+               + [(suffix + '{stage="%s"}' % stage, stages[stage][key]) for stage in STAGES for suffix, key in (('_sum', 'seconds'), ('_count', 'count'))])
+        metric('stage_seconds_max', 'gauge', 'The longest time spent by single site in pipeline stage.',
+               [('{stage="%s"}' % stage, stages[stage]["max"]) for stage in STAGES])
+        for name, description in COUNTERS.items():
+            metric(snakeCase(name) + '_total', 'counter', description, [('', snapshot["counters"].get(name, 0))])
+        metric('active_workers', 'gauge', 'Workers busy downloading or processing sites.',
+               [('{kind="%s"}' % kind, count) for kind, count in sorted(snapshot["activeWorkers"].items())])
+        metric('queue_depth', 'gauge', 'Items waiting in queue.',
+               [('{queue="%s"}' % name, depth) for name, depth in sorted(snapshot["queueDepths"].items())])
+        metric('queue_depth_max', 'gauge', 'The biggest number of items seen waiting in queue.',
+               [('{queue="%s"}' % name, depth) for name, depth in sorted(snapshot["peakQueueDepths"].items())])
+        metric('elapsed_seconds', 'gauge', 'Time since crawl started.', [('', snapshot["elapsed"])])
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Writes statistics in Prometheus text format to file, replacing it atomically,
+        so it can be read by e.g. node exporter textfile collector at any time.
+
+        :type path: string
+        :param path: Path of file to write.
+        """
+
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(tmpPath, path)
+
+def quantiles(samples):
+    """
+    Returns dictionary mapping names like 'p50' of QUANTILES to their values in samples, empty if there are no samples.
+
+    :type samples: list
+    :param samples: Sampled values.
+    """
+
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {'p%g' % (100 * q): ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+def snakeCase(name):
+    """
+    Returns camelCase name converted to snake_case.
+
+    :type name: string
+    :param name: Name to convert.
+    """
+
+    return ''.join('_' + c.lower() if c.isupper() else c for c in name)
@@ -0,0 +1,47 @@
+import bs4
+
+class ParsedSite:
+    """
+    This class stores HTML document parsed once and shared by search actions and inverted index.
+    Links are found without parsing by link_extraction.extractLinks.
+    """
+    def __init__(self, siteHTML):
+        """
+        Creates ParsedSite object.
+
+        :type siteHTML: string
+        :param siteHTML: HTML document to parse.
+        """
+
+        self.html = siteHTML
+        self.soup = bs4.BeautifulSoup(siteHTML, 'lxml')
+
+    def findAll(self, tags, bodyOnly=False):
+        """
+        Returns list of tags with specified names.
+
+        :type tags: list
+        :param tags: Names of tags to find.
+
+        :type bodyOnly: bool
+        :param bodyOnly: Flag specifying whether only tags inside of <body> should be returned.
+        """
+
+        root = self.soup.body if bodyOnly else self.soup
+        if root is None:
+            return []
+        return root.find_all(tags)
+
+    def tagTexts(self, tags, bodyOnly=False):
+        """
+        Yields texts of tags with specified names.
+
+        :type tags: list
+        :param tags: Names of tags which texts should be returned.
+
+        :type bodyOnly: bool
+        :param bodyOnly: Flag specifying whether only tags inside of <body> should be searched.
+        """
+
+        for tag in self.findAll(tags, bodyOnly):
+            yield tag.text
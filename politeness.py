@@ -0,0 +1,274 @@
+import collections
+import heapq
+import itertools
+import queue
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+import urllib.robotparser
+
+class HostState:
+    """
+    This class stores sites queued for single host and how often the host may be contacted.
+    """
+    def __init__(self, name):
+        """
+        Creates HostState object.
+
+        :type name: string
+        :param name: Host name with port, as in URL.
+        """
+
+        self.name = name
+        self.queue = collections.deque()
+        self.active = 0
+        self.nextTime = 0.0
+        self.delay = 0.0
+        self.robotsDelay = 0.0
+        self.robots = 'unknown'
+        self.scheduled = False
+
+class HostQueue(queue.Queue):
+    """
+    Queue of tuples (url, dist) handing out sites so that hosts are crawled politely.
+
+    Sites are queued per host and get() returns site of the host which may be contacted
+    the soonest, so different hosts are interleaved instead of one of them getting all requests.
+    Each host has at most maxConnectionsPerHost sites being downloaded at once and consecutive
+    requests to it are spaced by the biggest of crawlDelay, Crawl-delay from its robots.txt
+    and delay adapted to its responses: it grows on 429 and 503 responses (honouring Retry-After)
+    and with response time, and shrinks back while host responds quickly.
+
+    robots.txt of each new host is read by background threads and sites of the host
+    are not handed out until it has been read, so get() never waits for download of robots.txt.
+
+    Downloaders have to report every site taken with get() by calling fetched().
+    It is meant to be used as urlQueue of frontier.Frontier.
+    """
+    def __init__(self, maxConnectionsPerHost=2, crawlDelay=0.0, robots=True, maxDelay=60.0, maxRetries=3,
+                 targetConcurrency=1.0, userAgent='GUIcrawler', robotsTimeout=10, robotsThreads=4):
+        """
+        Creates HostQueue object.
+
+        :type maxConnectionsPerHost: int
+        :param maxConnectionsPerHost: The biggest number of sites of single host downloaded at once.
+
+        :type crawlDelay: float
+        :param crawlDelay: The smallest time in seconds between requests to single host.
+
+        :type robots: bool
+        :param robots: Flag specifying whether Crawl-delay and Request-rate from robots.txt of each host should be respected.
+
+        :type maxDelay: float
+        :param maxDelay: The biggest delay in seconds set in response to slow or refusing host.
+
+        :type maxRetries: int
+        :param maxRetries: The biggest number of times site refused with 429 or 503 response is queued again.
+
+        :type targetConcurrency: float
+        :param targetConcurrency: Average number of requests per host in flight adaptive delay aims for,
+                                  delay tends to response time divided by it.
+
+        :type userAgent: string
+        :param userAgent: Name of crawler looked up in robots.txt.
+
+        :type robotsTimeout: float
+        :param robotsTimeout: Time in seconds after which downloading robots.txt is abandoned.
+
+        :type robotsThreads: int
+        :param robotsThreads: The biggest number of robots.txt files downloaded at once.
+        """
+
+        self.maxConnectionsPerHost = max(1, maxConnectionsPerHost)
+        self.crawlDelay = crawlDelay
+        self.robots = robots
+        self.maxDelay = maxDelay
+        self.maxRetries = maxRetries
+        self.targetConcurrency = targetConcurrency
+        self.userAgent = userAgent
+        self.robotsTimeout = robotsTimeout
+        self.robotsThreads = max(1, robotsThreads)
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.hosts = {}
+        self.ready = []
+        self.counter = itertools.count()
+        self.stops = collections.deque()
+        self.retries = collections.Counter()
+        self.size = 0
+        self.robotsToRead = collections.deque()
+        self.robotsReaders = 0
+
+    def _qsize(self):
+        return self.size + len(self.stops)
+
+    def _put(self, item):
+        if item is None:
+            self.stops.append(item)
+            return
+        host = self.hostOf(item[0])
+        if host not in self.hosts:
+            self.hosts[host] = HostState(host)
+        state = self.hosts[host]
+        state.queue.append(item)
+        self.size += 1
+        if self.robots and state.robots == 'unknown':
+            # sites of the host wait until its robots.txt is read
+            state.robots = 'loading'
+            self.robotsToRead.append((state, item[0]))
+            if self.robotsReaders < self.robotsThreads:
+                self.robotsReaders += 1
+                threading.Thread(target=self.readQueuedRobots, name='readRobots', daemon=True).start()
+        self.schedule(state)
+
+    def readQueuedRobots(self):
+        """
+        Reads robots.txt of hosts waiting for it and schedules their sites, until no host is waiting.
+        """
+
+        while True:
+            with self.mutex:
+                if not self.robotsToRead:
+                    self.robotsReaders -= 1
+                    return
+                state, url = self.robotsToRead.popleft()
+            robotsDelay = self.readRobots(url)
+            with self.not_empty:
+                state.robotsDelay = robotsDelay
+                state.robots = 'done'
+                self.schedule(state)
+                self.not_empty.notify_all()
+
+    def hostOf(self, url):
+        """
+        Returns name of host with port of url.
+
+        :type url: string
+        :param url: Address of site.
+        """
+
+        return urllib.parse.urlsplit(url).netloc.lower()
+
+    def schedule(self, state):
+        """
+        Adds host to hosts waiting for their turn if it has queued sites and free connections.
+
+        :type state: HostState
+        :param state: State of the host.
+        """
+
+        if not state.scheduled and state.queue and state.active < self.maxConnectionsPerHost and state.robots != 'loading':
+            heapq.heappush(self.ready, (state.nextTime, next(self.counter), state))
+            state.scheduled = True
+
+    def hostDelay(self, state):
+        """
+        Returns current time in seconds between requests to host.
+
+        :type state: HostState
+        :param state: State of the host.
+        """
+
+        return max(self.crawlDelay, state.robotsDelay, state.delay)
+
+    def get(self, block=True, timeout=None):
+        """
+        Returns tuple (url, dist) of site of the host which may be contacted the soonest, waiting until it may be contacted.
+
+        Stop signals (None) are returned before any site.
+
+        :type block: bool
+        :param block: Flag specifying whether to wait for site if none may be downloaded now.
+
+        :type timeout: float
+        :param timeout: The longest time in seconds to wait, None means no limit.
+        """
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.not_empty:
+            while True:
+                now = time.monotonic()
+                if self.stops:
+                    return self.stops.popleft()
+                if self.ready and self.ready[0][0] <= now:
+                    _, _, state = heapq.heappop(self.ready)
+                    state.scheduled = False
+                    item = state.queue.popleft()
+                    self.size -= 1
+                    state.active += 1
+                    state.nextTime = now + self.hostDelay(state)
+                    self.schedule(state)
+                    return item
+                if not block:
+                    raise queue.Empty
+                wait = self.ready[0][0] - now if self.ready else None
+                if deadline is not None:
+                    if deadline <= now:
+                        raise queue.Empty
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self.not_empty.wait(wait)
+
+    def readRobots(self, url):
+        """
+        Downloads robots.txt of host of url and returns delay between requests it asks for, 0 if it does not exist.
+
+        :type url: string
+        :param url: Address of any site of the host.
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        parser = urllib.robotparser.RobotFileParser()
+        try:
+            req = urllib.request.urlopen('%s://%s/robots.txt' % (parts.scheme, parts.netloc), timeout=self.robotsTimeout)
+            # robotparser accepts only whole seconds in Crawl-delay, so fractional delay is given to it as request rate
+            lines = [re.sub(r'^\s*crawl-delay\s*:\s*(\d*)\.(\d+)\s*$', lambda m: 'Request-rate: %d/%d' % (10 ** len(m.group(2)), int(m.group(1) + m.group(2))),
+                            line, flags=re.IGNORECASE) for line in req.read().decode('utf-8', 'ignore').splitlines()]
+            parser.parse(lines)
+            # parser answers only after it has been marked as read
+            parser.modified()
+        except Exception:
+            return 0.0
+        delay = parser.crawl_delay(self.userAgent) or 0.0
+        rate = parser.request_rate(self.userAgent)
+        if rate is not None and rate.requests > 0:
+            delay = max(delay, rate.seconds / rate.requests)
+        return min(float(delay), self.maxDelay)
+
+    def fetched(self, url, status=None, elapsed=None, retryAfter=None):
+        """
+        Reports that site taken with get() has been downloaded or failed and adapts delay of its host.
+        Returns True if site was refused and should be queued again.
+
+        :type url: string
+        :param url: Address of site.
+
+        :type status: int
+        :param status: HTTP status of response, None if no response was received.
+
+        :type elapsed: float
+        :param elapsed: Time in seconds it took to receive the response.
+
+        :type retryAfter: float
+        :param retryAfter: Time in seconds given in Retry-After header, if any.
+        """
+
+        retry = False
+        with self.not_empty:
+            state = self.hosts[self.hostOf(url)]
+            state.active -= 1
+            if status in (429, 503):
+                state.delay = min(self.maxDelay, max(1.0, 2 * state.delay, retryAfter or 0.0))
+                self.retries[url] += 1
+                retry = self.retries[url] <= self.maxRetries
+            else:
+                if elapsed is not None:
+                    # tends to response time divided by target concurrency, so slow hosts get fewer requests
+                    state.delay = min(self.maxDelay, (state.delay + elapsed / self.targetConcurrency) / 2)
+                self.retries.pop(url, None)
+            state.nextTime = max(state.nextTime, time.monotonic() + self.hostDelay(state))
+            self.schedule(state)
+            self.not_empty.notify_all()
+        return retry
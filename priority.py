@@ -0,0 +1,164 @@
+import collections
+import heapq
+import itertools
+import math
+import queue
+import re
+import urllib.parse
+
+from frontier import Frontier
+
+# what is known about link when it is found: text of <a> tag and number of matches found on site containing it
+LinkHint = collections.namedtuple('LinkHint', ['anchorText', 'parentMatches'])
+
+def termsOfAction(action):
+    """
+    Returns list of lowercase words searched for by action, used to score links pointing to relevant sites.
+
+    Words are taken from description returned by spec() method of action. Literal words of at least
+    3 letters are taken from patterns, parts of escape sequences like \\w are skipped.
+
+    :type action: function
+    :param action: Action returned by one of search functions of crawling module.
+    """
+
+    spec = action.spec() if hasattr(action, 'spec') else {}
+    if "word" in spec:
+        words = spec["word"] if isinstance(spec["word"], list) else [spec["word"]]
+    elif "pattern" in spec:
+        words = re.findall(r'(?<![\\\w])[A-Za-z]{3,}(?!\w)', spec["pattern"])
+    else:
+        words = []
+    return [word.lower() for word in words if word.strip() != '']
+
+class LinkScorer:
+    """
+    Scores links, so sites more likely to contain searched words are downloaded first.
+
+    Score of link is sum of anchorWeight for each term found in its anchor text, urlWeight for each term found
+    in its address and parentWeight times logarithm of number of matches found on site containing it,
+    minus depthWeight times its distance from start site.
+    """
+    def __init__(self, terms=(), anchorWeight=2.0, urlWeight=1.0, parentWeight=1.0, depthWeight=0.1):
+        """
+        Creates LinkScorer object.
+
+        :type terms: list
+        :param terms: Lowercase words which make link more relevant, e.g. returned by termsOfAction.
+
+        :type anchorWeight: float
+        :param anchorWeight: Score of each term found in anchor text.
+
+        :type urlWeight: float
+        :param urlWeight: Score of each term found in address of linked site.
+
+        :type parentWeight: float
+        :param parentWeight: Weight of logarithm of number of matches found on site containing link.
+
+        :type depthWeight: float
+        :param depthWeight: Score lost for each step from start site.
+        """
+
+        self.terms = list(terms)
+        self.anchorWeight = anchorWeight
+        self.urlWeight = urlWeight
+        self.parentWeight = parentWeight
+        self.depthWeight = depthWeight
+
+    def __call__(self, url, dist, hint=None):
+        """
+        Returns score of link, the bigger the sooner it is downloaded.
+
+        :type url: string
+        :param url: Canonical address of linked site.
+
+        :type dist: int
+        :param dist: Distance of linked site from start site.
+
+        :type hint: LinkHint
+        :param hint: What is known about the link, None for sites queued without it, e.g. start site.
+        """
+
+        score = -self.depthWeight * dist
+        if self.terms:
+            lowered = url.lower()
+            score += self.urlWeight * sum(1 for term in self.terms if term in lowered)
+        if hint is not None:
+            if self.terms and hint.anchorText:
+                lowered = hint.anchorText.lower()
+                score += self.anchorWeight * sum(1 for term in self.terms if term in lowered)
+            score += self.parentWeight * math.log1p(hint.parentMatches)
+        return score
+
+class BestFirstQueue(queue.Queue):
+    """
+    Queue of sites which returns the best scored site first, to be used as urlQueue of frontier.Frontier.
+
+    Frontier passes it LinkHint of each link together with the site (see Frontier.put), so links can be scored
+    by their anchor text and by matches found on site containing them. To spread downloads over many hosts,
+    score of each site is lowered by hostWeight times logarithm of number of sites of its host queued before it.
+    Stop signals (None) are returned before any site.
+    """
+    usesHints = True
+
+    def __init__(self, scorer=None, hostWeight=0.5):
+        """
+        Creates BestFirstQueue object.
+
+        :type scorer: function
+        :param scorer: Returns score of site given its canonical address, distance and LinkHint (or None), e.g. LinkScorer object.
+                       Sites are ordered by distance by default.
+
+        :type hostWeight: float
+        :param hostWeight: Weight of logarithm of number of sites of the same host queued before, 0 disables it.
+        """
+
+        self.scorer = scorer if scorer is not None else LinkScorer()
+        self.hostWeight = hostWeight
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.heap = []
+        self.counter = itertools.count()
+        self.stops = collections.deque()
+        self.hostCounts = collections.Counter()
+
+    def _qsize(self):
+        return len(self.heap) + len(self.stops)
+
+    def _put(self, item):
+        if item is None:
+            self.stops.append(item)
+            return
+        url, dist = item[0], item[1]
+        score = self.scorer(url, dist, item[2] if len(item) > 2 else None)
+        if self.hostWeight:
+            host = urllib.parse.urlsplit(url).netloc
+            score -= self.hostWeight * math.log1p(self.hostCounts[host])
+            self.hostCounts[host] += 1
+        # sites with equal scores are returned in order in which they were queued
+        heapq.heappush(self.heap, (-score, next(self.counter), (url, dist)))
+
+    def _get(self):
+        if self.stops:
+            return self.stops.popleft()
+        return heapq.heappop(self.heap)[2]
+
+def bestFirstFrontier(action, maxDepth=-1, hostWeight=0.5, **weights):
+    """
+    Returns frontier.Frontier downloading first sites most likely to contain what action searches for.
+
+    :type action: function
+    :param action: Action returned by one of search functions of crawling module.
+
+    :type maxDepth: int
+    :param maxDepth: The biggest distance from start site crawler can reach.
+
+    :type hostWeight: float
+    :param hostWeight: Weight of host diversity, see BestFirstQueue.
+
+    :type weights: dict
+    :param weights: Other weights passed to LinkScorer, e.g. anchorWeight.
+    """
+
+    return Frontier(maxDepth, BestFirstQueue(LinkScorer(termsOfAction(action), **weights), hostWeight))
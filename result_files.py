@@ -0,0 +1,671 @@
+import array
+import bisect
+import collections
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# magic number and version at the beginning of binary results file
+BINARY_MAGIC = b'GCRB'
+BINARY_VERSION = 1
+
+# header of binary results file: magic, version, compression, reserved, offset and length of footer
+BINARY_HEADER = struct.Struct('<4sBBHQQ')
+
+# compression codecs of frames of binary results file by their codes stored in header
+COMPRESSIONS = {0: None, 1: 'zlib', 2: 'zstd'}
+
+# compression used when none is specified, zstd if zstandard package is installed
+DEFAULT_COMPRESSION = 'zstd' if zstandard is not None else 'zlib'
+
+# number of sites stored in single frame of records
+SITES_PER_FRAME = 4096
+
+# length in bytes of UTF-8 encoded strings after which frame of strings is written
+STRING_FRAME_SIZE = 1024 * 1024
+
+# the biggest number of distinct strings remembered by writer to store repeated ones once,
+# after which it starts remembering anew, so memory used by writer is bounded
+INTERN_LIMIT = 1000000
+
+# number of decompressed frames kept by reader
+CACHED_FRAMES = 16
+
+# the biggest number of decoded matches remembered while iterating over all results
+CACHED_STRINGS = 100000
+
+class JSONLinesSink:
+    """
+    Writes crawl results to JSON Lines file as soon as they are found.
+
+    First line describes the crawl, each of the following ones stores results
+    found on one site and the last one, written when crawl ends, stores its end time.
+    Every line is flushed right away, so results found so far survive if the crawl is interrupted.
+    """
+    def __init__(self, path):
+        """
+        Creates JSONLinesSink object.
+
+        :type path: string
+        :param path: Path of file to write.
+        """
+
+        self.path = path
+        self.f = None
+
+    def begin(self, startAddress, maxDepth, startTime, append=False):
+        """
+        Opens file and writes crawl description.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl began.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started.
+
+        :type append: bool
+        :param append: Flag specifying whether results should be appended to file written by interrupted crawl.
+        """
+
+        if append and os.path.exists(self.path):
+            self.f = open(self.path, 'a')
+            # line being written when crawl was interrupted may be cut off
+            self.f.write('\n')
+            return
+        self.f = open(self.path, 'w')
+        self.writeLine({"startAddress": startAddress, "maxDepth": maxDepth, "startTime": startTime})
+
+    def write(self, siteAddress, matches):
+        """
+        Writes results found on single site.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site.
+        """
+
+        self.writeLine({"site": siteAddress, "results": list(matches)})
+
+    def end(self, endTime, truncated=False):
+        """
+        Writes crawl end time and closes file.
+
+        :type endTime: float
+        :param endTime: Time at which crawl ended.
+
+        :type truncated: bool
+        :param truncated: Flag specifying whether crawl ended before visiting all sites.
+        """
+
+        self.writeLine({"endTime": endTime, "truncated": truncated})
+        self.f.close()
+
+    def writeLine(self, obj):
+        """
+        Writes object as single line of JSON.
+
+        :type obj: dict
+        :param obj: Object to write.
+        """
+
+        self.f.write(json.dumps(obj) + '\n')
+        self.f.flush()
+
+    def results(self):
+        """
+        Returns JSONLinesResults reading results written by this sink.
+        """
+
+        return JSONLinesResults(self.path)
+
+class JSONLinesResults:
+    """
+    Iterable over tuples (siteAddress, matches) stored in JSON Lines file, reading it lazily line by line.
+
+    Only addresses of sites are kept in memory while iterating.
+    """
+    def __init__(self, path):
+        """
+        Creates JSONLinesResults object.
+
+        :type path: string
+        :param path: Path of file written by JSONLinesSink.
+        """
+
+        self.path = path
+
+    def __iter__(self):
+        # file appended to by resumed crawl may contain the same site twice
+        sites = set()
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    # line being written when crawl was interrupted may be cut off or empty
+                    continue
+                if "site" in obj and obj["site"] not in sites:
+                    sites.add(obj["site"])
+                    yield obj["site"], obj["results"]
+
+def readJSONLinesInfo(path):
+    """
+    Returns tuple (description, endTime, truncated) of crawl stored in JSON Lines file without reading whole file.
+
+    If crawl was interrupted before it ended, time of last modification of the file is returned as endTime
+    and it is reported as truncated.
+
+    :type path: string
+    :param path: Path of file written by JSONLinesSink.
+    """
+
+    with open(path, 'rb') as f:
+        description = json.loads(f.readline())
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        lastLine = f.read().rstrip(b'\n').rsplit(b'\n', 1)[-1]
+    try:
+        last = json.loads(lastLine)
+        endTime = last["endTime"]
+        truncated = last.get("truncated", False)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        endTime = os.path.getmtime(path)
+        truncated = True
+    return description, endTime, truncated
+
+def saveJSONLines(crawlResult, path):
+    """
+    Saves CrawlResult object to JSON Lines file.
+
+    :type crawlResult: crawling.CrawlResult
+    :param crawlResult: Crawl results to save.
+
+    :type path: string
+    :param path: Path of file to write.
+    """
+
+    results = crawlResult.results
+    if isinstance(results, JSONLinesResults) and os.path.exists(path) and os.path.samefile(results.path, path):
+        # results are already stored there and rewriting the file would truncate it before it is read
+        return
+    sink = JSONLinesSink(path)
+    sink.begin(crawlResult.startAddress, crawlResult.maxDepth, crawlResult.startTime)
+    for siteAddress, matches in crawlResult.results:
+        sink.write(siteAddress, matches)
+    sink.end(crawlResult.endTime, crawlResult.truncated)
+
+def compress(data, compression):
+    """
+    Returns data compressed with codec.
+
+    :type data: bytes
+    :param data: Data to compress.
+
+    :type compression: string
+    :param compression: One of values of COMPRESSIONS.
+    """
+
+    if compression is None:
+        return data
+    if compression == 'zlib':
+        return zlib.compress(data, 6)
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def decompress(data, compression):
+    """
+    Returns data decompressed with codec.
+
+    :type data: bytes
+    :param data: Data to decompress.
+
+    :type compression: string
+    :param compression: One of values of COMPRESSIONS.
+    """
+
+    if compression is None:
+        return data
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if zstandard is None:
+        raise ValueError('zstandard package is required to read zstd compressed results')
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def uint32Array(values=()):
+    """
+    Returns array of unsigned 32 bit integers.
+
+    :type values: iterable
+    :param values: Initial values.
+    """
+
+    return array.array('I' if array.array('I').itemsize == 4 else 'L', values)
+
+def packUInt32(values):
+    """
+    Returns array of unsigned 32 bit integers as little endian bytes.
+
+    :type values: array.array
+    :param values: Array returned by uint32Array.
+    """
+
+    if sys.byteorder == 'big':
+        values = uint32Array(values)
+        values.byteswap()
+    return values.tobytes()
+
+def unpackUInt32(data, offset, count):
+    """
+    Returns array of count unsigned 32 bit integers stored as little endian bytes in data at offset.
+
+    :type data: bytes
+    :param data: Data to read.
+
+    :type offset: int
+    :param offset: Position of the first integer in data.
+
+    :type count: int
+    :param count: Number of integers.
+    """
+
+    values = uint32Array()
+    values.frombytes(data[offset:offset + 4 * count])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+class BinaryResultsWriter:
+    """
+    Writes crawl results to compact binary file which can be read lazily with BinaryResults.
+
+    File starts with BINARY_HEADER, followed by frames, each compressed separately, and ends with footer
+    describing the crawl and positions of frames as JSON. Frames of strings store distinct site addresses and matches,
+    each written once, so repeated ones take 4 bytes. Frames of records store for SITES_PER_FRAME sites
+    column of numbers of their addresses, column of ends of their matches and column of numbers of the matches.
+    Footer is written by end(), so file of unfinished crawl cannot be read.
+    """
+    def __init__(self, path, compression=DEFAULT_COMPRESSION):
+        """
+        Creates BinaryResultsWriter object.
+
+        :type path: string
+        :param path: Path of file to write.
+
+        :type compression: string
+        :param compression: Codec with which frames are compressed, one of values of COMPRESSIONS.
+        """
+
+        if compression not in COMPRESSIONS.values():
+            raise ValueError('Unknown compression: ' + str(compression))
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('zstandard package is required for zstd compression')
+        self.path = path
+        self.compression = compression
+        self.f = None
+
+    def begin(self, startAddress, maxDepth, startTime):
+        """
+        Opens file and remembers crawl description.
+
+        :type startAddress: string
+        :param startAddress: Address of site from which crawl began.
+
+        :type maxDepth: int
+        :param maxDepth: The biggest distance from start site crawler can reach.
+
+        :type startTime: float
+        :param startTime: Time at which crawl started.
+        """
+
+        self.f = open(self.path, 'wb')
+        self.f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, 0, 0, 0))
+        self.description = {"startAddress": startAddress, "maxDepth": maxDepth, "startTime": startTime}
+        self.strings = {}
+        self.stringCount = 0
+        self.pendingStrings = []
+        self.pendingStringsSize = 0
+        self.stringFrames = []
+        self.siteCount = 0
+        self.sites = uint32Array()
+        self.matchEnds = uint32Array()
+        self.matchIds = uint32Array()
+        self.recordFrames = []
+
+    def intern(self, s):
+        """
+        Returns number of string, adding it to pending frame of strings unless it has been written recently.
+
+        :type s: string
+        :param s: String to store.
+        """
+
+        stringId = self.strings.get(s)
+        if stringId is not None:
+            return stringId
+        if len(self.strings) >= INTERN_LIMIT:
+            self.strings = {}
+        stringId = self.strings[s] = self.stringCount
+        self.stringCount += 1
+        encoded = s.encode('utf-8', 'surrogatepass')
+        self.pendingStrings.append(encoded)
+        self.pendingStringsSize += len(encoded)
+        if self.pendingStringsSize >= STRING_FRAME_SIZE:
+            self.flushStrings()
+        return stringId
+
+    def writeFrame(self, data):
+        """
+        Writes compressed frame and returns tuple (offset, length) of it.
+
+        :type data: bytes
+        :param data: Contents of frame.
+        """
+
+        data = compress(data, self.compression)
+        offset = self.f.tell()
+        self.f.write(data)
+        return offset, len(data)
+
+    def flushStrings(self):
+        """
+        Writes pending strings as frame of strings: their number, ends of each of them and UTF-8 encoded strings.
+        """
+
+        if not self.pendingStrings:
+            return
+        ends = uint32Array()
+        end = 0
+        for encoded in self.pendingStrings:
+            end += len(encoded)
+            ends.append(end)
+        data = struct.pack('<I', len(self.pendingStrings)) + packUInt32(ends) + b''.join(self.pendingStrings)
+        self.stringFrames.append(self.writeFrame(data) + (self.stringCount - len(self.pendingStrings),))
+        self.pendingStrings = []
+        self.pendingStringsSize = 0
+
+    def flushRecords(self):
+        """
+        Writes pending sites as frame of records.
+        """
+
+        if not self.sites:
+            return
+        data = struct.pack('<I', len(self.sites)) + packUInt32(self.sites) + packUInt32(self.matchEnds) + packUInt32(self.matchIds)
+        self.recordFrames.append(self.writeFrame(data) + (self.siteCount - len(self.sites),))
+        self.sites = uint32Array()
+        self.matchEnds = uint32Array()
+        self.matchIds = uint32Array()
+
+    def write(self, siteAddress, matches):
+        """
+        Writes results found on single site.
+
+        :type siteAddress: string
+        :param siteAddress: Address of site.
+
+        :type matches: list
+        :param matches: Results of action performed on the site, list of strings.
+        """
+
+        self.sites.append(self.intern(siteAddress))
+        for match in matches:
+            self.matchIds.append(self.intern(match))
+        self.matchEnds.append(len(self.matchIds))
+        self.siteCount += 1
+        if len(self.sites) >= SITES_PER_FRAME:
+            self.flushRecords()
+
+    def end(self, endTime, truncated=False):
+        """
+        Writes remaining frames and footer and closes file.
+
+        :type endTime: float
+        :param endTime: Time at which crawl ended.
+
+        :type truncated: bool
+        :param truncated: Flag specifying whether crawl ended before visiting all sites.
+        """
+
+        self.flushStrings()
+        self.flushRecords()
+        footer = dict(self.description, endTime=endTime, truncated=truncated, sites=self.siteCount, strings=self.stringCount,
+                      stringFrames=self.stringFrames, recordFrames=self.recordFrames)
+        footerOffset = self.f.tell()
+        footerData = json.dumps(footer).encode('utf-8')
+        self.f.write(footerData)
+        self.f.seek(0)
+        compression = {name: code for code, name in COMPRESSIONS.items()}[self.compression]
+        self.f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, compression, 0, footerOffset, len(footerData)))
+        self.f.close()
+
+class LazyMatches:
+    """
+    Matches found on single site stored in binary results file, read from it only when iterated over.
+    """
+    def __init__(self, results, index, count):
+        """
+        Creates LazyMatches object.
+
+        :type results: BinaryResults
+        :param results: Results containing the site.
+
+        :type index: int
+        :param index: Number of the site.
+
+        :type count: int
+        :param count: Number of matches.
+        """
+
+        self.results = results
+        self.index = index
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.results.matches(self.index))
+
+class BinaryResults:
+    """
+    Sequence of tuples (siteAddress, matches) stored in file written by BinaryResultsWriter.
+
+    File is memory-mapped and only frames containing requested sites are read and decompressed,
+    so opening even very large file takes constant time and memory.
+    """
+    def __init__(self, path):
+        """
+        Creates BinaryResults object reading header and footer of file.
+
+        :type path: string
+        :param path: Path of file written by BinaryResultsWriter.
+        """
+
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < BINARY_HEADER.size:
+                raise ValueError('Not a binary results file: ' + path)
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, compression, _, footerOffset, footerLength = BINARY_HEADER.unpack_from(self.mm)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION or compression not in COMPRESSIONS:
+            raise ValueError('Not a binary results file: ' + path)
+        if footerOffset == 0:
+            raise ValueError('Binary results file was not finished: ' + path)
+        self.compression = COMPRESSIONS[compression]
+        self.info = json.loads(self.mm[footerOffset:footerOffset + footerLength].decode('utf-8'))
+        self.stringFrameStarts = [first for _, _, first in self.info["stringFrames"]]
+        self.recordFrameStarts = [first for _, _, first in self.info["recordFrames"]]
+        self.frames = collections.OrderedDict()
+
+    def __getstate__(self):
+        # memory map cannot be pickled, file is mapped again when loaded
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __len__(self):
+        return self.info["sites"]
+
+    def frame(self, kind, number):
+        """
+        Returns decoded frame, reading it from file unless it is among CACHED_FRAMES recently used ones.
+
+        Frame of strings is returned as tuple (first, ends, data) and frame of records
+        as tuple (first, sites, matchEnds, matchIds), where first is number of its first string or site.
+
+        :type kind: string
+        :param kind: 'strings' or 'records'.
+
+        :type number: int
+        :param number: Number of frame of that kind.
+        """
+
+        key = (kind, number)
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+            return frame
+        offset, length, first = self.info["stringFrames" if kind == 'strings' else "recordFrames"][number]
+        data = decompress(self.mm[offset:offset + length], self.compression)
+        count = struct.unpack_from('<I', data)[0]
+        if kind == 'strings':
+            frame = (first, unpackUInt32(data, 4, count), data[4 + 4 * count:])
+        else:
+            sites = unpackUInt32(data, 4, count)
+            matchEnds = unpackUInt32(data, 4 + 4 * count, count)
+            frame = (first, sites, matchEnds, unpackUInt32(data, 4 + 8 * count, matchEnds[-1] if count else 0))
+        self.frames[key] = frame
+        if len(self.frames) > CACHED_FRAMES:
+            self.frames.popitem(last=False)
+        return frame
+
+    def string(self, stringId):
+        """
+        Returns string with given number.
+
+        :type stringId: int
+        :param stringId: Number of string.
+        """
+
+        number = bisect.bisect_right(self.stringFrameStarts, stringId) - 1
+        first, ends, data = self.frame('strings', number)
+        i = stringId - first
+        return data[ends[i - 1] if i > 0 else 0:ends[i]].decode('utf-8', 'surrogatepass')
+
+    def record(self, index):
+        """
+        Returns tuple (siteId, matchIds) of site with given number, where matchIds is slice of array.
+
+        :type index: int
+        :param index: Number of site.
+        """
+
+        if not 0 <= index < len(self):
+            raise IndexError('site index out of range')
+        number = bisect.bisect_right(self.recordFrameStarts, index) - 1
+        first, sites, matchEnds, matchIds = self.frame('records', number)
+        i = index - first
+        return sites[i], matchIds[matchEnds[i - 1] if i > 0 else 0:matchEnds[i]]
+
+    def site(self, index):
+        """
+        Returns address of site with given number.
+
+        :type index: int
+        :param index: Number of site.
+        """
+
+        return self.string(self.record(index)[0])
+
+    def matches(self, index):
+        """
+        Returns list of matches found on site with given number.
+
+        :type index: int
+        :param index: Number of site.
+        """
+
+        return [self.string(matchId) for matchId in self.record(index)[1]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return self.site(index), self.matches(index)
+
+    def __iter__(self):
+        # matches repeated on many sites are decoded once, as long as there are not too many distinct ones
+        strings = {}
+        for siteAddress, index, start, end, matchIds in self.walk(0):
+            matches = []
+            for matchId in matchIds[start:end]:
+                match = strings.get(matchId)
+                if match is None:
+                    if len(strings) >= CACHED_STRINGS:
+                        strings = {}
+                    match = strings[matchId] = self.string(matchId)
+                matches.append(match)
+            yield siteAddress, matches
+
+    def walk(self, start):
+        """
+        Yields tuples (siteAddress, index, start, end, matchIds) from site with given number onwards,
+        where matchIds[start:end] are numbers of matches of site, reading each frame of records once.
+
+        :type start: int
+        :param start: Number of the first site.
+        """
+
+        for number in range(max(0, bisect.bisect_right(self.recordFrameStarts, start) - 1), len(self.recordFrameStarts)):
+            first, sites, matchEnds, matchIds = self.frame('records', number)
+            for i in range(max(0, start - first), len(sites)):
+                yield self.string(sites[i]), first + i, matchEnds[i - 1] if i > 0 else 0, matchEnds[i], matchIds
+
+    def rows(self, start=0):
+        """
+        Yields tuples (siteAddress, matches) from site with given number onwards,
+        where matches is LazyMatches object, so matches are read only when needed.
+
+        :type start: int
+        :param start: Number of the first site.
+        """
+
+        for siteAddress, index, matchStart, matchEnd, _ in self.walk(start):
+            yield siteAddress, LazyMatches(self, index, matchEnd - matchStart)
+
+def saveBinary(crawlResult, path, compression=DEFAULT_COMPRESSION):
+    """
+    Saves CrawlResult object to binary results file.
+
+    :type crawlResult: crawling.CrawlResult
+    :param crawlResult: Crawl results to save.
+
+    :type path: string
+    :param path: Path of file to write.
+
+    :type compression: string
+    :param compression: Codec with which frames are compressed, one of values of COMPRESSIONS.
+    """
+
+    results = crawlResult.results
+    if isinstance(results, BinaryResults) and os.path.exists(path) and os.path.samefile(results.path, path):
+        # results are already stored there and rewriting the file would truncate it before it is read
+        return
+    writer = BinaryResultsWriter(path, compression)
+    writer.begin(crawlResult.startAddress, crawlResult.maxDepth, crawlResult.startTime)
+    for siteAddress, matches in results:
+        writer.write(siteAddress, matches)
+    writer.end(crawlResult.endTime, crawlResult.truncated)
@@ -1,4 +1,6 @@
 import os
 import sys
 import re
-sys.path.insert(0, re.match(r'(.*/)', os.path.abspath(__file__)).group(1) + '../')
\ No newline at end of file
+sys.path.insert(0, re.match(r'(.*/)', os.path.abspath(__file__)).group(1) + '../')
+# local web served by benchmarks is used by tests of whole crawls
+sys.path.insert(0, re.match(r'(.*/)', os.path.abspath(__file__)).group(1) + '../benchmarks/')
@@ -1,6 +1,80 @@
 import unittest
+import tempfile
+import queue
+import gzip
+import http.server
+import asyncio
+import contextlib
+import io
+import os
+import pickle
+import threading
+import time
 import context
-from gui_handling import comaSepToList, parseAttrSpec, parseStartSiteAddress
+from input_parsing import comaSepToList, parseAttrSpec, parseStartSiteAddress
+from matching import KeywordMatcher, SentenceMatcher, collectMatches
+from frontier import Frontier, canonicaliseURL, canonicalKey, resolveLink, resolveLinks, BloomFilter, DiskQueue, DiskSeenIndex, diskFrontier
+from caching import PageCache
+from corpus import CorpusStore
+from inverted_index import InvertedIndex
+from link_extraction import extractLinks
+from parsing import ParsedSite
+from crawling import searchForWord, searchForSentencesContainingWord, searchForPattern, ResultStore, CrawlBudget, CrawlResult, crawl, resumeCrawl
+from politeness import HostQueue
+from fetching import AsyncFetcher, BodyDecompressor, HTTPError, ResponseRejected, checkResponseHead, decodeText
+from jobs import CrawlJob, runJob
+from metrics import CrawlStats
+from incremental import ManifestEntry, SiteManifest, crawlSettings, diffResults, parseLastmod, recrawl
+from distributed import PartitionedQueue, RemoteFrontier, crawlDistributed, partitionOf, parseAddress, runWorker
+from priority import BestFirstQueue, LinkHint, LinkScorer, bestFirstFrontier, termsOfAction
+import cli
+import result_files
+from synthetic_site import SiteGraph, SyntheticWeb
+from result_files import BinaryResults, BinaryResultsWriter, JSONLinesSink, saveBinary
+
+def sitesWithWord(web, word, maxDepth):
+    """
+    Returns set of addresses of sites of SyntheticWeb within maxDepth from root site which texts contain word.
+    """
+
+    dists = {0: 0}
+    layer = [0]
+    for dist in range(1, maxDepth + 1):
+        layer = [c for i in layer for c in web.graph.children(i) if c not in dists]
+        for c in layer:
+            dists.setdefault(c, dist)
+    return {web.address(i) for i in dists if word in ' '.join(web.graph.text(i)).lower().split()}
+
+def crawlThreadsAlive():
+    """
+    Returns names of threads started by crawl which are still running.
+    """
+
+    return [t.name for t in threading.enumerate() if 'downloadSite' in t.name or 'processSite' in t.name]
+
+def startStub(respond):
+    """
+    Starts keep-alive HTTP server on free port, calling respond with request handler for each GET request.
+    Returns tuple (server, address of its root).
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            respond(self)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:%d/' % server.server_address[1]
+
+def stopStub(server):
+    server.shutdown()
+    server.server_close()
 
 class textParsingTestCase(unittest.TestCase):
     def testComaSepToList(self):
@@ -30,5 +104,850 @@ class textParsingTestCase(unittest.TestCase):
         self.assertEqual(parseStartSiteAddress('sample/'), 'sample/')
         self.assertEqual(parseStartSiteAddress('sample'), 'sample/')
 
+class matchingTestCase(unittest.TestCase):
+    def testKeywordMatcher(self):
+        matcher = KeywordMatcher(['foo', 'bar baz'], False)
+        self.assertEqual(list(matcher.finditer('Foo bar baz, foobar FOO')), [(0, 'Foo'), (4, 'bar baz'), (20, 'FOO')])
+        matcher = KeywordMatcher(['foo'], True)
+        self.assertEqual(list(matcher.finditer('Foo foo')), [(4, 'foo')])
+
+    def testSentenceMatcher(self):
+        matcher = SentenceMatcher('word', True)
+        self.assertEqual([s for _, s in matcher.finditer('Some word here. No match! A word, another word...')],
+                            ['Some word here.', 'A word, another word...'])
+        self.assertEqual([s for _, s in matcher.finditer('lowercase word here? x-word.')], ['word here?', 'word.'])
+        self.assertEqual(list(SentenceMatcher('a.b', True).finditer('a.b. axb.')), [(0, 'a.b.')])
+
+    def testCollectMatches(self):
+        matcher = KeywordMatcher(['a', 'b', 'c'], True)
+        self.assertEqual(collectMatches(matcher, ['b a b', 'c a']), ['b', 'a', 'c'])
+        self.assertEqual(collectMatches(matcher, ['b a b', 'c a'], maxMatches=2), ['b', 'a'])
+
+class frontierTestCase(unittest.TestCase):
+    def testCloserSiteDownloadedOnce(self):
+        toVisit = Frontier(3)
+        toVisit.put('http://a.com/x', 3)
+        toVisit.put('http://a.com/y', 2)
+        self.assertTrue(toVisit.put('http://a.com/x', 1))
+        self.assertEqual(toVisit.get(), ('http://a.com/y', 2))
+        self.assertEqual(toVisit.get(), ('http://a.com/x', 1))
+        toVisit.task_done(('http://a.com/y', 2))
+        toVisit.task_done(('http://a.com/x', 1))
+        self.assertTrue(toVisit.join(0))
+
+    def testCanonicaliseURL(self):
+        self.assertEqual(canonicaliseURL('HTTP://Example.COM:80'), 'http://example.com/')
+        self.assertEqual(canonicaliseURL('https://example.com:8443/a/./b/../c?b=2&a=1#top'), 'https://example.com:8443/a/c?a=1&b=2')
+        self.assertEqual(canonicaliseURL('http://example.com/%7euser/%2f'), 'http://example.com/~user/%2F')
+        self.assertEqual(canonicaliseURL('mailto:someone@example.com'), None)
+
+    def testResolveLink(self):
+        self.assertEqual(resolveLink('http://example.com/a/b.html', 'c.html'), 'http://example.com/a/c.html')
+        self.assertEqual(resolveLink('http://example.com/a/b.html', '/c.html#x'), 'http://example.com/c.html')
+        self.assertEqual(resolveLink('https://example.com/a/', '//other.org'), 'https://other.org/')
+        self.assertEqual(resolveLink('http://example.com/', '#top'), None)
+        self.assertEqual(resolveLink('http://example.com/', 'javascript:void(0)'), None)
+        self.assertEqual(resolveLinks('http://example.com/a/', ['b', ' b ', 'http://example.com/a/b#x', '#top', 'HTTP://Other.org']),
+                         ['http://example.com/a/b', 'http://other.org/'])
+
+    def testFrontierPut(self):
+        self.assertEqual(canonicalKey('http://example.com/a/'), canonicalKey('https://example.com/a'))
+        frontier = Frontier(maxDepth=2)
+        self.assertTrue(frontier.put('http://example.com/a', 2))
+        self.assertFalse(frontier.put('https://EXAMPLE.com/a/', 2))
+        self.assertTrue(frontier.put('http://example.com/a', 1))
+        self.assertEqual(frontier.qsize(), 2)
+
+    def testFrontierSnapshot(self):
+        frontier = Frontier()
+        frontier.trackPending()
+        frontier.put('http://example.com/a', 0)
+        frontier.put('http://example.com/b', 1)
+        item = frontier.get()
+        frontier.task_done(item)
+        self.assertEqual(frontier.snapshot(), ([('http://example.com/b', 1)], [('//example.com/a', 0), ('//example.com/b', 1)]))
+        self.assertFalse(frontier.join(0))
+
+    def testBloomFilter(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(str(i))
+        self.assertTrue(all(str(i) in bloom for i in range(1000)))
+        self.assertLess(sum(str(i) in bloom for i in range(1000, 11000)), 300)
+
+    def testDiskQueue(self):
+        with tempfile.TemporaryDirectory() as directory:
+            q = DiskQueue(os.path.join(directory, 'queue.db'), maxInMemory=3)
+            for i in range(10):
+                q.put(('site%d' % i, i))
+            q.put(None)
+            self.assertEqual(q.qsize(), 11)
+            self.assertEqual([q.get() for _ in range(11)], [('site%d' % i, i) for i in range(10)] + [None])
+
+    def testDiskSeenIndex(self):
+        with tempfile.TemporaryDirectory() as directory:
+            seen = DiskSeenIndex(os.path.join(directory, 'seen.db'), expectedSites=100, writeBuffer=2)
+            for i in range(5):
+                seen['site%d' % i] = i
+            self.assertEqual([seen.get('site%d' % i) for i in range(6)], [0, 1, 2, 3, 4, None])
+            seen.flush()
+            seen = DiskSeenIndex(os.path.join(directory, 'seen.db'), expectedSites=100, resume=True)
+            self.assertEqual(seen.get('site3'), 3)
+            seen = DiskSeenIndex(os.path.join(directory, 'seen.db'), expectedSites=100)
+            self.assertIsNone(seen.get('site3'))
+
+class cachingTestCase(unittest.TestCase):
+    def testStoreAndLookup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PageCache(os.path.join(directory, 'cache.db'), freshFor=60)
+            self.assertIsNone(cache.lookup('http://example.com/a'))
+            cache.store('http://example.com/a', b'<html></html>', {'etag': '"x"', 'last-modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+            cache.store('http://example.com/b', b'<html></html>', {'cache-control': 'no-store'})
+            entry = cache.lookup('HTTP://Example.com/a')
+            self.assertEqual(entry.body, b'<html></html>')
+            self.assertTrue(cache.isFresh(entry))
+            self.assertEqual(cache.conditionalHeaders(entry), {'If-None-Match': '"x"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+            self.assertIsNone(cache.lookup('http://example.com/b'))
+
+    def testEviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PageCache(os.path.join(directory, 'cache.db'), maxBytes=2000)
+            for i in range(10):
+                cache.store('http://example.com/%d' % i, os.urandom(500), {})
+            self.assertLessEqual(cache.size, 2000)
+            self.assertIsNone(cache.lookup('http://example.com/0'))
+            self.assertIsNotNone(cache.lookup('http://example.com/9'))
+
+    def testAccessTimes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            cache = PageCache(path, maxBytes=2100)
+            for i in range(4):
+                cache.store('http://example.com/%d' % i, os.urandom(500), {})
+            self.assertIsNotNone(cache.lookup('http://example.com/0'))
+            # page looked up last is not the least recently used one, even though its access time is buffered
+            cache.store('http://example.com/4', os.urandom(500), {})
+            self.assertIsNotNone(cache.lookup('http://example.com/0'))
+            self.assertIsNone(cache.lookup('http://example.com/1'))
+            cache.close()
+            # access times are saved by close, so read-only use of cache keeps them too
+            cache = PageCache(path)
+            ((newest,),) = cache.db.execute('SELECT url FROM pages ORDER BY accessedAt DESC LIMIT 1').fetchall()
+            self.assertEqual(newest, 'http://example.com/0')
+            cache.close()
+
+class corpusTestCase(unittest.TestCase):
+    def testCorpusStore(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'corpus.db')
+            corpus = CorpusStore(path, commitEvery=2)
+            self.assertIsNone(corpus.info())
+            corpus.begin('http://example.com/', 2, 1.0)
+            for i in range(5):
+                corpus.add('http://example.com/%d' % i, i % 3, '<p>site %d</p>' % i)
+            corpus.end(2.0)
+            corpus.close()
+            corpus = CorpusStore(path)
+            self.assertEqual(corpus.info(), {"startAddress": 'http://example.com/', "maxDepth": 2, "startTime": 1.0, "endTime": 2.0})
+            self.assertEqual(list(corpus), [('http://example.com/%d' % i, i % 3, '<p>site %d</p>' % i) for i in range(5)])
+            corpus.begin('http://example.com/', 2, 3.0, append=True)
+            self.assertEqual(len(corpus), 5)
+            corpus.begin('http://example.com/', 2, 3.0)
+            self.assertEqual(len(corpus), 0)
+
+class invertedIndexTestCase(unittest.TestCase):
+    def testSearch(self):
+        sites = {
+            'http://example.com/a': '<html><body><p>Hello world. Nothing here!</p><h1>World</h1></body></html>',
+            'http://example.com/b': '<html><body><p>No match. The World is big.</p></body></html>'
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            index = InvertedIndex(os.path.join(directory, 'index.db'), ['p', 'h1'])
+            for siteAddress, siteHTML in sites.items():
+                index.addSite(siteAddress, ParsedSite(siteHTML))
+            for action in (searchForWord('world', False, ['p', 'h1']), searchForWord('World', True, ['p']),
+                           searchForSentencesContainingWord('world', False, ['p'])):
+                direct = [(siteAddress, action(ParsedSite(siteHTML))) for siteAddress, siteHTML in sites.items()]
+                self.assertEqual(index.search(action), [(siteAddress, matches) for siteAddress, matches in direct if matches])
+            self.assertEqual(index.postings('world'), [('http://example.com/a', 'p', 6), ('http://example.com/a', 'h1', 0),
+                                                        ('http://example.com/b', 'p', 14)])
+            self.assertRaises(ValueError, index.search, searchForWord('world', False, ['div']))
+
+    def testBegin(self):
+        with tempfile.TemporaryDirectory() as directory:
+            index = InvertedIndex(os.path.join(directory, 'index.db'), ['p'])
+            index.begin('http://a.com/', 1)
+            index.addSite('http://a.com/', ParsedSite('<p>old world</p>'))
+            index.begin('http://a.com/', 1, append=True)
+            index.addSite('http://a.com/x', ParsedSite('<p>new world</p>'))
+            self.assertEqual([site for site, _, _ in index.postings('world')], ['http://a.com/', 'http://a.com/x'])
+            index.begin('http://b.com/', 1)
+            index.addSite('http://b.com/', ParsedSite('<p>other world</p>'))
+            self.assertEqual(index.search(searchForWord('world', False, ['p'])), [('http://b.com/', ['world'])])
+            self.assertEqual(index.postings('old'), [])
+
+class politenessTestCase(unittest.TestCase):
+    def testHostQueue(self):
+        q = HostQueue(maxConnectionsPerHost=1, robots=False)
+        for i in range(2):
+            q.put(('http://a.com/%d' % i, 1))
+            q.put(('http://b.com/%d' % i, 1))
+        self.assertEqual([q.get(), q.get()], [('http://a.com/0', 1), ('http://b.com/0', 1)])
+        # both hosts have all of their connections busy
+        self.assertRaises(queue.Empty, q.get, block=False)
+        self.assertFalse(q.fetched('http://a.com/0', 200, 0.0))
+        self.assertEqual(q.get(block=False), ('http://a.com/1', 1))
+        self.assertTrue(q.fetched('http://b.com/0', 429, 0.0, 5.0))
+        self.assertGreaterEqual(q.hostDelay(q.hosts['b.com']), 5.0)
+        self.assertRaises(queue.Empty, q.get, timeout=0.1)
+        q.put(None)
+        self.assertIsNone(q.get())
+
+    def crawlPolitely(self, fetcher):
+        """
+        Crawls stub host asking for Crawl-delay in robots.txt and refusing one site once with 429,
+        returns crawl result and list of tuples (path, time) of received requests.
+        """
+
+        requests = []
+        mutex = threading.Lock()
+
+        def respond(handler):
+            with mutex:
+                refused = handler.path == '/b' and '/b' not in [path for path, _ in requests]
+                requests.append((handler.path, time.monotonic()))
+            if handler.path == '/robots.txt':
+                body = b'User-agent: *\nCrawl-delay: 0.2\n'
+            elif refused:
+                handler.send_response(429)
+                handler.send_header('Retry-After', '1')
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            elif handler.path == '/':
+                body = b'<p>crawler</p><a href="/a">a</a><a href="/b">b</a>'
+            else:
+                body = b'<p>crawler</p>'
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/html; charset=utf-8')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        server, address = startStub(respond)
+        try:
+            result = crawl(address, 1, [], searchForWord('crawler', False, ['p']), downloadThreads=4, processThreads=2, fetcher=fetcher,
+                           frontier=Frontier(urlQueue=HostQueue(maxConnectionsPerHost=2)))
+        finally:
+            stopStub(server)
+        return result, address, requests
+
+    def checkPoliteCrawl(self, result, address, requests):
+        self.assertEqual({siteAddress for siteAddress, _ in result.results}, {address, address + 'a', address + 'b'})
+        paths = [path for path, _ in requests]
+        self.assertEqual(paths.count('/robots.txt'), 1)
+        self.assertEqual(paths.count('/b'), 2)
+        # robots.txt is read before any site of the host is requested
+        self.assertEqual(paths[0], '/robots.txt')
+        pages = [t for path, t in requests if path != '/robots.txt']
+        for previous, following in zip(pages, pages[1:]):
+            self.assertGreaterEqual(following - previous, 0.15)
+        refused, retried = [t for path, t in requests if path == '/b']
+        self.assertGreaterEqual(retried - refused, 0.9)
+
+    def testCrawlDelayAndRetryAfter(self):
+        self.checkPoliteCrawl(*self.crawlPolitely(None))
+
+    def testCrawlDelayAndRetryAfterAsync(self):
+        self.checkPoliteCrawl(*self.crawlPolitely(AsyncFetcher(concurrency=4)))
+
+class fetchingTestCase(unittest.TestCase):
+    def testCheckResponseHead(self):
+        checkResponseHead({'content-type': 'text/html; charset=utf-8', 'content-length': '100'})
+        checkResponseHead({})
+        self.assertRaises(ResponseRejected, checkResponseHead, {'content-type': 'application/pdf'})
+        self.assertRaises(ResponseRejected, checkResponseHead, {'content-length': '1000'}, 100)
+
+    def testBodyDecompressor(self):
+        decompressor = BodyDecompressor('gzip', 100)
+        body = gzip.compress(b'<p>text</p>')
+        decompressor.feed(body[:5])
+        decompressor.feed(body[5:])
+        self.assertEqual(decompressor.body(), b'<p>text</p>')
+        decompressor = BodyDecompressor('gzip', 100)
+        self.assertRaises(ResponseRejected, decompressor.feed, gzip.compress(b'a' * 1000))
+
+    def testDecodeText(self):
+        text = 'zażółć'
+        self.assertEqual(decodeText(text.encode('iso-8859-2'), {'content-type': 'text/html; charset=ISO-8859-2'}), text)
+        self.assertEqual(decodeText(('<meta charset="iso-8859-2">' + text).encode('iso-8859-2'), {}), '<meta charset="iso-8859-2">' + text)
+        self.assertEqual(decodeText(text.encode('utf-8'), {}), text)
+        self.assertEqual(decodeText('café'.encode('cp1252'), {}), 'café')
+
+    def testAsyncNotModified(self):
+        def respond(handler):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                # no Content-Length, connection kept alive, like nginx does
+                handler.send_response(304)
+                handler.send_header('ETag', '"v1"')
+                handler.end_headers()
+                return
+            body = b'<p>text</p>'
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/html; charset=utf-8')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.send_header('ETag', '"v1"')
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        server, address = startStub(respond)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PageCache(os.path.join(directory, 'cache.db'), freshFor=0)
+            fetcher = AsyncFetcher(timeout=2, cache=cache, stats=CrawlStats())
+
+            async def fetchTwice():
+                first = await fetcher.fetch(address)
+                second = await fetcher.fetch(address)
+                fetcher.close()
+                return first, second
+
+            try:
+                first, second = asyncio.run(fetchTwice())
+            finally:
+                stopStub(server)
+        self.assertEqual((first.status, second.status, second.text()), (200, 200, '<p>text</p>'))
+        self.assertEqual(fetcher.stats.snapshot()["counters"]["notModified"], 1)
+
+    def testAsyncStatuses(self):
+        def respond(handler):
+            if handler.path == '/moved':
+                # redirect without Location cannot be followed
+                handler.send_response(302)
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            body = gzip.compress(b'<p>text</p>')
+            handler.send_response(203)
+            handler.send_header('Content-Type', 'text/html; charset=utf-8')
+            handler.send_header('Content-Encoding', 'gzip')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        server, address = startStub(respond)
+        fetcher = AsyncFetcher(timeout=2)
+
+        async def fetchBoth():
+            try:
+                response = await fetcher.fetch(address)
+                with self.assertRaises(HTTPError) as raised:
+                    await fetcher.fetch(address + 'moved')
+                return response, raised.exception
+            finally:
+                fetcher.close()
+
+        try:
+            response, error = asyncio.run(fetchBoth())
+        finally:
+            stopStub(server)
+        self.assertEqual((response.status, response.text()), (203, '<p>text</p>'))
+        self.assertEqual(error.status, 302)
+
+class resultStoreTestCase(unittest.TestCase):
+    def testOnResult(self):
+        reported = []
+        store = ResultStore(onResult=lambda siteAddress, matches: reported.append((siteAddress, matches)))
+        store.add('http://a.com/', ['foo'])
+        store.add('http://b.com/', [])
+        # site processed again is reported only once
+        store.add('http://a.com/', ['foo', 'bar'])
+        self.assertEqual(reported, [('http://a.com/', ['foo']), ('http://b.com/', [])])
+
+class jsonLinesTestCase(unittest.TestCase):
+    def testRoundTrip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.jsonl')
+            sink = JSONLinesSink(path)
+            sink.begin('http://a.com/', 2, 100.0)
+            sink.write('http://a.com/', ['foo', 'bar'])
+            sink.write('http://a.com/x', ['foo'])
+            sink.end(150.0)
+            result = CrawlResult.fromJSONLines(path)
+            self.assertEqual((result.startAddress, result.maxDepth, result.startTime, result.endTime, result.truncated),
+                             ('http://a.com/', 2, 100.0, 150.0, False))
+            self.assertEqual(list(result.results), [('http://a.com/', ['foo', 'bar']), ('http://a.com/x', ['foo'])])
+
+    def testAppend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.jsonl')
+            sink = JSONLinesSink(path)
+            sink.begin('http://a.com/', 2, 100.0)
+            sink.write('http://a.com/', ['foo'])
+            # crawl interrupted in the middle of writing a line
+            sink.f.write('{"site": "http://a.com/y", "res')
+            sink.f.close()
+            self.assertTrue(CrawlResult.fromJSONLines(path).truncated)
+            sink = JSONLinesSink(path)
+            sink.begin('http://a.com/', 2, 100.0, append=True)
+            sink.write('http://a.com/y', ['bar'])
+            sink.write('http://a.com/', ['foo'])
+            sink.end(200.0)
+            result = CrawlResult.fromJSONLines(path)
+            self.assertEqual((result.startTime, result.endTime, result.truncated), (100.0, 200.0, False))
+            self.assertEqual(list(result.results), [('http://a.com/', ['foo']), ('http://a.com/y', ['bar'])])
+
+class binaryResultsTestCase(unittest.TestCase):
+    def testRoundTrip(self):
+        results = [('http://a.com/%d' % i, ['foo', 'bar %d' % (i % 3)] if i % 2 else []) for i in range(10)] + [('http://b.com/ż', ['żółw'])]
+        res = CrawlResult('http://a.com/', 2, 100.0, 105.0, results, True)
+        sitesPerFrame = result_files.SITES_PER_FRAME
+        result_files.SITES_PER_FRAME = 4
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for compression in (None, 'zlib'):
+                    path = os.path.join(directory, 'results.gcr')
+                    saveBinary(res, path, compression)
+                    loaded = CrawlResult.fromBinary(path)
+                    self.assertEqual((loaded.startAddress, loaded.maxDepth, loaded.crawlTime, loaded.truncated), ('http://a.com/', 2, 5.0, True))
+                    self.assertEqual(list(loaded.results), results)
+                    self.assertEqual(loaded.results[-1], results[-1])
+                    # repeated matches are stored once
+                    self.assertEqual(loaded.results.info["strings"], 11 + 5)
+                    rows = list(loaded.results.rows(9))
+                    self.assertEqual([(siteAddress, len(matches), list(matches)) for siteAddress, matches in rows],
+                                     [('http://a.com/9', 2, ['foo', 'bar 0']), ('http://b.com/ż', 1, ['żółw'])])
+                    self.assertEqual(list(pickle.loads(pickle.dumps(loaded.results))), results)
+        finally:
+            result_files.SITES_PER_FRAME = sitesPerFrame
+
+    def testUnfinishedFile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.gcr')
+            writer = BinaryResultsWriter(path)
+            writer.begin('http://a.com/', 1, 0.0)
+            writer.write('http://a.com/', ['foo'])
+            writer.f.close()
+            self.assertRaises(ValueError, BinaryResults, path)
+
+class crawlBudgetTestCase(unittest.TestCase):
+    def testPageBudget(self):
+        budget = CrawlBudget(maxPages=2)
+        self.assertTrue(budget.admit(10))
+        self.assertFalse(budget.exhausted())
+        self.assertTrue(budget.admit(10))
+        self.assertTrue(budget.exhausted())
+        self.assertFalse(budget.admit(10))
+        self.assertTrue(budget.dropped)
+        self.assertFalse(budget.cancelled())
+
+    def testCancel(self):
+        budget = CrawlBudget(maxBytes=100)
+        self.assertTrue(budget.admit(50))
+        budget.cancel()
+        self.assertTrue(budget.cancelled())
+        self.assertFalse(budget.admit(10))
+        self.assertTrue(CrawlBudget(deadline=0).cancelled())
+
+class jobsTestCase(unittest.TestCase):
+    def testFromJSON(self):
+        job = CrawlJob.fromJSON({"start": "http://a.com/", "query": ["foo", "bar"], "maxPages": 10},
+                                {"depth": 2, "tags": "p,h1", "aAttrsFilter": "class:nav"})
+        self.assertEqual((job.maxDepth, job.tags, job.aAttrsFilter, job.maxPages), (2, ['p', 'h1'], {'class': ['nav']}, 10))
+        self.assertEqual(job.action().spec()["type"], "words")
+        self.assertEqual(job.budget().maxPages, 10)
+        self.assertRaises(ValueError, CrawlJob.fromJSON, {"start": "http://a.com/", "query": "foo", "search": "images"})
+
+class linkExtractionTestCase(unittest.TestCase):
+    def testExtractLinks(self):
+        html = ('<html><head><base href="/docs/"></head><body><a href="a.html" class="nav big">a</a>'
+                '<a href="http://other.org/b" class="footer">b</a><a name="top">no href</a><A HREF="a.html">again</A></body></html>')
+        self.assertEqual(extractLinks(html, 'http://example.com/index.html'), ['http://example.com/docs/a.html', 'http://other.org/b'])
+        self.assertEqual(extractLinks(html, 'http://example.com/', parseAttrSpec('class:nav')), ['http://example.com/docs/a.html'])
+
+    def testAnchorTexts(self):
+        html = '<a href="a">Foo <b>bar</b></a><a href="b">unclosed<a href="a"> baz </a><a href="">empty</a>'
+        self.assertEqual(extractLinks(html, 'http://example.com/', anchorTexts=True),
+                         [('http://example.com/a', 'Foo bar baz'), ('http://example.com/b', 'unclosed')])
+
+    def testDocumentWithoutBody(self):
+        self.assertEqual(extractLinks('<a href="c">c</a>', 'http://example.com/a/b'), ['http://example.com/a/c'])
+        self.assertEqual(extractLinks('', 'http://example.com/'), [])
+
+class priorityTestCase(unittest.TestCase):
+    def testTermsOfAction(self):
+        self.assertEqual(termsOfAction(searchForWord('Python', False, ['p'])), ['python'])
+        self.assertEqual(termsOfAction(searchForPattern(r'\bcrawl\w+ (web|net)', False, ['p'])), ['web', 'net'])
+
+    def testBestFirstQueue(self):
+        q = BestFirstQueue(LinkScorer(['python']), hostWeight=0)
+        q.put(('http://a.com/1', 1))
+        q.put(('http://a.com/2', 1, LinkHint('Learn Python', 0)))
+        q.put(('http://a.com/python', 1))
+        q.put(('http://a.com/3', 1, LinkHint('other', 3)))
+        q.put(None)
+        self.assertEqual([q.get() for _ in range(5)],
+                         [None, ('http://a.com/2', 1), ('http://a.com/3', 1), ('http://a.com/python', 1), ('http://a.com/1', 1)])
+
+    def testHostDiversity(self):
+        q = BestFirstQueue()
+        for url in ('http://a.com/1', 'http://a.com/2', 'http://a.com/3', 'http://b.com/1'):
+            q.put((url, 1))
+        self.assertEqual([q.get()[0] for _ in range(4)], ['http://a.com/1', 'http://b.com/1', 'http://a.com/2', 'http://a.com/3'])
+
+    def testFrontierHints(self):
+        frontier = Frontier(urlQueue=BestFirstQueue(LinkScorer(['python'])))
+        self.assertTrue(frontier.usesHints())
+        frontier.put('http://a.com/1', 1)
+        frontier.put('http://b.com/2', 1, LinkHint('python', 0))
+        self.assertEqual(frontier.get(), ('http://b.com/2', 1))
+        self.assertFalse(Frontier().usesHints())
+
+class metricsTestCase(unittest.TestCase):
+    def testCrawlStats(self):
+        stats = CrawlStats()
+        stats.record('parse', 0.5)
+        stats.record('parse', 1.5)
+        stats.count('pages', 2)
+        q = queue.Queue()
+        q.put(1)
+        stats.watch('toVisit', q.qsize)
+        with stats.working('download'):
+            snapshot = stats.snapshot()
+        self.assertEqual(snapshot["stages"]["parse"], {"count": 2, "seconds": 2.0, "max": 1.5, "mean": 1.0})
+        self.assertEqual((snapshot["counters"]["pages"], snapshot["activeWorkers"]["download"], snapshot["queueDepths"]["toVisit"]), (2, 1, 1))
+        text = stats.prometheus()
+        self.assertIn('crawler_stage_seconds_sum{stage="parse"} 2.0', text)
+        self.assertIn('crawler_pages_total 2.0', text)
+        self.assertIn('crawler_queue_depth{queue="toVisit"} 1.0', text)
+        stats.finish()
+        self.assertEqual(pickle.loads(pickle.dumps(stats)).snapshot()["counters"]["pages"], 2)
+
+    def testQuantiles(self):
+        stats = CrawlStats(keepSamples=50)
+        for i in range(1, 1001):
+            stats.record('ttfb', i / 1000)
+        ttfb = stats.snapshot()["stages"]["ttfb"]
+        self.assertEqual(len(stats.samples['ttfb']), 50)
+        self.assertTrue(ttfb["p50"] <= ttfb["p90"] <= ttfb["p99"] <= 1.0)
+        self.assertNotIn("p50", stats.snapshot()["stages"]["parse"])
+        self.assertIn('crawler_stage_seconds{stage="ttfb",quantile="0.5"}', stats.prometheus())
+
+class distributedTestCase(unittest.TestCase):
+    def testPartitionedQueue(self):
+        q = PartitionedQueue(4)
+        toVisit = Frontier(-1, q)
+        for url in ['http://a.com/1', 'http://b.com/1', 'http://a.com/2', 'http://c.com/1']:
+            toVisit.put(url, 1)
+        self.assertEqual(partitionOf('http://a.com/1', 4), partitionOf('http://a.com/2', 4))
+        part = partitionOf('http://a.com/1', 4)
+        items = q.take([part], 10)
+        self.assertEqual([url for url, _ in items if 'a.com' in url], ['http://a.com/1', 'http://a.com/2'])
+        self.assertEqual(q.qsize(), 4 - len(items))
+        q.putBack(items)
+        self.assertEqual(q.qsize(), 4)
+        self.assertEqual(q.take([part], 1), [items[0]])
+        self.assertEqual(len(q.take(range(4), 10)), 3)
+        for _ in range(4):
+            toVisit.task_done(('http://a.com/1', 1))
+        self.assertTrue(toVisit.join(0))
+
+    def testRemoteFrontier(self):
+        toVisit = RemoteFrontier(2)
+        stats = CrawlStats()
+        toVisit.queue.put(('http://a.com/', 0))
+        item = toVisit.get()
+        toVisit.requeue(*item)
+        toVisit.task_done(item)
+        toVisit.put('http://a.com/x', 1)
+        toVisit.add('http://a.com/', ['match'])
+        stats.record('parse', 0.5)
+        stats.count('pages')
+        message = toVisit.message(5, stats)
+        self.assertEqual((message["links"], message["done"], message["results"]), ([('http://a.com/x', 1, None)], [], [('http://a.com/', ['match'])]))
+        toVisit.task_done(toVisit.get())
+        message = toVisit.message(5, stats)
+        self.assertEqual((message["links"], message["done"]), ([], [('http://a.com/', 0)]))
+        self.assertEqual(message["stats"], ({}, {}))
+
+    def testStatsMerge(self):
+        worker, coordinator = CrawlStats(), CrawlStats()
+        worker.record('parse', 0.5)
+        worker.count('pages', 2)
+        coordinator.merge(*worker.drain())
+        worker.record('parse', 1.5)
+        coordinator.merge(*worker.drain())
+        snapshot = coordinator.snapshot()
+        self.assertEqual(snapshot["stages"]["parse"]["count"], 2)
+        self.assertEqual((snapshot["stages"]["parse"]["max"], snapshot["counters"]["pages"]), (1.5, 2))
+
+    def testParseAddress(self):
+        self.assertEqual(parseAddress('localhost:5000'), ('localhost', 5000))
+        self.assertEqual(parseAddress(':5000'), ('localhost', 5000))
+        self.assertRaises(ValueError, parseAddress, 'localhost')
+
+class incrementalTestCase(unittest.TestCase):
+    def testSiteManifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = SiteManifest(os.path.join(directory, 'manifest.db'))
+            settings = crawlSettings({'class': {'b', 'a'}}, searchForWord('foo', False, ['p']))
+            self.assertFalse(manifest.begin('http://a.com/', 1, settings, 100.0))
+            manifest.store(ManifestEntry('http://a.com/', 0, 'h1', '"e"', None, 100.0, ['http://a.com/x'], ['foo']), 100.0)
+            manifest.store(ManifestEntry('http://a.com/x', 1, 'h2', None, None, 100.0, [], []), 100.0)
+            self.assertTrue(manifest.begin('http://a.com/', 1, settings, 200.0))
+            entry = manifest.lookup('http://a.com/')
+            self.assertEqual((entry.hash, entry.links, entry.matches), ('h1', ['http://a.com/x'], ['foo']))
+            self.assertEqual(entry.conditionalHeaders(), {'If-None-Match': '"e"'})
+            manifest.store(entry, 200.0)
+            self.assertEqual(manifest.prune(200.0), [('http://a.com/x', [])])
+            self.assertEqual((len(manifest), manifest.lookup('http://a.com/x')), (1, None))
+            self.assertFalse(manifest.begin('http://a.com/', 1, crawlSettings(None, searchForWord('bar', False, ['p'])), 300.0))
+            manifest.close()
+
+    def testRecrawl(self):
+        self.checkRecrawl(downloadThreads=2, processThreads=2)
+
+    def testRecrawlAsyncInPool(self):
+        self.checkRecrawl(fetcher=AsyncFetcher(concurrency=4), processes=2)
+
+    def checkRecrawl(self, **kwargs):
+        pages = {'/': '<a href="/a">a</a><a href="/b">b</a>', '/a': '<p>crawler</p>', '/b': '<p>crawler</p>'}
+
+        def respond(handler):
+            if handler.path not in pages:
+                handler.send_response(404)
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            body = pages[handler.path].encode('utf-8')
+            etag = '"%d"' % hash(body)
+            if handler.headers.get('If-None-Match') == etag:
+                handler.send_response(304)
+                handler.send_header('ETag', etag)
+                handler.end_headers()
+                return
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/html; charset=utf-8')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.send_header('ETag', etag)
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        server, address = startStub(respond)
+        action = searchForWord('crawler', False, ['p'])
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                manifest = SiteManifest(os.path.join(directory, 'manifest.db'))
+                result, delta = recrawl(address, 1, None, action, manifest, **kwargs)
+                self.assertEqual({d.site for d in delta.withStatus('added')}, {address + 'a', address + 'b'})
+                self.assertEqual(len(manifest), 3)
+
+                # nothing changed, so every site is revalidated with 304 and its stored matches are reused
+                stats = CrawlStats()
+                result, delta = recrawl(address, 1, None, action, manifest, stats=stats, **kwargs)
+                counters = stats.snapshot()["counters"]
+                self.assertEqual((counters["unchanged"], counters["notModified"]), (3, 3))
+                self.assertEqual(len(delta), 0)
+                self.assertEqual({siteAddress for siteAddress, _ in result.results}, {address + 'a', address + 'b'})
+
+                # /b is no longer linked, so it is pruned and its matches reported as removed together with those of /a
+                pages['/'] = '<a href="/a">a</a>'
+                pages['/a'] = '<p>nothing</p>'
+                result, delta = recrawl(address, 1, None, action, manifest, **kwargs)
+                self.assertEqual(list(result.results), [])
+                self.assertEqual({d.site for d in delta.withStatus('removed')}, {address + 'a', address + 'b'})
+                self.assertEqual((len(manifest), manifest.lookup(address + 'b')), (2, None))
+                self.assertFalse(manifest.info()["truncated"])
+                manifest.close()
+        finally:
+            stopStub(server)
+
+    def testRecrawlRejectsHints(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = SiteManifest(os.path.join(directory, 'manifest.db'))
+            action = searchForWord('crawler', False, ['p'])
+            self.assertRaises(ValueError, recrawl, 'http://a.com/', 1, None, action, manifest, frontier=bestFirstFrontier(action, 1))
+            manifest.close()
+
+    def testJobRejectsCrawlOptions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            job = CrawlJob.fromJSON({"start": "http://a.com/", "query": "crawler", "tags": "p", "manifest": os.path.join(directory, 'manifest.db')})
+            self.assertRaises(ValueError, runJob, job, useAsync=True)
+            self.assertRaises(ValueError, runJob, job, processes=2)
+            self.assertFalse(os.path.exists(job.manifest))
+
+    def testParseLastmod(self):
+        self.assertEqual(parseLastmod('1970-01-01'), 24 * 3600)
+        self.assertEqual(parseLastmod('1970-01-01T01:00:00Z'), 3600)
+        self.assertEqual(parseLastmod('1970-01-01T02:00:00+01:00'), 3600)
+        self.assertIsNone(parseLastmod('yesterday'))
+
+    def testDiffResults(self):
+        delta = diffResults([('a', ['x', 'y']), ('b', ['x']), ('c', ['z'])], [('a', ['y', 'w']), ('c', ['z']), ('d', ['v'])])
+        self.assertEqual(len(delta), 3)
+        self.assertEqual([(d.site, d.added, d.removed) for d in delta.withStatus('changed')], [('a', ['w'], ['x'])])
+        self.assertEqual([d.site for d in delta.withStatus('added')], ['d'])
+        self.assertEqual([d.site for d in delta.withStatus('removed')], ['b'])
+        self.assertEqual(delta.jsonify()["sites"][0], {"site": "a", "status": "changed", "added": ["w"], "removed": ["x"]})
+
+class pipelineTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.web = SyntheticWeb(SiteGraph(fanOut=4, depth=3, pageSize=1024, crossLinks=1, hosts=2))
+        cls.start = cls.web.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.web.stop()
+
+    def testThreads(self):
+        result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), downloadThreads=4, processThreads=2)
+        self.assertEqual({siteAddress for siteAddress, _ in result.results}, sitesWithWord(self.web, 'crawler', 2))
+        self.assertFalse(result.truncated)
+        self.assertEqual(crawlThreadsAlive(), [])
+
+    def testAsync(self):
+        result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), fetcher=AsyncFetcher(concurrency=4), processThreads=2)
+        self.assertEqual({siteAddress for siteAddress, _ in result.results}, sitesWithWord(self.web, 'crawler', 2))
+        self.assertEqual(crawlThreadsAlive(), [])
+
+    def testSinkFailure(self):
+        class FailingSink(JSONLinesSink):
+            writes = 0
+
+            def write(self, siteAddress, matches):
+                self.writes += 1
+                if self.writes == 3:
+                    raise OSError('No space left on device')
+                super().write(siteAddress, matches)
+
+        expected = sitesWithWord(self.web, 'crawler', 2)
+        with tempfile.TemporaryDirectory() as directory:
+            for kwargs in ({"processThreads": 2}, {"processes": 2}):
+                sink = FailingSink(os.path.join(directory, 'results.jsonl'))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), sink=sink, **kwargs)
+                self.assertEqual(result.stats.snapshot()["counters"]["processErrors"], 1)
+                self.assertEqual(len(list(result.results)), len(expected) - 1)
+
+    def testProcesses(self):
+        result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), downloadThreads=4, processes=2, batchSize=4)
+        self.assertEqual({siteAddress for siteAddress, _ in result.results}, sitesWithWord(self.web, 'crawler', 2))
+        self.assertEqual(result.stats.snapshot()["counters"]["processErrors"], 0)
+        self.assertEqual(crawlThreadsAlive(), [])
+
+    def testDiskFrontierReused(self):
+        expected = sitesWithWord(self.web, 'crawler', 2)
+        with tempfile.TemporaryDirectory() as directory:
+            # crawl stopped early leaves queued sites on disk and seen sites stored, as big crawl would
+            frontier = diskFrontier(directory, maxInMemory=4)
+            result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), frontier=frontier, budget=CrawlBudget(maxPages=10))
+            self.assertTrue(result.truncated)
+            self.assertGreater(frontier.queue.onDisk, 0)
+            frontier.close()
+            # next crawl in the same directory starts from scratch
+            frontier = diskFrontier(directory, maxInMemory=4)
+            result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), frontier=frontier)
+            self.assertEqual({siteAddress for siteAddress, _ in result.results}, expected)
+            frontier.close()
+
+    def testResumeTruncated(self):
+        # whole web is reachable within depth of its graph
+        expected = sitesWithWord(self.web, 'crawler', 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'crawl.checkpoint')
+            for kwargs in ({"downloadThreads": 4}, {"fetcher": AsyncFetcher(concurrency=4)}, {"processes": 2, "batchSize": 4}):
+                result = crawl(self.start, -1, None, searchForWord('crawler', False, ['p']), checkpointPath=path,
+                               budget=CrawlBudget(maxPages=20), **kwargs)
+                self.assertTrue(result.truncated)
+                self.assertTrue(os.path.exists(path))
+                if "fetcher" in kwargs:
+                    kwargs["fetcher"] = AsyncFetcher(concurrency=4)
+                result = resumeCrawl(path, **kwargs)
+                self.assertFalse(result.truncated)
+                self.assertFalse(os.path.exists(path))
+                self.assertEqual({siteAddress for siteAddress, _ in result.results}, expected)
+
+    def testResumeCancelled(self):
+        expected = sitesWithWord(self.web, 'crawler', 2)
+        budget = CrawlBudget()
+
+        def onResult(siteAddress, matches):
+            if len(found) == 5:
+                budget.cancel()
+            found.append(siteAddress)
+
+        found = []
+        with tempfile.TemporaryDirectory() as directory:
+            path, output = os.path.join(directory, 'crawl.checkpoint'), os.path.join(directory, 'results.jsonl')
+            result = crawl(self.start, 2, None, searchForWord('crawler', False, ['p']), sink=JSONLinesSink(output),
+                           checkpointPath=path, budget=budget, onResult=onResult)
+            self.assertTrue(result.truncated)
+            self.assertLess(len(list(result.results)), len(expected))
+            # action and output file are restored from checkpoint
+            result = resumeCrawl(path)
+            self.assertFalse(result.truncated)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual({siteAddress for siteAddress, _ in result.results}, expected)
+
+    def testDistributed(self):
+        addresses = queue.Queue()
+        finished = {}
+
+        def coordinate():
+            finished["result"] = crawlDistributed(self.start, 2, None, searchForWord('crawler', False, ['p']), ('127.0.0.1', 0), b'secret',
+                                                  partitions=8, leaseSize=4, onListening=addresses.put)
+
+        coordinator = threading.Thread(target=coordinate, daemon=True)
+        coordinator.start()
+        address = addresses.get(timeout=10)
+        workers = [threading.Thread(target=runWorker, args=(address, b'secret'), kwargs={"downloadThreads": 2, "processThreads": 1, "batchSize": 4},
+                                    daemon=True) for _ in range(2)]
+        for t in workers:
+            t.start()
+        for t in [coordinator] + workers:
+            t.join(60)
+            self.assertFalse(t.is_alive())
+        result = finished["result"]
+        self.assertFalse(result.truncated)
+        expected = sitesWithWord(self.web, 'crawler', 2)
+        self.assertEqual({siteAddress for siteAddress, _ in result.results}, expected)
+        # statistics of workers are merged into those of the crawl
+        self.assertGreaterEqual(result.stats.snapshot()["counters"]["pages"], len(expected))
+
+    def testJobCorpus(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, output = os.path.join(directory, 'corpus.db'), os.path.join(directory, 'results.jsonl')
+            job = CrawlJob.fromJSON({"start": self.start, "depth": 2, "query": "nothing", "tags": "p", "corpus": path})
+            self.assertEqual(list(runJob(job).results), [])
+            # other search is answered from stored sites
+            with contextlib.redirect_stderr(io.StringIO()):
+                status = cli.main(['--search-corpus', path, '--words', 'crawler', '--processes', '2', '--output', output])
+            self.assertEqual(status, 0)
+            self.assertEqual({siteAddress for siteAddress, _ in CrawlResult.fromJSONLines(output).results}, sitesWithWord(self.web, 'crawler', 2))
+
+    def testJobIndex(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path, output = os.path.join(directory, 'index.db'), os.path.join(directory, 'results.jsonl')
+            job = CrawlJob.fromJSON({"start": self.start, "depth": 2, "query": "nothing", "tags": "p", "indexTags": "p,h1", "index": path})
+            self.assertEqual(list(runJob(job).results), [])
+            # other search is answered from indexed texts
+            with contextlib.redirect_stderr(io.StringIO()):
+                status = cli.main(['--search-index', path, '--words', 'crawler', '--output', output])
+            self.assertEqual(status, 0)
+            self.assertEqual({siteAddress for siteAddress, _ in CrawlResult.fromJSONLines(output).results}, sitesWithWord(self.web, 'crawler', 2))
+            with contextlib.redirect_stderr(io.StringIO()):
+                # tag which was not indexed cannot be searched
+                self.assertEqual(cli.main(['--search-index', path, '--words', 'crawler', '--tags', 'li']), 1)
+
+    def testJobCheckpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fields = {"start": self.start, "depth": 2, "query": "crawler", "tags": "p", "checkpoint": os.path.join(directory, 'crawl.checkpoint')}
+            result = runJob(CrawlJob.fromJSON(dict(fields, maxPages=5)))
+            self.assertTrue(result.truncated)
+            # the same job run again without limit continues the crawl
+            result = runJob(CrawlJob.fromJSON(fields))
+            self.assertFalse(result.truncated)
+            self.assertEqual({siteAddress for siteAddress, _ in result.results}, sitesWithWord(self.web, 'crawler', 2))
+
 if __name__ == '__main__':  
     unittest.main()  